@@ -1,20 +1,43 @@
 
 import os
 import sys
+import json
+import math
+import contextvars
+import zlib
+import queue
+import atexit
+import itertools
 import logging
-from typing import Optional, Dict, Any, List
+import logging.handlers
+from typing import Annotated, Optional, Dict, Any, List, Union
 from datetime import datetime, timezone, timedelta
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from collections import deque
+from starlette.concurrency import run_in_threadpool
+import anyio.to_thread
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
 import time
+from dataclasses import replace
+import numpy as np
 
 # pastikan inference_rf.py bisa diimport (dalam folder yang sama)
 HERE = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(HERE)
 
-from inference_rf import RFRegressorWrapper, decide_potability, Thresholds, status_badges
+from inference_rf import (RFRegressorWrapper, decide_potability, DetectionDecision, Thresholds, status_badges, DEFAULT_LATTICE_ENVELOPE,
+                          MAX_QUANTILES, quantile_key,
+                          SEVERITY_LEVELS, BADGE_LEVELS, BADGE_PARAMS, decide_potability_batch, status_badges_batch)
+from iot_storage import ColumnarStore, RingStore
+from iot_ingest import EnrichmentQueue
+from iot_devices import DeviceRegistry, DeviceLimitError, DEVICE_ID_PATTERN
+from iot_stream import StreamHub, format_sse
+from iot_aggregate import bucket_aggregate, lttb
+from log_rotation import SegmentedLogHandler
+from metrics import MetricsRegistry
 
 # ========================================
 # SENSOR IDs CONFIGURATION (Hardcoded)
@@ -43,9 +66,79 @@ class WIBFormatter(logging.Formatter):
         else:
             return dt.strftime('%Y-%m-%d %H:%M:%S %Z')
 
+class JSONFormatter(WIBFormatter):
+    """Satu objek JSON per baris (LOG_FORMAT=json), untuk log collector / analisis"""
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=WIB).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+# Logging non-blocking: handler di request path hanya memasukkan record ke antrian,
+# format + I/O file/console dikerjakan QueueListener di thread background
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()          # text | json
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))     # record di atas kapasitas di-drop
+# Sampling baris "hot" (per request / per sampel IoT), format "INFO=0.1,DEBUG=0" (1 = tulis semua)
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Rotasi file log (lihat log_rotation.py): per ukuran + per hari WIB, segment lama di-gzip
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", "10"))                  # 0 = tanpa rotasi ukuran
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "1") == "1"
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "30"))        # maks. segment tertutup (0 = tanpa batas)
+LOG_RETENTION_MB = float(os.getenv("LOG_RETENTION_MB", "100"))     # total segment tertutup (0 = tanpa batas)
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") == "1"
+
+# Tandai baris log hot yang boleh di-sampling: logger.info(..., extra=LOG_SAMPLED)
+LOG_SAMPLED = {"sampled": True}
+
+class HotLineSampler(logging.Filter):
+    """Sampling deterministik per level untuk record bertanda `sampled` (1 dari setiap N)"""
+    def __init__(self, spec: str):
+        super().__init__()
+        self.every: Dict[int, int] = {}
+        self.counters: Dict[int, Any] = {}
+        for item in spec.split(","):
+            if not item.strip():
+                continue
+            name, _, rate = item.partition("=")
+            level = logging.getLevelName(name.strip().upper())
+            rate = float(rate)
+            self.every[level] = 0 if rate <= 0 else max(1, round(1 / rate))
+            self.counters[level] = itertools.count()
+
+    def filter(self, record):
+        every = self.every.get(record.levelno)
+        if every is None or not getattr(record, "sampled", False):
+            return True
+        return every > 0 and next(self.counters[record.levelno]) % every == 0
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler yang tidak pernah memblok: record di-drop (dan dihitung) jika antrian penuh"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Format ditunda ke listener thread; hanya traceback yang di-render di thread pemanggil
+        return super().prepare(record) if record.exc_info else record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+log_listener: Optional[logging.handlers.QueueListener] = None
+
 # Setup logging
 def setup_logger():
-    """Setup logger dengan file dan console handler"""
+    """Setup logger: QueueHandler di request path, file & console handler di listener thread"""
+    global log_listener
     logger = logging.getLogger("water_quality_api")
     logger.setLevel(logging.INFO)
     
@@ -53,32 +146,51 @@ def setup_logger():
     if logger.handlers:
         return logger
     
-    # Format log dengan timestamp WIB
+    # Format log dengan timestamp WIB (atau JSON per baris)
     log_format = '%(asctime)s [%(levelname)s] %(name)s - %(message)s'
     date_format = '%Y-%m-%d %H:%M:%S'
+    formatter = JSONFormatter() if LOG_FORMAT == "json" else WIBFormatter(log_format, datefmt=date_format)
+    handlers = []
     
     # Console Handler (untuk development & Hugging Face logs)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    console_formatter = WIBFormatter(log_format, datefmt=date_format)
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(formatter)
+    handlers.append(console_handler)
     
     # File Handler (untuk persistent logs di Hugging Face Spaces)
+    log_file = None
+    log_file_error = None
     try:
         log_dir = os.path.join(HERE, "logs")
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, "water_quality_api.log")
         
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler = SegmentedLogHandler(
+            log_file,
+            max_bytes=int(LOG_MAX_MB * 1024 * 1024),
+            daily=LOG_ROTATE_DAILY,
+            backup_count=LOG_BACKUP_COUNT,
+            retention_bytes=int(LOG_RETENTION_MB * 1024 * 1024) if LOG_RETENTION_MB > 0 else None,
+            compress=LOG_COMPRESS,
+        )
         file_handler.setLevel(logging.INFO)
-        file_formatter = WIBFormatter(log_format, datefmt=date_format)
-        file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
-        
-        logger.info(f"Log file created: {log_file}")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
     except Exception as e:
-        logger.warning(f"Could not create log file: {e}")
+        log_file_error = e
+    
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(HotLineSampler(LOG_SAMPLE_RATES))
+    logger.addHandler(queue_handler)
+    log_listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    
+    if log_file_error is None:
+        logger.info(f"Log file created: {log_file}")
+    else:
+        logger.warning(f"Could not create log file: {log_file_error}")
     
     return logger
 
@@ -86,8 +198,63 @@ def setup_logger():
 logger = setup_logger()
 
 # Lokasi model & urutan fitur (menggunakan model terbaru yang sudah improved)
+# MODEL_PATH boleh joblib atau artefak forest flat (.rfflat, hasil export_forest.py)
 MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(HERE, "rf_total_coliform_log1p_improved.joblib"))
 FEATURES_ORDER_PATH = os.getenv("FEATURES_ORDER_PATH", os.path.join(HERE, "model_features_order.txt"))
+# Opsional: joblib asli untuk verifikasi checksum artefak flat
+MODEL_SOURCE_PATH = os.getenv("MODEL_SOURCE_PATH")
+
+# Batas jumlah bacaan per request `/predict/batch`
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+# Rentang epoch yang diterima untuk timestamp device (bulk) dan parameter waktu query
+# (1970-01-01 .. 3000-01-01 UTC); di luar itu datetime/ISO WIB tidak bisa dibentuk
+MAX_EPOCH = 32503680000.0
+
+# Cache prediksi (LRU, key = fitur yang dikuantisasi). 0 = nonaktif (default, opt-in):
+# jika aktif, prediksi dihitung di nilai representatif bucket kuantisasi, bukan input persis.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+# Langkah kuantisasi per fitur, format "temp_c=0.1,do_mgl=0.01,ph=0.01,conductivity_uscm=1"
+# (kosong = default resolusi sensor di inference_rf.DEFAULT_CACHE_STEPS)
+PREDICTION_CACHE_STEPS = os.getenv("PREDICTION_CACHE_STEPS", "")
+
+# Thread pool inferensi: batch exact >= INFERENCE_PARALLEL_MIN_ROWS baris dibagi per potongan baris
+# ke INFERENCE_THREADS thread (1 = selalu di thread request, 0 = jumlah core)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+INFERENCE_PARALLEL_MIN_ROWS = int(os.getenv("INFERENCE_PARALLEL_MIN_ROWS", "2048"))
+# Process pool inferensi (> 0 menggantikan thread pool): forest dimuat sekali ke shared memory oleh
+# proses API, worker proses meng-attach blok tersebut. Jalankan uvicorn dengan satu worker.
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+
+# Mode inferensi: "exact" (forest penuh) atau "fast" (lattice interpolasi, fallback exact
+# di luar envelope; hanya aktif jika lolos cek error maksimum)
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "exact").lower()
+LATTICE_POINTS = int(os.getenv("LATTICE_POINTS", "9"))
+LATTICE_MAX_ERROR = float(os.getenv("LATTICE_MAX_ERROR", "0.05"))   # error absolut maks (skala log1p)
+LATTICE_PATH = os.getenv("LATTICE_PATH")   # opsional: file .npz lattice hasil precompute
+# Envelope lattice, format "temp_c=10:45,ph=6:9" (kosong = inference_rf.DEFAULT_LATTICE_ENVELOPE)
+LATTICE_ENVELOPE = os.getenv("LATTICE_ENVELOPE", "")
+
+def _parse_lattice_envelope(spec: str) -> Optional[Dict[str, tuple]]:
+    """Parse LATTICE_ENVELOPE ("fitur=min:max,...") di atas DEFAULT_LATTICE_ENVELOPE"""
+    if not spec.strip():
+        return None
+    envelope = dict(DEFAULT_LATTICE_ENVELOPE)
+    for item in spec.split(","):
+        name, _, bounds = item.partition("=")
+        lo, _, hi = bounds.partition(":")
+        envelope[name.strip()] = (float(lo), float(hi))
+    return envelope
+
+def _parse_cache_steps(spec: str) -> Optional[Dict[str, float]]:
+    """Parse PREDICTION_CACHE_STEPS ("fitur=step,...") menjadi dict"""
+    if not spec.strip():
+        return None
+    steps = {}
+    for item in spec.split(","):
+        name, _, step = item.partition("=")
+        steps[name.strip()] = float(step)
+    return steps
 
 # Inisialisasi app & model sekali di startup
 app = FastAPI(
@@ -104,12 +271,13 @@ app = FastAPI(
     * IoT Integration: Menerima dan menyimpan data dari sensor real-time
     * 3-Tier Severity System: Klasifikasi kualitas air (Aman/Waspada/Bahaya)
     * Status Badges: Badge berwarna untuk setiap parameter air
-    * History Storage: Penyimpanan data historis (in-memory, max 1000 records)
+    * History Storage: Penyimpanan data historis persisten (segment kolumnar di disk, retensi by size/umur)
+    * Multi-Device: Storage terpisah per node/site (`device_id`), endpoint `/devices/...` dan ringkasan fleet
     
     ## Data Flow:
     
     1. Hardware → API ESP32 POST data sensor ke `/iot/data`
-    2. API → Storage Data disimpan di in-memory deque (maxlen=1000)
+    2. API → Storage Data disimpan di storage kolumnar (`IOT_STORAGE_DIR`)
     3. Frontend → API Dashboard polling `/iot/latest` dan `/iot/history`
     4. AI Processing `/predict` atau `/iot/predict` untuk analisis kualitas air
     
@@ -158,10 +326,385 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # agar widget di domain lain bisa membaca ETag untuk If-None-Match
 )
 
-# In-memory storage untuk data IoT (max 1000 data points)
-iot_data_storage = deque(maxlen=1000)
+# Storage data IoT (lihat iot_storage.py): "disk" = segment kolumnar memory-mapped (persisten),
+# "memory" = ring buffer in-memory float32 (tidak persisten, kapasitas = jumlah record / byte)
+IOT_STORAGE_BACKEND = os.getenv("IOT_STORAGE_BACKEND", "disk").lower()
+IOT_MEMORY_MAX_ROWS = int(os.getenv("IOT_MEMORY_MAX_ROWS", "0"))            # 0 = hanya dibatasi IOT_MEMORY_MAX_MB
+IOT_MEMORY_MAX_MB = float(os.getenv("IOT_MEMORY_MAX_MB", "64"))
+IOT_STORAGE_DIR = os.getenv("IOT_STORAGE_DIR", os.path.join(HERE, "data", "iot"))
+IOT_SEGMENT_ROWS = int(os.getenv("IOT_SEGMENT_ROWS", "65536"))
+IOT_RETENTION_MAX_MB = float(os.getenv("IOT_RETENTION_MAX_MB", "256"))      # 0 = tanpa batas ukuran
+IOT_RETENTION_MAX_DAYS = float(os.getenv("IOT_RETENTION_MAX_DAYS", "0"))    # 0 = tanpa batas umur
+# Multi-device: storage terpisah per device (data tanpa device_id = device default = storage utama)
+IOT_DEFAULT_DEVICE_ID = os.getenv("IOT_DEFAULT_DEVICE_ID", "default")
+IOT_MAX_DEVICES = int(os.getenv("IOT_MAX_DEVICES", "500"))
+IOT_DEVICE_SEGMENT_ROWS = int(os.getenv("IOT_DEVICE_SEGMENT_ROWS", "8192"))
+IOT_DEVICE_RETENTION_MAX_MB = float(os.getenv("IOT_DEVICE_RETENTION_MAX_MB", "32"))   # per device (backend disk)
+IOT_DEVICE_MEMORY_MAX_MB = float(os.getenv("IOT_DEVICE_MEMORY_MAX_MB", "4"))         # per device (backend memory)
+IOT_HISTORY_MAX_LIMIT = int(os.getenv("IOT_HISTORY_MAX_LIMIT", "10000"))    # batas `limit` /iot/history
+IOT_AGGREGATE_MAX_POINTS = int(os.getenv("IOT_AGGREGATE_MAX_POINTS", "5000"))  # batas bucket/titik /iot/history/aggregate
+
+# Enrichment async: /iot/data langsung ACK, prediksi dihitung worker background (0 = inline/sinkron)
+IOT_INGEST_WORKERS = int(os.getenv("IOT_INGEST_WORKERS", "1"))
+IOT_INGEST_QUEUE_SIZE = int(os.getenv("IOT_INGEST_QUEUE_SIZE", "10000"))
+IOT_INGEST_BATCH_SIZE = int(os.getenv("IOT_INGEST_BATCH_SIZE", "256"))
+IOT_INGEST_MAX_WAIT_MS = float(os.getenv("IOT_INGEST_MAX_WAIT_MS", "20"))
+
+# Server push /iot/stream (SSE): buffer per subscriber, batas koneksi, keep-alive, umur koneksi maks.
+IOT_STREAM_BUFFER = int(os.getenv("IOT_STREAM_BUFFER", "100"))
+IOT_STREAM_MAX_SUBSCRIBERS = int(os.getenv("IOT_STREAM_MAX_SUBSCRIBERS", "100"))
+IOT_STREAM_HEARTBEAT_SECONDS = float(os.getenv("IOT_STREAM_HEARTBEAT_SECONDS", "15"))
+IOT_STREAM_MAX_SECONDS = float(os.getenv("IOT_STREAM_MAX_SECONDS", "600"))   # 0 = tanpa batas
+IOT_STREAM_RETRY_MS = int(os.getenv("IOT_STREAM_RETRY_MS", "3000"))          # jeda reconnect EventSource
+
+# Ukuran threadpool endpoint sync (default anyio = 40). Reader storage IoT tidak mengambil lock
+# (snapshot seqlock, lihat iot_storage.py), jadi pool bisa diperbesar tanpa membuat ingest menunggu.
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "0"))            # 0 = default anyio
+
+if IOT_STORAGE_BACKEND == "memory":
+    iot_data_storage = RingStore(
+        capacity=IOT_MEMORY_MAX_ROWS or None,
+        max_bytes=int(IOT_MEMORY_MAX_MB * 1024 * 1024) if IOT_MEMORY_MAX_MB > 0 else None,
+        max_age_seconds=IOT_RETENTION_MAX_DAYS * 86400 if IOT_RETENTION_MAX_DAYS > 0 else None,
+    )
+elif IOT_STORAGE_BACKEND == "disk":
+    iot_data_storage = ColumnarStore(
+        IOT_STORAGE_DIR,
+        segment_rows=IOT_SEGMENT_ROWS,
+        max_bytes=int(IOT_RETENTION_MAX_MB * 1024 * 1024) if IOT_RETENTION_MAX_MB > 0 else None,
+        max_age_seconds=IOT_RETENTION_MAX_DAYS * 86400 if IOT_RETENTION_MAX_DAYS > 0 else None,
+    )
+else:
+    raise ValueError(f"IOT_STORAGE_BACKEND tidak dikenal: {IOT_STORAGE_BACKEND} (pilihan: disk, memory)")
+
+IOT_DEVICES_DIR = os.path.join(IOT_STORAGE_DIR, "devices")
+
+def _create_device_store(device_id: str):
+    """Storage untuk device non-default (backend sama dengan storage utama, batas per device)"""
+    max_age = IOT_RETENTION_MAX_DAYS * 86400 if IOT_RETENTION_MAX_DAYS > 0 else None
+    if IOT_STORAGE_BACKEND == "memory":
+        return RingStore(max_bytes=int(IOT_DEVICE_MEMORY_MAX_MB * 1024 * 1024), max_age_seconds=max_age)
+    return ColumnarStore(
+        os.path.join(IOT_DEVICES_DIR, device_id),
+        segment_rows=IOT_DEVICE_SEGMENT_ROWS,
+        max_bytes=int(IOT_DEVICE_RETENTION_MAX_MB * 1024 * 1024) if IOT_DEVICE_RETENTION_MAX_MB > 0 else None,
+        max_age_seconds=max_age,
+    )
+
+iot_devices = DeviceRegistry(_create_device_store, IOT_DEFAULT_DEVICE_ID, iot_data_storage, max_devices=IOT_MAX_DEVICES)
+if IOT_STORAGE_BACKEND == "disk":
+    iot_devices.discover(IOT_DEVICES_DIR)
+
+iot_stream_hub = StreamHub(buffer_size=IOT_STREAM_BUFFER, max_subscribers=IOT_STREAM_MAX_SUBSCRIBERS,
+                           heartbeat_seconds=IOT_STREAM_HEARTBEAT_SECONDS)
+
+def _optional(value: float) -> Optional[float]:
+    """NaN di storage = None di API"""
+    return None if value != value else value
+
+def _row_readings(row: Dict[str, Any]) -> Dict[str, float]:
+    """Readings untuk rules dari satu baris storage (coliform sensor hanya jika ada)"""
+    readings = {k: float(row[k]) for k in ("temp_c", "do_mgl", "ph", "conductivity_uscm")}
+    if row["totalcoliform_mv"] == row["totalcoliform_mv"]:
+        readings["totalcoliform_mv"] = float(row["totalcoliform_mv"])
+    return readings
+
+def _materialize_record(row: Dict[str, Any], include_details: bool = False) -> Dict[str, Any]:
+    """
+    Ubah satu baris storage (NaN / -1 = kosong) ke format record API, termasuk hasil
+    enrichment (prediksi, severity, badge) yang dihitung saat ingest.
+    `include_details` menambahkan reasons/recommendations dan label badge lengkap
+    (dihitung ulang dari rules dengan prediksi tersimpan, tanpa menjalankan model).
+    """
+    record = {
+        "seq": row.get("seq"),  # ID urut record (cursor /iot/history)
+        "timestamp": datetime.fromtimestamp(row["timestamp"], tz=WIB).isoformat(),  # Timestamp WIB
+        "sensor_ids": SENSOR_IDS,
+        "temp_c": _optional(row["temp_c"]),
+        "do_mgl": _optional(row["do_mgl"]),
+        "ph": _optional(row["ph"]),
+        "conductivity_uscm": _optional(row["conductivity_uscm"]),
+        "totalcoliform_mv_raw": _optional(row["totalcoliform_mv_raw"]),
+        "totalcoliform_mv": _optional(row["totalcoliform_mv"]),
+        "prediction": None,
+        "ai_detection": None,
+        "badge_levels": None
+    }
+    if row["severity"] < 0:
+        # belum di-enrich (mis. inferensi gagal saat ingest)
+        return record
+
+    record["prediction"] = {
+        "total_coliform_mv": row["pred_total_coliform_mv"],
+        "ci90_low": row["pred_ci90_low"],
+        "ci90_high": row["pred_ci90_high"]
+    }
+    record["ai_detection"] = {
+        "potable": bool(row["potable"]),
+        "severity": SEVERITY_LEVELS[row["severity"]]
+    }
+    record["badge_levels"] = {param: BADGE_LEVELS[row[f"badge_{param}"]] for param in BADGE_PARAMS}
+    if include_details:
+        th = Thresholds()
+        readings = _row_readings(row)
+        decision = decide_potability(readings, row["pred_total_coliform_mv"], th)
+        record["ai_detection"].update({
+            "reasons": decision.reasons,
+            "recommendations": decision.recommendations,
+            "alternative_use": decision.alternative_use
+        })
+        record["status_badges"] = status_badges(readings, th)
+    return record
+
+def _materialize_records(columns: Dict[str, np.ndarray], include_details: bool = False) -> List[Dict[str, Any]]:
+    """Materialisasi dict hanya untuk baris yang dikembalikan ke client"""
+    names = iot_data_storage.column_names + ["seq"]
+    rows = zip(*(columns[name].tolist() for name in names))
+    return [_materialize_record(dict(zip(names, values)), include_details) for values in rows]
+
+SEVERITY_DISPLAY = {
+    "safe": {"color": "green", "icon": "✅", "label": "LAYAK MINUM"},
+    "warning": {"color": "yellow", "icon": "⚠️", "label": "PERLU PERHATIAN"},
+    "danger": {"color": "red", "icon": "❌", "label": "TIDAK LAYAK MINUM"}
+}
+
+def _latest_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Response `/api/latest` (dan data event `/iot/stream`) untuk satu baris storage.
+    Prediksi hasil enrichment saat ingest dipakai ulang; forest hanya dijalankan jika
+    baris belum di-enrich (mis. masih di antrian).
+    """
+    latest = _materialize_record(row)
+    th = Thresholds()
+    readings = _row_readings(row)
+    if latest["prediction"] is not None:
+        prediction = latest["prediction"]
+    else:
+        infer = rfw.predict_with_interval({k: readings[k] for k in rfw.features_order})
+        prediction = {
+            "total_coliform_mv": infer.pred_total_coliform_mv,
+            "ci90_low": infer.pred_ci90_low,
+            "ci90_high": infer.pred_ci90_high
+        }
+
+    with _stage("decide_potability"):
+        decision = decide_potability(readings, prediction["total_coliform_mv"], th)
+    with _stage("status_badges"):
+        badges = status_badges(dict(readings), th)
+    severity_info = SEVERITY_DISPLAY.get(decision.severity, SEVERITY_DISPLAY["safe"])
+
+    return {
+        "timestamp": latest["timestamp"],
+        "sensor_data": {
+            "temp_c": latest["temp_c"],
+            "do_mgl": latest["do_mgl"],
+            "ph": latest["ph"],
+            "conductivity_uscm": latest["conductivity_uscm"],
+            "totalcoliform_mv_raw": latest["totalcoliform_mv_raw"],
+            "totalcoliform_mv": latest["totalcoliform_mv"]
+        },
+        "prediction": {
+            "total_coliform_mv": prediction["total_coliform_mv"],
+            "confidence_interval": {
+                "low": prediction["ci90_low"],
+                "high": prediction["ci90_high"]
+            }
+        },
+        "status": {
+            "potable": decision.potable,
+            "severity": decision.severity,
+            "label": severity_info["label"],
+            "color": severity_info["color"],
+            "icon": severity_info["icon"],
+            "reasons": decision.reasons,
+            "recommendations": decision.recommendations
+        },
+        "badges": badges
+    }
+
+def _stream_events(start_seq: int, stop_seq: int, seqs: Optional[np.ndarray] = None) -> List[tuple]:
+    """
+    Event SSE `reading` (seq, payload) untuk baris yang sudah di-enrich di [start_seq, stop_seq),
+    opsional hanya seq tertentu. Payload diserialisasi sekali lalu dibagikan ke semua subscriber.
+    """
+    columns = iot_data_storage.read(start_seq, stop_seq)
+    wanted = columns["severity"] >= 0
+    if seqs is not None:
+        wanted &= np.isin(columns["seq"], seqs)
+    names = iot_data_storage.column_names
+    events = []
+    for i in np.flatnonzero(wanted).tolist():
+        seq = int(columns["seq"][i])
+        view = _latest_view({name: columns[name][i].item() for name in names})
+        events.append((seq, format_sse("reading", view, seq)))
+    return events
+
+def _publish_stream(seqs: np.ndarray, store=None) -> None:
+    """
+    Push record yang baru di-enrich ke subscriber `/iot/stream`. Hanya `IOT_STREAM_BUFFER`
+    record terbaru per batch yang dikirim (sisanya pasti ter-drop di buffer subscriber).
+    Stream mengikuti device default (storage utama); record device lain dilewati.
+    """
+    if store is not None and store is not iot_data_storage:
+        return
+    if not iot_stream_hub.has_subscribers or len(seqs) == 0:
+        return
+    seqs = np.sort(np.asarray(seqs, dtype=np.int64))[-iot_stream_hub.buffer_size:]
+    iot_stream_hub.publish(_stream_events(int(seqs[0]), int(seqs[-1]) + 1, seqs))
+
+# Field storage yang dibutuhkan enrichment (input model + sensor coliform untuk rules)
+ENRICH_FIELDS = ("temp_c", "do_mgl", "ph", "conductivity_uscm", "totalcoliform_mv")
+
+def _enrich_rows(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Enrichment saat ingest untuk N baris sensor: prediksi AI + CI90 (satu pass batch),
+    lalu severity/potable dan level badge dengan rules versi vektor (tanpa loop per baris).
+    Return kolom storage hasil enrichment.
+    """
+    th = Thresholds()
+    X = np.column_stack([np.asarray(columns[k], dtype=np.float64) for k in rfw.features_order])
+    infers = rfw.predict_batch_with_interval(X)
+    pred = np.array([r.pred_total_coliform_mv for r in infers])
+
+    readings = [columns[k] for k in ENRICH_FIELDS]
+    decisions = decide_potability_batch(*readings, predicted_coliform_mpn_100ml=pred, thresholds=th)
+    badge_levels = status_badges_batch(*readings, thresholds=th)
+
+    enriched = {
+        "pred_total_coliform_mv": pred,
+        "pred_ci90_low": np.array([r.pred_ci90_low for r in infers]),
+        "pred_ci90_high": np.array([r.pred_ci90_high for r in infers]),
+        "potable": decisions.potable.astype(np.int8),
+    }
+    for param in BADGE_PARAMS:
+        enriched[f"badge_{param}"] = badge_levels[param]
+    # severity terakhir: severity >= 0 menandai baris sudah di-enrich (ditulis paling akhir oleh storage.update)
+    enriched["severity"] = decisions.severity
+    return enriched
+
+# ========================================
+# METRICS (Prometheus, GET /metrics)
+# ========================================
+metrics_registry = MetricsRegistry()
+metrics_registry.counter("water_quality_http_requests_total", "Jumlah HTTP request", ("method", "route", "status"))
+metrics_registry.histogram("water_quality_http_request_duration_seconds", "Latensi HTTP request (detik)",
+                           ("method", "route", "status"))
+metrics_registry.histogram("water_quality_stage_duration_seconds", "Latensi per tahap inferensi/response (detik)",
+                           ("endpoint", "stage"))
+metrics_registry.counter("water_quality_iot_records_received_total", "Record IoT diterima", ("endpoint", "result"))
+
+# Endpoint yang sedang diproses (label tahap inferensi); thread background = "background"
+_metrics_endpoint: contextvars.ContextVar = contextvars.ContextVar("metrics_endpoint", default="background")
+
+def _observe_stage(stage: str, seconds: float) -> None:
+    metrics_registry.observe("water_quality_stage_duration_seconds", (_metrics_endpoint.get(), stage), seconds)
+
+def _stage(stage: str):
+    """Context manager timing satu tahap untuk endpoint yang sedang berjalan"""
+    return metrics_registry.timer("water_quality_stage_duration_seconds", (_metrics_endpoint.get(), stage))
+
+def _serialize(content: Any) -> JSONResponse:
+    """Serialisasi response (sama dengan default FastAPI) dengan timing tahap `serialization`"""
+    with _stage("serialization"):
+        return JSONResponse(jsonable_encoder(content))
+
+def _ingest_metrics() -> Dict[tuple, float]:
+    stats = iot_ingest_queue.stats() if iot_ingest_queue is not None else {}
+    return {(event,): stats.get(event, 0) for event in ("enqueued", "processed", "dropped", "failed")}
+
+def _cache_metrics(field: str) -> Dict[tuple, float]:
+    stats = rfw.cache_stats() if rfw is not None else {}
+    return {(): stats[field]} if stats.get("enabled") else {}
+
+metrics_registry.gauge("water_quality_iot_ingest_events_total", "Event antrian enrichment IoT",
+                       _ingest_metrics, ("event",), kind="counter")
+metrics_registry.gauge("water_quality_iot_ingest_queue_depth", "Record menunggu di antrian enrichment",
+                       lambda: {(): iot_ingest_queue.stats()["queue_depth"]} if iot_ingest_queue is not None else {})
+metrics_registry.gauge("water_quality_iot_ingest_lag_seconds", "Umur record tertua di antrian enrichment",
+                       lambda: {(): iot_ingest_queue.stats()["lag_seconds"]} if iot_ingest_queue is not None else {})
+metrics_registry.gauge("water_quality_iot_storage_rows", "Jumlah record di storage IoT",
+                       lambda: {(): iot_data_storage.stats()["rows"]})
+metrics_registry.gauge("water_quality_iot_storage_bytes", "Ukuran storage IoT (file segment / ring buffer)",
+                       lambda: {(): iot_data_storage.stats()["bytes"]})
+metrics_registry.gauge("water_quality_iot_devices", "Jumlah device IoT terdaftar",
+                       lambda: {(): len(iot_devices)})
+metrics_registry.gauge("water_quality_iot_storage_segments", "Jumlah file segment storage IoT",
+                       lambda: {(): iot_data_storage.stats().get("segments", 0)})
+metrics_registry.gauge("water_quality_iot_stream_subscribers", "Koneksi /iot/stream aktif",
+                       lambda: {(): iot_stream_hub.stats()["subscribers"]})
+metrics_registry.gauge("water_quality_iot_stream_events_total", "Event /iot/stream",
+                       lambda: {(event,): iot_stream_hub.stats()[event] for event in ("published", "delivered", "dropped")},
+                       ("event",), kind="counter")
+metrics_registry.gauge("water_quality_prediction_cache_size", "Entri di cache prediksi",
+                       lambda: _cache_metrics("size"))
+metrics_registry.gauge("water_quality_prediction_cache_hits_total", "Cache hit prediksi",
+                       lambda: _cache_metrics("hits"), kind="counter")
+metrics_registry.gauge("water_quality_prediction_cache_misses_total", "Cache miss prediksi",
+                       lambda: _cache_metrics("misses"), kind="counter")
+metrics_registry.gauge("water_quality_prediction_cache_evictions_total", "Eviction cache prediksi",
+                       lambda: _cache_metrics("evictions"), kind="counter")
+
+# ========================================
+# HTTP CACHING (ETag / If-None-Match)
+# ========================================
+# Endpoint baca (/api/latest, /iot/latest, /iot/history) mengirim ETag kuat; request dengan
+# If-None-Match yang cocok dibalas 304 tanpa inferensi maupun serialisasi.
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))   # detik; 0 = client selalu revalidasi
+CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate" if HTTP_CACHE_MAX_AGE > 0 else "no-cache"
+# Versi storage dan seq (backend memory / disk ephemeral) di-reset saat proses restart: semua
+# ETag berbasis versi atau seq diberi id proses agar ETag sebelum restart tidak pernah cocok
+BOOT_ID = os.urandom(4).hex()
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Perbandingan If-None-Match (weak comparison, RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def _cached_json(body: bytes, etag: str) -> Response:
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+class MaterializedView:
+    """
+    Response JSON ter-serialisasi untuk satu key (mis. seq record terbaru). Dibangun ulang
+    hanya saat key berubah, yaitu saat ada append baru atau record terbaru selesai di-enrich.
+    """
+    def __init__(self):
+        self._entry: Optional[tuple] = None   # (key, etag, body)
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        entry = self._entry
+        return entry if entry is not None and entry[0] == key else None
+
+    def put(self, key: tuple, etag: str, body: bytes) -> None:
+        self._entry = (key, etag, body)
+
+latest_status_view = MaterializedView()   # GET /api/latest
+latest_iot_view = MaterializedView()      # GET /iot/latest
+
+def _finite_json(value: Any) -> Any:
+    """Ganti float NaN/inf (tidak valid di JSON) dengan representasi string-nya"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _finite_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite_json(v) for v in value]
+    return value
+
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    """422 seperti default FastAPI; input NaN/Infinity yang ditolak tetap bisa ditampilkan di detail"""
+    return JSONResponse(status_code=422, content={"detail": _finite_json(jsonable_encoder(exc.errors()))})
 
 # ========================================
 # MIDDLEWARE FOR REQUEST LOGGING
@@ -172,30 +715,44 @@ async def log_requests(request: Request, call_next):
     start_time = time.time()
     
     # Log incoming request
-    logger.info(f"→ {request.method} {request.url.path} | Client: {request.client.host if request.client else 'unknown'}")
+    logger.info("→ %s %s | Client: %s", request.method, request.url.path,
+                request.client.host if request.client else 'unknown', extra=LOG_SAMPLED)
     
     try:
         response = await call_next(request)
         process_time = (time.time() - start_time) * 1000  # Convert to ms
         
         # Log response
-        logger.info(f"← {request.method} {request.url.path} | Status: {response.status_code} | Time: {process_time:.2f}ms")
+        logger.info("← %s %s | Status: %s | Time: %.2fms", request.method, request.url.path,
+                    response.status_code, process_time, extra=LOG_SAMPLED)
+        _record_request_metrics(request, response.status_code, process_time / 1000)
         
         return response
     except Exception as e:
         process_time = (time.time() - start_time) * 1000
         logger.error(f"✗ {request.method} {request.url.path} | Error: {str(e)} | Time: {process_time:.2f}ms")
+        _record_request_metrics(request, 500, process_time / 1000)
         raise
 
+def _record_request_metrics(request: Request, status_code: int, seconds: float) -> None:
+    """Counter + histogram latensi per route template (bukan path mentah, agar label tetap terbatas)"""
+    route = request.scope.get("route")
+    labels = (request.method, route.path if route is not None else "unmatched", str(status_code))
+    metrics_registry.inc("water_quality_http_requests_total", labels)
+    metrics_registry.observe("water_quality_http_request_duration_seconds", labels, seconds)
+
 # ========================================
 # STARTUP & SHUTDOWN EVENTS
 # ========================================
 rfw = None
+iot_ingest_queue: Optional[EnrichmentQueue] = None
+# Potongan fingerprint forest untuk ETag (deploy model baru = ETag baru)
+MODEL_TAG = ""
 
 @app.on_event("startup")
 def _load_model():
     """Load ML model saat aplikasi startup"""
-    global rfw
+    global rfw, iot_ingest_queue, MODEL_TAG
     
     logger.info("="*60)
     logger.info("🚀 WATER QUALITY API STARTING UP")
@@ -203,12 +760,52 @@ def _load_model():
     logger.info(f"Model path: {MODEL_PATH}")
     logger.info(f"Features order path: {FEATURES_ORDER_PATH}")
     logger.info(f"Timezone: WIB (UTC+7)")
+    if API_THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+        logger.info(f"✓ Threadpool endpoint sync: {API_THREADPOOL_SIZE} thread")
     
     try:
-        rfw = RFRegressorWrapper(MODEL_PATH, FEATURES_ORDER_PATH)
+        rfw = RFRegressorWrapper(MODEL_PATH, FEATURES_ORDER_PATH, verify_source=MODEL_SOURCE_PATH,
+                                 cache_size=PREDICTION_CACHE_SIZE,
+                                 cache_steps=_parse_cache_steps(PREDICTION_CACHE_STEPS),
+                                 threads=INFERENCE_THREADS, parallel_min_rows=INFERENCE_PARALLEL_MIN_ROWS,
+                                 processes=INFERENCE_PROCESSES)
+        rfw.stage_hook = _observe_stage
+        MODEL_TAG = rfw.engine.fingerprint()[:12]
         logger.info("✓ Model loaded successfully")
-        logger.info(f"✓ Model type: Random Forest Regressor")
+        logger.info(f"✓ Model type: Random Forest Regressor ({rfw.model_format}, {rfw.engine.n_trees} trees)")
+        if rfw.model_format == "flat" and MODEL_SOURCE_PATH:
+            logger.info(f"✓ Artefak flat terverifikasi terhadap {MODEL_SOURCE_PATH}")
+        if INFERENCE_MODE == "fast":
+            report = rfw.enable_lattice(envelope=_parse_lattice_envelope(LATTICE_ENVELOPE),
+                                        points_per_axis=LATTICE_POINTS,
+                                        max_error=LATTICE_MAX_ERROR,
+                                        path=LATTICE_PATH)
+            if report["accepted"]:
+                logger.info(f"✓ Inference mode: fast (lattice {report['points']} titik, max error log1p={report['max_abs_error_log1p']:.4f})")
+            else:
+                logger.warning(f"⚠️ Lattice ditolak: max error log1p={report['max_abs_error_log1p']:.4f} > {LATTICE_MAX_ERROR} → inference mode: exact")
+        if rfw.cache is not None:
+            logger.info(f"✓ Prediction cache: max_size={rfw.cache.max_size}, steps={rfw.cache_stats()['steps']}")
+        parallel = rfw.parallel_stats()
+        if parallel["mode"] == "processes":
+            logger.info(f"✓ Inference process pool: {parallel['process_pool']['processes']} proses, "
+                        f"forest di shared memory ({parallel['process_pool']['shared_memory_bytes']} bytes, batch >= {rfw.parallel_min_rows} baris)")
+        elif parallel["mode"] == "threads":
+            logger.info(f"✓ Inference thread pool: {rfw.threads} thread (batch >= {rfw.parallel_min_rows} baris)")
         logger.info(f"✓ Expected features: {rfw.expected_features if hasattr(rfw, 'expected_features') else 'N/A'}")
+        if IOT_INGEST_WORKERS > 0:
+            iot_ingest_queue = EnrichmentQueue(iot_data_storage, _enrich_rows, ENRICH_FIELDS,
+                                               max_queue=IOT_INGEST_QUEUE_SIZE,
+                                               workers=IOT_INGEST_WORKERS,
+                                               batch_size=IOT_INGEST_BATCH_SIZE,
+                                               max_wait_seconds=IOT_INGEST_MAX_WAIT_MS / 1000,
+                                               on_enriched=_publish_stream,
+                                               required_fields=list(rfw.features_order))
+            iot_ingest_queue.start()
+            logger.info(f"✓ IoT enrichment: async ({IOT_INGEST_WORKERS} worker, queue={IOT_INGEST_QUEUE_SIZE}, batch={IOT_INGEST_BATCH_SIZE})")
+        else:
+            logger.info("✓ IoT enrichment: inline (sinkron di /iot/data)")
     except Exception as e:
         logger.error(f"✗ Failed to load model: {str(e)}")
         raise
@@ -222,7 +819,17 @@ def _shutdown():
     """Cleanup saat aplikasi shutdown"""
     logger.info("="*60)
     logger.info("🛑 WATER QUALITY API SHUTTING DOWN")
-    logger.info(f"Total data stored: {len(iot_data_storage)} records")
+    iot_stream_hub.close()
+    if iot_ingest_queue is not None:
+        iot_ingest_queue.stop()
+        logger.info(f"IoT enrichment: {iot_ingest_queue.processed} processed, {iot_ingest_queue.dropped} dropped")
+    logger.info(f"Total data stored: {len(iot_data_storage)} records ({len(iot_devices)} device)")
+    iot_devices.flush()
+    if rfw is not None:
+        rfw.close()
+    queue_handler = next((h for h in logger.handlers if isinstance(h, DroppingQueueHandler)), None)
+    if queue_handler is not None and queue_handler.dropped:
+        logger.warning(f"Log records dropped (queue penuh): {queue_handler.dropped}")
     logger.info("="*60)
 
 # ====== DATA MODELS ======
@@ -240,6 +847,9 @@ class IoTDataInput(BaseModel):
     - EC_SLAVE_ID: Electrical Conductivity sensor
     - ECOLI_SLAVE_ID: E.Coli Fiber Optic sensor
     
+    **Multi-device**: `device_id` (opsional) menandai node/site pengirim. Setiap device punya
+    storage sendiri; tanpa `device_id` data masuk ke device default (`IOT_DEFAULT_DEVICE_ID`).
+    
     **Formula konversi**: MPN/100mL = mV / 100
     
     **Rentang Normal**:
@@ -249,11 +859,30 @@ class IoTDataInput(BaseModel):
     - Conductivity: 50-1500 μS/cm
     - Total Coliform mV: 0-1000 mV (0-10 MPN/100mL setelah konversi)
     """
-    temp_c: float = Field(..., description="Temperature in °C", example=27.8)
-    do_mgl: float = Field(..., description="Dissolved Oxygen in mg/L", example=6.2)
-    ph: float = Field(..., description="pH level", example=7.2)
-    conductivity_uscm: float = Field(..., description="Conductivity in µS/cm", example=620)
-    totalcoliform_mv_raw: Optional[float] = Field(None, description="Total Coliform raw sensor reading in mV (raw voltage from sensor)", example=50.0)
+    temp_c: float = Field(..., allow_inf_nan=False, description="Temperature in °C", example=27.8)
+    do_mgl: float = Field(..., allow_inf_nan=False, description="Dissolved Oxygen in mg/L", example=6.2)
+    ph: float = Field(..., allow_inf_nan=False, description="pH level", example=7.2)
+    conductivity_uscm: float = Field(..., allow_inf_nan=False, description="Conductivity in µS/cm", example=620)
+    totalcoliform_mv_raw: Optional[float] = Field(None, allow_inf_nan=False, description="Total Coliform raw sensor reading in mV (raw voltage from sensor)", example=50.0)
+    device_id: Optional[str] = Field(None, pattern=DEVICE_ID_PATTERN, description="ID device/site pengirim (huruf, angka, `_`, `-`, `.`; maks. 64)", example="mappi32-site-01")
+
+class IoTBulkItem(IoTDataInput):
+    """
+    Satu bacaan pada `/iot/data/bulk` (data buffer ESP32 yang dikirim ulang setelah offline).
+    
+    Sama dengan `IoTDataInput` ditambah `timestamp` dari device:
+    - epoch detik (UTC), atau
+    - string ISO 8601 (tanpa offset = dianggap WIB)
+    - kosong = waktu server saat request diterima
+    """
+    timestamp: Optional[Union[Annotated[float, Field(allow_inf_nan=False)], datetime]] = Field(None, description="Waktu pengukuran di device (epoch detik atau ISO 8601, 1970..3000)", example="2025-11-09T14:30:00+07:00")
+
+    @field_validator("timestamp")
+    @classmethod
+    def _timestamp_in_range(cls, value: Union[float, datetime, None]) -> Union[float, datetime, None]:
+        if value is not None and not 0 <= _item_epoch(value, 0.0) <= MAX_EPOCH:
+            raise ValueError("timestamp di luar rentang yang didukung (1970..3000)")
+        return value
 
 class PredictRequest(BaseModel):
     """
@@ -271,12 +900,14 @@ class PredictRequest(BaseModel):
     
     **Parameter Opsional**:
     - Total Coliform (MPN/100mL) dari sensor atau lab test
+    - `quantiles`: kuantil prediksi tambahan (0..1), mis. `[0.05, 0.5, 0.95]`
     """
     temp_c: float = Field(..., description="Temperature in °C", example=27.8)
     do_mgl: float = Field(..., description="Dissolved Oxygen in mg/L", example=6.2)
     ph: float = Field(..., description="pH level", example=7.2)
     conductivity_uscm: float = Field(..., description="Conductivity in µS/cm", example=620)
     totalcoliform_mv: Optional[float] = Field(None, description="Measured Total Coliform (MPN/100mL) - optional, akan diprediksi jika tidak ada", example=0.5)
+    quantiles: Optional[List[Annotated[float, Field(ge=0, le=1)]]] = Field(None, max_length=MAX_QUANTILES, description="Kuantil prediksi tambahan (0..1) - optional, hasil di `prediction.quantiles`", example=[0.05, 0.5, 0.95])
 
 class ThresholdRequest(BaseModel):
     """
@@ -315,6 +946,17 @@ class ThresholdRequest(BaseModel):
     do_optimal_mgl: float = 6.0
     do_low_mgl: float = 5.0
 
+class PredictBatchRequest(BaseModel):
+    """
+    Schema untuk request prediksi batch (`/predict/batch`).
+    
+    Berisi list bacaan dengan format yang sama seperti `PredictRequest`.
+    Maksimal `MAX_BATCH_SIZE` bacaan per request (default 10000).
+    `quantiles` berlaku untuk semua bacaan (bacaan dengan `quantiles` sendiri memakai miliknya).
+    """
+    readings: List[PredictRequest] = Field(..., description="Daftar bacaan sensor yang akan diprediksi")
+    quantiles: Optional[List[Annotated[float, Field(ge=0, le=1)]]] = Field(None, max_length=MAX_QUANTILES, description="Kuantil prediksi tambahan untuk semua bacaan (0..1)", example=[0.05, 0.5, 0.95])
+
 @app.get(
     "/health",
     tags=["System"],
@@ -342,9 +984,96 @@ def health():
     **Status Codes**:
     - `200 OK`: API berjalan normal
     """
-    logger.info("Health check request received")
+    logger.info("Health check request received", extra=LOG_SAMPLED)
     return {"status": "ok"}
 
+@app.get(
+    "/model/info",
+    tags=["System"],
+    summary="Info Model & Cache Prediksi",
+    response_description="Format model, jumlah tree, dan statistik cache prediksi"
+)
+def model_info():
+    """
+    ## Model Info Endpoint
+    
+    Informasi model yang sedang dipakai dan statistik cache prediksi. `distillation` berisi varian,
+    budget akurasi, dan hasil pengukuran jika model adalah artefak hasil `distill_forest.py`.
+    
+    **Response Example**:
+    ```json
+    {
+        "model_format": "joblib",
+        "inference_mode": "exact",
+        "lattice": null,
+        "n_trees": 500,
+        "n_nodes": 32826,
+        "features_order": ["temp_c", "do_mgl", "ph", "conductivity_uscm"],
+        "distillation": null,
+        "parallel": {"mode": "off", "threads": 1, "parallel_min_rows": 2048, "enabled": false, "process_pool": null},
+        "prediction_cache": {
+            "enabled": true,
+            "size": 12,
+            "max_size": 4096,
+            "hits": 340,
+            "misses": 12,
+            "evictions": 0,
+            "hit_rate": 0.966,
+            "steps": {"temp_c": 0.1, "do_mgl": 0.01, "ph": 0.01, "conductivity_uscm": 1.0}
+        }
+    }
+    ```
+    
+    **Status Codes**:
+    - `200 OK`: Info tersedia
+    """
+    return {
+        "model_format": rfw.model_format,
+        "inference_mode": rfw.inference_mode,
+        "lattice": rfw.lattice_report,
+        "n_trees": rfw.engine.n_trees,
+        "n_nodes": rfw.engine.n_nodes,
+        "features_order": rfw.features_order,
+        "distillation": (rfw.model_header or {}).get("metadata", {}).get("distillation"),
+        "parallel": rfw.parallel_stats(),
+        "prediction_cache": rfw.cache_stats()
+    }
+
+@app.get(
+    "/metrics",
+    tags=["System"],
+    summary="Metrik Prometheus",
+    response_class=PlainTextResponse,
+    response_description="Metrik latensi & throughput dalam format teks Prometheus"
+)
+def metrics():
+    """
+    ## Prometheus Metrics Endpoint
+
+    Metrik runtime untuk di-scrape Prometheus (format teks `version=0.0.4`).
+
+    **Metrik**:
+    - `water_quality_http_requests_total{method,route,status}`: jumlah request per route
+    - `water_quality_http_request_duration_seconds{method,route,status}`: histogram latensi per route
+    - `water_quality_stage_duration_seconds{endpoint,stage}`: histogram latensi per tahap
+      (`feature_array`, `forest_predict`, `tree_interval`, `forest_parallel`, `lattice_interpolate`,
+      `decide_potability`, `status_badges`, `serialization`) untuk `/predict` dan `/api/latest`
+    - `water_quality_iot_records_received_total{endpoint,result}`: record IoT diterima/ditolak
+    - `water_quality_iot_ingest_*`: event, kedalaman antrian, dan lag enrichment
+    - `water_quality_iot_storage_*`: jumlah record, ukuran, dan segment storage
+    - `water_quality_prediction_cache_*`: ukuran, hit, miss, eviction cache prediksi
+
+    **Contoh PromQL (p99 per tahap)**:
+    ```
+    histogram_quantile(0.99, sum by (stage, le) (rate(water_quality_stage_duration_seconds_bucket{endpoint="/predict"}[5m])))
+    ```
+
+    **Status Codes**:
+    - `200 OK`: Metrik tersedia
+    """
+    return PlainTextResponse(metrics_registry.render_prometheus(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post(
     "/predict",
     tags=["AI Prediction"],
@@ -394,6 +1123,12 @@ def predict(req: PredictRequest):
     - `ph`: pH level - Contoh: 7.2
     - `conductivity_uscm`: Konduktivitas (µS/cm) - Contoh: 620
     
+    **Input Opsional**:
+    - `totalcoliform_mv`: Total Coliform terukur (MPN/100mL)
+    - `quantiles`: kuantil prediksi tambahan, mis. `[0.05, 0.5, 0.95]` → `prediction.quantiles`
+      (`{"0.05": ..., "0.5": ..., "0.95": ...}`, MPN/100mL). Dihitung bersama CI90 dari satu
+      traversal forest, maks. 16 nilai.
+    
     **Response Structure**:
     ```json
     {
@@ -440,55 +1175,174 @@ def predict(req: PredictRequest):
     - `422 Validation Error`: Parameter tidak valid
     - `500 Internal Server Error`: Error pada model AI
     """
+    _metrics_endpoint.set("/predict")
+    return _serialize(_predict_result(req))
+
+def _predict_result(req: PredictRequest) -> Dict[str, Any]:
+    """Isi response `/predict` (dipakai juga oleh `/iot/predict`)"""
     # Use default thresholds
     th = ThresholdRequest()
     
     # 1) Prediksi mikroba (proxy) dari 4 fitur
-    features = {
+    features = _request_features(req)
+    infer = rfw.predict_with_interval(features, quantiles=req.quantiles)
+
+    result = _build_prediction_result(req, infer, th)
+    
+    # Log prediction
+    logger.info("AI Prediction: temp=%s°C, DO=%smg/L, pH=%s, cond=%sµS/cm → Coliform=%.3f MPN/100mL | Severity=%s | Potable=%s",
+                req.temp_c, req.do_mgl, req.ph, req.conductivity_uscm, infer.pred_total_coliform_mv,
+                result['ai_detection']['severity'], result['ai_detection']['potable'], extra=LOG_SAMPLED)
+
+    return result
+
+def _request_features(req: PredictRequest) -> Dict[str, float]:
+    """Ambil 4 fitur model dari PredictRequest"""
+    return {
         "temp_c": float(req.temp_c),
         "do_mgl": float(req.do_mgl),
         "ph": float(req.ph),
         "conductivity_uscm": float(req.conductivity_uscm),
     }
-    infer = rfw.predict_with_interval(features)
 
+def _build_prediction_result(req: PredictRequest, infer, th: ThresholdRequest, include_thresholds: bool = True,
+                             decision: Optional[DetectionDecision] = None) -> Dict[str, Any]:
+    """
+    Jalankan rules (potabilitas + badges) untuk satu hasil inferensi dan susun response `/predict`.
+    `decision` boleh diisi dari decide_potability_batch (batch) agar rules tidak dihitung ulang.
+    """
     # 2) Keputusan potabilitas (rules)
-    readings = dict(features)
+    readings = _request_features(req)
     if req.totalcoliform_mv is not None:
         readings["totalcoliform_mv"] = float(req.totalcoliform_mv)
 
     thresholds = Thresholds(**th.dict())
-    decision = decide_potability(readings, infer.pred_total_coliform_mv, thresholds)
+    if decision is None:
+        with _stage("decide_potability"):
+            decision = decide_potability(readings, infer.pred_total_coliform_mv, thresholds)
 
     # 3) Badge status per parameter
     # Badge SEMUA parameter (termasuk Total Coliform) ikut nilai ASLI dari sensor/readings
     # Badge Total Coliform ikut SENSOR (bukan prediksi AI)
     readings_for_badge = dict(readings)
-    badges = status_badges(readings_for_badge, thresholds)
-    
-    # Log prediction
-    logger.info(f"AI Prediction: temp={req.temp_c}°C, DO={req.do_mgl}mg/L, pH={req.ph}, cond={req.conductivity_uscm}µS/cm → Coliform={infer.pred_total_coliform_mv:.3f} MPN/100mL | Severity={decision.severity} | Potable={decision.potable}")
+    with _stage("status_badges"):
+        badges = status_badges(readings_for_badge, thresholds)
 
     # 4) Response
+    ai_detection = {
+        "potable": decision.potable,
+        "severity": decision.severity,  # NEW: Tambahkan severity untuk frontend
+        "reasons": decision.reasons,
+        "recommendations": decision.recommendations,
+        "alternative_use": decision.alternative_use,
+    }
+    if include_thresholds:
+        ai_detection["thresholds"] = th.dict()
+
+    prediction = {
+        "total_coliform_mv": infer.pred_total_coliform_mv,
+        "ci90_low": infer.pred_ci90_low,
+        "ci90_high": infer.pred_ci90_high,
+    }
+    if infer.pred_quantiles is not None:
+        prediction["quantiles"] = infer.pred_quantiles
+    prediction["disclaimer"] = "Estimasi AI berbasis 4 parameter fisiko-kimia (bukan hasil uji lab)."
+
     return {
         "input_used": infer.used_input,
-        "prediction": {
-            "total_coliform_mv": infer.pred_total_coliform_mv,
-            "ci90_low": infer.pred_ci90_low,
-            "ci90_high": infer.pred_ci90_high,
-            "disclaimer": "Estimasi AI berbasis 4 parameter fisiko-kimia (bukan hasil uji lab)."
-        },
-        "ai_detection": {
-            "potable": decision.potable,
-            "severity": decision.severity,  # NEW: Tambahkan severity untuk frontend
-            "reasons": decision.reasons,
-            "recommendations": decision.recommendations,
-            "alternative_use": decision.alternative_use,
-            "thresholds": th.dict()
-        },
+        "prediction": prediction,
+        "ai_detection": ai_detection,
         "status_badges": badges
     }
 
+@app.post(
+    "/predict/batch",
+    tags=["AI Prediction"],
+    summary="Prediksi Kualitas Air dengan AI (Batch)",
+    response_description="Hasil prediksi AI untuk setiap bacaan dalam batch"
+)
+def predict_batch(req: PredictBatchRequest):
+    """
+    ## AI Water Quality Prediction (Batch)
+    
+    Versi batch dari `/predict`: kirim banyak bacaan sekaligus dalam **satu** HTTP request.
+    Model dievaluasi satu kali (vektor) untuk semua baris, rules potabilitas dihitung sekaligus
+    dengan `decide_potability_batch`, lalu teks reasons/recommendations dan badge di-render per baris.
+    
+    **Use Case**:
+    - Dashboard yang menampilkan banyak titik data
+    - Backfill / analisis ulang data historis
+    
+    **Request Body**:
+    ```json
+    {
+        "readings": [
+            {"temp_c": 27.8, "do_mgl": 6.2, "ph": 7.2, "conductivity_uscm": 620},
+            {"temp_c": 38.0, "do_mgl": 4.5, "ph": 6.1, "conductivity_uscm": 1200, "totalcoliform_mv": 1.2}
+        ]
+    }
+    ```
+    
+    **Response Structure**:
+    ```json
+    {
+        "count": 2,
+        "results": [
+            {"input_used": {...}, "prediction": {...}, "ai_detection": {...}, "status_badges": {...}},
+            {"input_used": {...}, "prediction": {...}, "ai_detection": {...}, "status_badges": {...}}
+        ],
+        "thresholds": {...}
+    }
+    ```
+    
+    Urutan `results` sama dengan urutan `readings`. Thresholds dikirim sekali di level atas
+    (tidak diulang di setiap `ai_detection`).
+    
+    **Status Codes**:
+    - `200 OK`: Prediksi berhasil
+    - `413 Payload Too Large`: Jumlah bacaan melebihi `MAX_BATCH_SIZE`
+    - `422 Validation Error`: Parameter tidak valid
+    - `500 Internal Server Error`: Error pada model AI
+    """
+    if len(req.readings) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Maksimal {MAX_BATCH_SIZE} bacaan per batch (dikirim: {len(req.readings)})")
+
+    th = ThresholdRequest()
+
+    # 1) Prediksi semua baris dalam satu pass (kuantil = gabungan semua yang diminta, satu partition)
+    wanted = [r.quantiles if r.quantiles is not None else req.quantiles for r in req.readings]
+    union = sorted({q for qs in wanted if qs for q in qs})
+    if len(union) > MAX_QUANTILES:
+        raise HTTPException(status_code=422, detail=f"Maksimal {MAX_QUANTILES} kuantil berbeda per batch (diminta: {len(union)})")
+    infers = rfw.predict_batch_with_interval([_request_features(r) for r in req.readings], quantiles=union or None)
+    if union:
+        infers = [replace(infer, pred_quantiles={quantile_key(q): infer.pred_quantiles[quantile_key(q)] for q in qs}
+                          if qs is not None else None)
+                  for infer, qs in zip(infers, wanted)]
+
+    # 2) Rules potabilitas untuk semua baris sekaligus (mask NumPy), teks di-render per baris
+    decisions = decide_potability_batch(
+        [r.temp_c for r in req.readings],
+        [r.do_mgl for r in req.readings],
+        [r.ph for r in req.readings],
+        [r.conductivity_uscm for r in req.readings],
+        sensor_coliform=[r.totalcoliform_mv for r in req.readings],
+        predicted_coliform_mpn_100ml=[infer.pred_total_coliform_mv for infer in infers],
+        thresholds=Thresholds(**th.dict())
+    )
+
+    # 3) Susun response per baris
+    results = [_build_prediction_result(r, infer, th, include_thresholds=False, decision=decisions.decision(i))
+               for i, (r, infer) in enumerate(zip(req.readings, infers))]
+
+    logger.info(f"AI Batch Prediction: {len(results)} readings")
+
+    return {
+        "count": len(results),
+        "results": results,
+        "thresholds": th.dict()
+    }
+
 # ====== IoT ENDPOINTS ======
 
 def convert_mv_to_mpn(mv_value: Optional[float]) -> Optional[float]:
@@ -516,6 +1370,14 @@ def convert_mv_to_mpn(mv_value: Optional[float]) -> Optional[float]:
     # Batasi nilai minimum ke 0 (tidak boleh negatif, kecuali -1)
     return max(0.0, mpn_100ml)
 
+def convert_mv_to_mpn_array(mv_values: np.ndarray) -> np.ndarray:
+    """
+    Versi vektor `convert_mv_to_mpn` untuk banyak bacaan sekaligus
+    (NaN = tidak ada sensor, -1 = sensor rusak diteruskan, selain itu max(0, mV / 100)).
+    """
+    mv_values = np.asarray(mv_values, dtype=np.float64)
+    return np.where(mv_values == -1, -1.0, np.maximum(0.0, mv_values / 100.0))
+
 @app.post(
     "/iot/data",
     tags=["IoT Data Management"],
@@ -530,9 +1392,15 @@ def receive_iot_data(data: IoTDataInput):
     
     **Hardware Integration**:
     - ESP32 via LoRa/WiFi POST data sensor ke endpoint ini
-    - Data disimpan di in-memory deque (maxlen=1000)
+    - Data disimpan di storage kolumnar persisten (`IOT_STORAGE_DIR`)
     - Konversi otomatis sensor mV_raw → MPN/100mL
     - Timestamp ditambahkan otomatis (WIB/UTC+7)
+    - **Enrichment saat ingest**: prediksi AI + CI90, severity/potable dan level badge dihitung
+      sekali lalu disimpan bersama record (dipakai ulang oleh `/iot/history`)
+    - **ACK cepat**: secara default data mentah langsung disimpan dan response dikirim tanpa
+      menunggu model; enrichment dikerjakan worker background dalam micro-batch
+      (`IOT_INGEST_WORKERS`, `IOT_INGEST_QUEUE_SIZE`). Selama antre, `prediction`,
+      `ai_detection`, dan `badge_levels` bernilai `null`. `IOT_INGEST_WORKERS=0` = inline/sinkron.
     - **Sensor IDs didefinisikan di backend** (tidak perlu dikirim dari IoT device)
     
     **Sensor Mapping (Hardcoded)**:
@@ -571,16 +1439,26 @@ def receive_iot_data(data: IoTDataInput):
             "ph": 7.2,
             "conductivity_uscm": 620,
             "totalcoliform_mv_raw": 50.0,
-            "totalcoliform_mv": 0.5
+            "totalcoliform_mv": 0.5,
+            "prediction": null,
+            "ai_detection": null,
+            "badge_levels": null
         },
+        "enrichment": "queued",
         "total_records": 42
     }
     ```
     
+    **Status `enrichment`**:
+    - `queued`: masuk antrian worker (hasil muncul di `/iot/latest` & `/iot/history` setelah diproses)
+    - `dropped`: antrian penuh, record disimpan tanpa prediksi
+    - `inline`: sudah di-enrich sebelum response (`IOT_INGEST_WORKERS=0`)
+    - `failed`: inferensi inline gagal, record disimpan tanpa prediksi
+    
     **Storage**:
-    - In-memory (non-persistent)
-    - Max 1000 data points (FIFO queue)
-    - Data hilang saat restart server
+    - Persisten di disk (segment kolumnar append-only, memory-mapped)
+    - Tetap ada setelah restart server
+    - Retensi otomatis berdasarkan ukuran (`IOT_RETENTION_MAX_MB`) dan umur (`IOT_RETENTION_MAX_DAYS`)
     
     **ESP32 Example Code**:
     ```cpp
@@ -597,7 +1475,10 @@ def receive_iot_data(data: IoTDataInput):
     - `200 OK`: Data berhasil disimpan
     - `422 Validation Error`: Format data tidak valid
     - `500 Internal Server Error`: Error penyimpanan data
+    - `503 Service Unavailable`: `device_id` baru, tetapi jumlah device sudah mencapai `IOT_MAX_DEVICES`
     """
+    device_id = data.device_id or IOT_DEFAULT_DEVICE_ID
+    store = _ingest_store(device_id)
     try:
         # Konversi sensor mV ke MPN/100mL (input field is raw mV)
         totalcoliform_mpn = convert_mv_to_mpn(data.totalcoliform_mv_raw)
@@ -611,12 +1492,13 @@ def receive_iot_data(data: IoTDataInput):
             coliform_display = "N/A"
 
         # Log incoming IoT data
-        logger.info(f"📡 IoT Data received: temp={data.temp_c}°C, DO={data.do_mgl}mg/L, pH={data.ph}, cond={data.conductivity_uscm}µS/cm, coliform_mv_raw={data.totalcoliform_mv_raw}mV → {coliform_display} MPN/100mL")
+        logger.info("📡 IoT Data received [%s]: temp=%s°C, DO=%smg/L, pH=%s, cond=%sµS/cm, coliform_mv_raw=%smV → %s MPN/100mL",
+                    device_id, data.temp_c, data.do_mgl, data.ph, data.conductivity_uscm, data.totalcoliform_mv_raw,
+                    coliform_display, extra=LOG_SAMPLED)
 
-        # Simpan data dengan timestamp WIB dan sensor IDs (dari config backend)
-        iot_record = {
-            "timestamp": datetime.now(WIB).isoformat(),  # Timestamp dengan WIB timezone
-            "sensor_ids": SENSOR_IDS,  # Tambahkan sensor IDs dari config backend
+        # Simpan data dengan timestamp (epoch, ditampilkan sebagai WIB) ke storage kolumnar
+        row = {
+            "timestamp": time.time(),
             "temp_c": data.temp_c,
             "do_mgl": data.do_mgl,
             "ph": data.ph,
@@ -625,27 +1507,428 @@ def receive_iot_data(data: IoTDataInput):
             "totalcoliform_mv": totalcoliform_mpn
         }
 
-        iot_data_storage.append(iot_record)
+        if iot_ingest_queue is not None:
+            # Async: simpan data mentah dulu, enrichment ditulis belakangan oleh worker
+            seq = store.append(row)
+            enrichment = "queued" if iot_ingest_queue.submit(seq, row, store) else "dropped"
+            if enrichment == "dropped":
+                logger.warning(f"⚠️ IoT enrichment queue penuh, record seq={seq} disimpan tanpa prediksi")
+        else:
+            # Inline: prediksi, CI90, severity/potable, badge dihitung sebelum disimpan
+            # (jika inferensi gagal, data mentah tetap disimpan tanpa enrichment)
+            enrichment = "inline"
+            try:
+                columns = {k: np.array([np.nan if v is None else v], dtype=np.float64) for k, v in row.items()}
+                row.update({k: v[0].item() for k, v in _enrich_rows(columns).items()})
+            except Exception as e:
+                enrichment = "failed"
+                logger.error(f"✗ IoT enrichment failed, storing raw data only: {str(e)}")
+            seq = store.append(row)
+            if enrichment == "inline":
+                _publish_stream(np.array([seq]), store)
+
+        # Sensor IDs ditambahkan dari config backend saat materialisasi
+        stored = store.blank_row()
+        stored.update({k: v for k, v in row.items() if v is not None})
+        stored["seq"] = seq
+        iot_record = _materialize_record(stored)
 
-        logger.info(f"✓ IoT data stored successfully. Total records: {len(iot_data_storage)}")
+        metrics_registry.inc("water_quality_iot_records_received_total", ("/iot/data", "stored"))
+        logger.info("✓ IoT data stored successfully. Total records: %d", len(store), extra=LOG_SAMPLED)
 
         return {
             "status": "success",
             "message": "Data received from IoT device",
+            "device_id": device_id,
             "data": iot_record,
-            "total_records": len(iot_data_storage)
+            "enrichment": enrichment,
+            "total_records": len(store)
         }
     except Exception as e:
         logger.error(f"✗ Failed to store IoT data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _ingest_store(device_id: str):
+    """Storage tujuan ingest; device baru didaftarkan otomatis (503 jika IOT_MAX_DEVICES tercapai)"""
+    try:
+        return iot_devices.get_or_create(device_id)
+    except DeviceLimitError as e:
+        logger.warning(f"⚠️ Device baru '{device_id}' ditolak: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Batas /iot/data/bulk: jumlah bacaan per request dan ukuran body setelah dekompresi gzip
+IOT_BULK_MAX_ITEMS = int(os.getenv("IOT_BULK_MAX_ITEMS", "10000"))
+IOT_BULK_MAX_BYTES = int(os.getenv("IOT_BULK_MAX_BYTES", str(16 * 1024 * 1024)))
+
+_bulk_items_adapter = TypeAdapter(List[IoTBulkItem])
+
+def _decode_bulk_body(raw: bytes, content_encoding: str) -> List[Any]:
+    """
+    Decode body `/iot/data/bulk` (gzip opsional) menjadi list item mentah.
+    Mendukung JSON array dan NDJSON (satu objek JSON per baris).
+    """
+    if "gzip" in content_encoding.lower() or raw[:2] == b"\x1f\x8b":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            raw = decompressor.decompress(raw, IOT_BULK_MAX_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Body gzip tidak valid: {str(e)}")
+    if len(raw) > IOT_BULK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body terlalu besar (maks {IOT_BULK_MAX_BYTES} bytes)")
+
+    try:
+        text = raw.decode("utf-8").strip()
+        if text.startswith("["):
+            items = json.loads(text)
+        else:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body bukan teks UTF-8 yang valid: {str(e)}")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body bukan JSON array / NDJSON yang valid: {str(e)}")
+    if not items:
+        raise HTTPException(status_code=400, detail="Tidak ada bacaan di body")
+    if len(items) > IOT_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Maksimal {IOT_BULK_MAX_ITEMS} bacaan per request (diterima {len(items)})")
+    return items
+
+def _validate_bulk_items(items: List[Any]) -> tuple:
+    """
+    Validasi semua item dalam satu pass. Return (index valid, item valid, {index: errors}).
+    Jika ada item invalid, hanya subset valid yang divalidasi ulang.
+    """
+    try:
+        return list(range(len(items))), _bulk_items_adapter.validate_python(items), {}
+    except ValidationError as e:
+        errors: Dict[int, List[str]] = {}
+        for err in e.errors():
+            index = err["loc"][0]
+            field = ".".join(str(part) for part in err["loc"][1:]) or "item"
+            errors.setdefault(index, []).append(f"{field}: {err['msg']}")
+        valid_index = [i for i in range(len(items)) if i not in errors]
+        return valid_index, _bulk_items_adapter.validate_python([items[i] for i in valid_index]), errors
+
+def _item_epoch(value: Union[float, datetime, None], received_at: float) -> float:
+    """Timestamp device → epoch detik (ISO tanpa offset dianggap WIB)"""
+    if value is None:
+        return received_at
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=WIB)).timestamp()
+    return float(value)
+
+def _ingest_bulk(items: List[Any]) -> Dict[str, Any]:
+    """Validasi, konversi, dan simpan semua bacaan bulk dalam satu operasi storage"""
+    received_at = time.time()
+    valid_index, readings, errors = _validate_bulk_items(items)
+    results: List[Dict[str, Any]] = [
+        {"index": i, "status": "rejected", "errors": errors[i]} for i in range(len(items)) if i in errors
+    ]
+    if not readings:
+        raise HTTPException(status_code=422, detail={"message": "Semua bacaan tidak valid", "items": results})
+
+    columns = {
+        "timestamp": np.array([_item_epoch(r.timestamp, received_at) for r in readings], dtype=np.float64),
+        "temp_c": np.array([r.temp_c for r in readings], dtype=np.float64),
+        "do_mgl": np.array([r.do_mgl for r in readings], dtype=np.float64),
+        "ph": np.array([r.ph for r in readings], dtype=np.float64),
+        "conductivity_uscm": np.array([r.conductivity_uscm for r in readings], dtype=np.float64),
+        "totalcoliform_mv_raw": np.array([np.nan if r.totalcoliform_mv_raw is None else r.totalcoliform_mv_raw
+                                          for r in readings], dtype=np.float64),
+    }
+    columns["totalcoliform_mv"] = convert_mv_to_mpn_array(columns["totalcoliform_mv_raw"])
+    n = len(readings)
+
+    # Kelompokkan per device (storage didaftarkan dulu agar batas device dicek sebelum ada yang ditulis)
+    device_ids = np.array([r.device_id or IOT_DEFAULT_DEVICE_ID for r in readings])
+    stores = {device_id: _ingest_store(device_id) for device_id in dict.fromkeys(device_ids.tolist())}
+    seqs = np.empty(n, dtype=np.int64)
+    enrichment = np.empty(n, dtype=object)
+    for device_id, store in stores.items():
+        # Replay buffer device: simpan urut waktu pengukuran (stable, urutan kirim dipertahankan jika sama)
+        rows = np.flatnonzero(device_ids == device_id)
+        rows = rows[np.argsort(columns["timestamp"][rows], kind="stable")]
+        first_seq, seqs[rows], enrichment[rows] = _store_columns(store, {k: v[rows] for k, v in columns.items()})
+        logger.info(f"📦 IoT bulk [{device_id}]: {len(rows)} stored (seq {first_seq}-{first_seq + len(rows) - 1})")
+
+    for pos in range(n):
+        results.append({
+            "index": valid_index[pos],
+            "status": "stored",
+            "device_id": str(device_ids[pos]),
+            "seq": int(seqs[pos]),
+            "enrichment": str(enrichment[pos])
+        })
+    results.sort(key=lambda item: item["index"])
+
+    metrics_registry.inc("water_quality_iot_records_received_total", ("/iot/data/bulk", "stored"), n)
+    metrics_registry.inc("water_quality_iot_records_received_total", ("/iot/data/bulk", "rejected"), len(errors))
+    dropped = int((enrichment == "dropped").sum())
+    logger.info(f"📦 IoT bulk data: {len(items)} received, {n} stored ({len(stores)} device), "
+                f"{len(errors)} rejected, {dropped} enrichment dropped")
+    return {
+        "status": "success" if not errors else "partial",
+        "received": len(items),
+        "stored": n,
+        "rejected": len(errors),
+        # seq per device; first_seq hanya bermakna jika semua bacaan dari satu device
+        "first_seq": int(seqs.min()) if len(stores) == 1 else None,
+        "items": results,
+        "total_records": sum(len(store) for store in stores.values())
+    }
+
+def _store_columns(store, columns: Dict[str, np.ndarray]) -> tuple:
+    """Simpan N baris (urut) ke satu storage + enrichment. Return (seq pertama, seqs, status enrichment)."""
+    n = len(columns["timestamp"])
+    if iot_ingest_queue is not None:
+        first_seq, _ = store.append_many(columns)
+        seqs = np.arange(first_seq, first_seq + n, dtype=np.int64)
+        queued = iot_ingest_queue.submit_many(seqs, columns, store)
+        return first_seq, seqs, np.where(queued, "queued", "dropped")
+    try:
+        columns = {**columns, **_enrich_rows(columns)}
+        enrichment = np.full(n, "inline")
+    except Exception as e:
+        logger.error(f"✗ IoT bulk enrichment failed, storing raw data only: {str(e)}")
+        enrichment = np.full(n, "failed")
+    first_seq, _ = store.append_many(columns)
+    seqs = np.arange(first_seq, first_seq + n, dtype=np.int64)
+    if enrichment[0] == "inline":
+        _publish_stream(seqs, store)
+    return first_seq, seqs, enrichment
+
+@app.post(
+    "/iot/data/bulk",
+    tags=["IoT Data Management"],
+    summary="Terima Banyak Data Sensor Sekaligus (Bulk)",
+    response_description="Status per bacaan dan total records",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": IoTBulkItem.model_json_schema()}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def receive_iot_data_bulk(request: Request):
+    """
+    ## IoT Bulk Ingestion Endpoint
+    
+    Endpoint untuk mengirim **banyak bacaan sekaligus**, misalnya saat ESP32 tersambung
+    kembali setelah offline dan mengirim ulang data yang di-buffer.
+    
+    **Use Case**:
+    - Replay buffer device setelah gangguan jaringan (ratusan sampel dalam 1 request)
+    - Upload data dari logger SD card
+    
+    **Format Body**:
+    - JSON array: `[{...}, {...}]`
+    - NDJSON (`Content-Type: application/x-ndjson`): satu objek JSON per baris
+    - Boleh dikompresi gzip (`Content-Encoding: gzip`)
+    
+    **Field per bacaan**: sama dengan `/iot/data`, ditambah `timestamp` opsional dari device
+    (epoch detik atau ISO 8601; tanpa offset = WIB; kosong = waktu server).
+    
+    **Proses**:
+    - Semua bacaan divalidasi dalam satu pass; bacaan invalid ditolak per item (bacaan lain tetap disimpan)
+    - Konversi mV → MPN/100mL dilakukan vektor untuk seluruh batch
+    - Bacaan diurutkan berdasarkan timestamp lalu disimpan dalam satu operasi storage
+    - Enrichment (prediksi AI) masuk antrian worker seperti `/iot/data`
+    
+    **Request Example**:
+    ```json
+    [
+        {"timestamp": "2025-11-09T14:00:00+07:00", "temp_c": 27.8, "do_mgl": 6.2, "ph": 7.2, "conductivity_uscm": 620},
+        {"timestamp": 1762673700, "temp_c": 27.9, "do_mgl": 6.1, "ph": 7.3, "conductivity_uscm": 625, "totalcoliform_mv_raw": 50.0}
+    ]
+    ```
+    
+    **Response Example**:
+    ```json
+    {
+        "status": "partial",
+        "received": 3,
+        "stored": 2,
+        "rejected": 1,
+        "first_seq": 120,
+        "items": [
+            {"index": 0, "status": "stored", "seq": 120, "enrichment": "queued"},
+            {"index": 1, "status": "rejected", "errors": ["ph: Field required"]},
+            {"index": 2, "status": "stored", "seq": 121, "enrichment": "queued"}
+        ],
+        "total_records": 122
+    }
+    ```
+    
+    **Example Request**:
+    ```bash
+    gzip -c buffer.ndjson | curl -X POST "http://localhost:8000/iot/data/bulk" \\
+      -H "Content-Type: application/x-ndjson" -H "Content-Encoding: gzip" --data-binary @-
+    ```
+    
+    **Status Codes**:
+    - `200 OK`: Minimal satu bacaan tersimpan (cek `status` per item)
+    - `400 Bad Request`: Body bukan JSON array / NDJSON / gzip yang valid
+    - `413 Payload Too Large`: Melebihi `IOT_BULK_MAX_ITEMS` atau `IOT_BULK_MAX_BYTES`
+    - `422 Validation Error`: Semua bacaan tidak valid
+    """
+    raw = await request.body()
+    items = _decode_bulk_body(raw, request.headers.get("content-encoding", ""))
+    try:
+        return await run_in_threadpool(_ingest_bulk, items)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"✗ Failed to store IoT bulk data: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get(
+    "/iot/ingest/stats",
+    tags=["IoT Data Management"],
+    summary="Statistik Pipeline Enrichment IoT",
+    response_description="Kedalaman antrian, lag, dan counter drop enrichment"
+)
+def iot_ingest_stats():
+    """
+    ## IoT Ingest Pipeline Stats
+    
+    Monitoring antrian enrichment background (prediksi AI untuk data dari `/iot/data`).
+    
+    **Use Case**:
+    - Memantau backlog saat burst data sensor
+    - Alert jika `dropped` / `failed` naik atau `lag_seconds` terlalu besar
+    
+    **Response Example**:
+    ```json
+    {
+        "mode": "async",
+        "workers": 1,
+        "queue_depth": 0,
+        "max_queue": 10000,
+        "in_flight": 0,
+        "batch_size": 256,
+        "max_wait_ms": 20.0,
+        "enqueued": 1200,
+        "processed": 1200,
+        "dropped": 0,
+        "failed": 0,
+        "batches": 35,
+        "last_batch_size": 12,
+        "lag_seconds": 0.0,
+        "last_lag_seconds": 0.031,
+        "max_lag_seconds": 0.210,
+        "storage": {...},
+        "devices": {"devices": 12, "max_devices": 500, "default_device": "default", "rejected": 0},
+        "stream": {"subscribers": 3, "published": 1200, "dropped": 0, ...}
+    }
+    ```
+    
+    **Keterangan**:
+    - `queue_depth`: record yang menunggu di antrian
+    - `lag_seconds`: umur record tertua yang masih antre
+    - `last_lag_seconds` / `max_lag_seconds`: waktu antre → tersimpan untuk batch terakhir / terburuk
+    - `dropped`: record yang tidak masuk antrian karena penuh (tersimpan tanpa prediksi)
+    
+    **Status Codes**:
+    - `200 OK`: Statistik tersedia
+    """
+    stats = iot_ingest_queue.stats() if iot_ingest_queue is not None else {"mode": "inline"}
+    stats["storage"] = iot_data_storage.stats()
+    stats["devices"] = iot_devices.stats()
+    stats["stream"] = iot_stream_hub.stats()
+    return stats
+
+def _stream_backlog(last_event_id: Optional[str], replay: int) -> tuple:
+    """
+    Event awal untuk koneksi stream baru: record setelah `Last-Event-ID` (reconnect) atau
+    `replay` record terbaru. Maksimal `IOT_STREAM_BUFFER` record.
+    """
+    stop = iot_data_storage.next_seq
+    try:
+        start = int(last_event_id) + 1 if last_event_id else stop - replay
+    except ValueError:
+        start = stop - replay
+    start = max(start, stop - iot_stream_hub.buffer_size, iot_data_storage.first_seq)
+    return _stream_events(start, stop) if start < stop else []
+
+@app.get(
+    "/iot/stream",
+    tags=["IoT Data Management"],
+    summary="Stream Data Sensor Real-time (SSE)",
+    response_class=StreamingResponse,
+    response_description="Server-Sent Events: satu event `reading` per record baru"
+)
+async def iot_stream(request: Request, replay: int = 1):
+    """
+    ## IoT Live Stream (Server-Sent Events)
+    
+    Pengganti polling `/api/latest` / `/iot/latest`: server mendorong setiap record baru beserta
+    prediksi dan keputusan kelayakan ke semua dashboard yang terhubung. Hasil dihitung **sekali
+    per record** (saat enrichment) lalu dibagikan ke semua subscriber, sehingga beban server
+    mengikuti laju data sensor, bukan jumlah viewer.
+    
+    **Use Case**:
+    - Dashboard real-time tanpa polling
+    - Layar monitor / kiosk
+    
+    **Query Parameters**:
+    - `replay` (integer): Jumlah record terbaru yang dikirim saat connect (default: 1, max: `IOT_STREAM_BUFFER`)
+    
+    **Event**:
+    ```
+    id: 120
+    event: reading
+    data: {"timestamp": "...", "sensor_data": {...}, "prediction": {...}, "status": {...}, "badges": {...}}
+    ```
+    - `reading`: satu record baru, format `data` sama dengan response `GET /api/latest`; `id` = seq record
+    - `dropped`: client terlalu lambat, sejumlah event tertua dibuang (`{"dropped": 5}`); ambil ulang via `/iot/history`
+    - Komentar `: keep-alive` dikirim setiap `IOT_STREAM_HEARTBEAT_SECONDS` saat tidak ada data
+    
+    Koneksi ditutup server setiap `IOT_STREAM_MAX_SECONDS`; `EventSource` otomatis reconnect dengan
+    header `Last-Event-ID` dan record yang terlewat dikirim ulang.
+    
+    **Contoh (browser)**:
+    ```js
+    const es = new EventSource(`${API_BASE}/iot/stream`);
+    es.addEventListener("reading", (e) => render(JSON.parse(e.data)));
+    ```
+    
+    **Status Codes**:
+    - `200 OK`: Stream dibuka (`text/event-stream`)
+    - `503 Service Unavailable`: Jumlah koneksi stream mencapai `IOT_STREAM_MAX_SUBSCRIBERS`
+    """
+    if iot_stream_hub.stats()["subscribers"] >= iot_stream_hub.max_subscribers:
+        raise HTTPException(status_code=503, detail="Terlalu banyak koneksi stream, coba lagi nanti")
+    replay = min(max(replay, 0), iot_stream_hub.buffer_size)
+    last_event_id = request.headers.get("last-event-id")
+
+    async def events():
+        # subscribe dulu sebelum membaca backlog agar record di antaranya tidak terlewat
+        subscriber = iot_stream_hub.subscribe()
+        if subscriber is None:
+            return
+        try:
+            yield f"retry: {IOT_STREAM_RETRY_MS}\n\n"
+            backlog = await run_in_threadpool(_stream_backlog, last_event_id, replay)
+            for _, payload in backlog:
+                yield payload
+            async for payload in iot_stream_hub.listen(subscriber, {seq for seq, _ in backlog},
+                                                       IOT_STREAM_MAX_SECONDS or None):
+                yield payload
+        finally:
+            iot_stream_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get(
     "/iot/latest",
     tags=["IoT Data Management"],
     summary="Dapatkan Data Sensor Terbaru",
     response_description="Data sensor terbaru dengan status badges"
 )
-def get_latest_iot_data():
+async def get_latest_iot_data(request: Request):
     """
     ## Latest IoT Data Endpoint
     
@@ -706,20 +1989,40 @@ def get_latest_iot_data():
     }
     ```
     
+    **Caching**: response membawa `ETag`; kirim ulang lewat `If-None-Match` untuk mendapat
+    `304 Not Modified` selama belum ada data baru.
+    
     **Status Codes**:
     - `200 OK`: Data tersedia (atau no_data)
+    - `304 Not Modified`: `If-None-Match` cocok, belum ada data baru
     """
-    if len(iot_data_storage) == 0:
+    latest_row = iot_data_storage.latest()
+    if latest_row is None:
         logger.warning("No IoT data available - storage is empty")
         return {
             "status": "no_data",
             "message": "No IoT data available yet",
             "data": None
         }
+
+    # Response hanya berubah saat ada append (seq / total record) atau record terbaru selesai di-enrich
+    key = (latest_row["seq"], latest_row["severity"] >= 0, len(iot_data_storage))
+    etag = f'"iot-latest-{BOOT_ID}-{key[0]}-{int(key[1])}-{key[2]}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    cached = latest_iot_view.get(key)
+    if cached is None:
+        body = await run_in_threadpool(_render_latest_iot, latest_row, key[2])
+        latest_iot_view.put(key, etag, body)
+    else:
+        body = cached[2]
+    return _cached_json(body, etag)
+
+def _render_latest_iot(latest_row: Dict[str, Any], total_records: int, device_id: Optional[str] = None) -> bytes:
+    """Body JSON `/iot/latest` (atau `/devices/{id}/latest`) untuk satu baris storage"""
+    latest = _materialize_record(latest_row)
     
-    latest = iot_data_storage[-1]
-    
-    logger.info(f"Fetching latest IoT data: timestamp={latest.get('timestamp')}")
+    logger.info("Fetching latest IoT data: timestamp=%s", latest.get('timestamp'), extra=LOG_SAMPLED)
     
     # Generate badges untuk semua parameter termasuk coliform sensor
     # Gunakan default thresholds
@@ -736,13 +2039,15 @@ def get_latest_iot_data():
     
     badges = status_badges(readings_for_badge, th)
     
-    return {
+    body = {"device_id": device_id} if device_id is not None else {}
+    return _serialize({
         "status": "success",
+        **body,
         "data": latest,
         "badges": badges,
         "sensor_ids": SENSOR_IDS,  # Include sensor IDs configuration
-        "total_records": len(iot_data_storage)
-    }
+        "total_records": total_records
+    }).body
 
 @app.get(
     "/iot/history",
@@ -750,7 +2055,8 @@ def get_latest_iot_data():
     summary="Dapatkan History Data IoT",
     response_description="Daftar data sensor historis"
 )
-def get_iot_history(limit: int = 50):
+def get_iot_history(request: Request, response: Response, limit: int = 50, include_details: bool = False,
+                    after_seq: Optional[int] = None, before_seq: Optional[int] = None):
     """
     ## IoT History Data Endpoint
     
@@ -762,7 +2068,23 @@ def get_iot_history(limit: int = 50):
     - Export data untuk laporan
     
     **Query Parameters**:
-    - `limit` (integer): Jumlah data terbaru (default: 50, max: 1000)
+    - `limit` (integer): Jumlah data terbaru (default: 50, max: `IOT_HISTORY_MAX_LIMIT`, default 10000)
+    - `include_details` (boolean): Sertakan reasons/recommendations/alternative_use dan label
+      badge lengkap (`status_badges`) per record (default: false)
+    - `after_seq` (integer, opsional): hanya record dengan `seq` > after_seq (maks. `limit` record
+      terlama setelah cursor) — untuk mengambil data baru saja
+    - `before_seq` (integer, opsional): `limit` record terbaru dengan `seq` < before_seq — untuk
+      halaman data lama
+    
+    **Cursor**: setiap record membawa `seq` (naik monoton, tidak di-reset oleh clear). Response
+    berisi `next_cursor` (seq terbaru yang sudah diterima → kirim sebagai `after_seq` berikutnya),
+    `prev_cursor` (seq terlama di halaman → kirim sebagai `before_seq`; `null` jika sudah record
+    pertama) dan `has_more` (masih ada record ke arah cursor yang diminta). Hanya baris halaman
+    yang dibaca dari storage, jadi biaya per request O(limit), bukan O(total record).
+    
+    **Enrichment**: Prediksi AI, CI90, severity/potable dan level badge dihitung **sekali saat
+    ingest** (`/iot/data`) dan dikembalikan inline — tidak perlu memanggil `/predict` per baris.
+    Record yang belum di-enrich berisi `prediction`/`ai_detection`/`badge_levels` = `null`.
     
     **Response Example**:
     ```json
@@ -770,6 +2092,7 @@ def get_iot_history(limit: int = 50):
         "status": "success",
         "data": [
             {
+                "seq": 41,
                 "timestamp": "2025-11-07T14:30:00",
                 "sensor_ids": {
                     "ph_temp": "PH_TEMP_SLAVE_ID",
@@ -782,9 +2105,13 @@ def get_iot_history(limit: int = 50):
                 "ph": 7.2,
                 "conductivity_uscm": 620,
                 "totalcoliform_mv_raw": 50.0,
-                "totalcoliform_mv": 0.5
+                "totalcoliform_mv": 0.5,
+                "prediction": {"total_coliform_mv": 0.45, "ci90_low": 0.2, "ci90_high": 0.85},
+                "ai_detection": {"potable": true, "severity": "safe"},
+                "badge_levels": {"temp_c": "optimal", "ph": "optimal", "do_mgl": "optimal", "conductivity_uscm": "optimal", "totalcoliform_mv": "optimal"}
             },
             {
+                "seq": 40,
                 "timestamp": "2025-11-07T13:30:00",
                 "sensor_ids": {
                     "ph_temp": "PH_TEMP_SLAVE_ID",
@@ -807,7 +2134,10 @@ def get_iot_history(limit: int = 50):
             "totalcoliform": "ECOLI_SLAVE_ID"
         },
         "count": 2,
-        "total_records": 42
+        "total_records": 42,
+        "next_cursor": 41,
+        "prev_cursor": 40,
+        "has_more": true
     }
     ```
     
@@ -830,34 +2160,274 @@ def get_iot_history(limit: int = 50):
     # Ambil 10 data terbaru
     curl "http://localhost:8000/iot/history?limit=10"
     
-    # Ambil semua data (max 1000)
+    # Ambil 1000 data terbaru
     curl "http://localhost:8000/iot/history?limit=1000"
+    
+    # Polling: hanya record setelah seq 41
+    curl "http://localhost:8000/iot/history?after_seq=41"
+    
+    # Halaman sebelumnya (record lebih lama dari seq 40)
+    curl "http://localhost:8000/iot/history?before_seq=40&limit=50"
     ```
     
+    **Caching**: response membawa `ETag` (berubah setiap ada data baru / enrichment / clear);
+    kirim ulang lewat `If-None-Match` untuk mendapat `304 Not Modified`.
+    
     **Status Codes**:
     - `200 OK`: Data tersedia (atau no_data jika kosong)
+    - `304 Not Modified`: `If-None-Match` cocok, data belum berubah
+    - `400 Bad Request`: `after_seq` dan `before_seq` dipakai bersamaan, atau cursor negatif
     """
-    logger.info(f"Fetching IoT history: limit={limit}, total_records={len(iot_data_storage)}")
-    
-    if len(iot_data_storage) == 0:
+    _check_cursors(after_seq, before_seq)
+
+    # ETag = versi storage (naik pada setiap append/update/clear); dibaca sebelum data agar tidak pernah basi
+    etag = f'"iot-history-{BOOT_ID}-{iot_data_storage.version}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return _history_page(iot_data_storage, limit, include_details, after_seq, before_seq)
+
+def _check_cursors(after_seq: Optional[int], before_seq: Optional[int]) -> None:
+    if after_seq is not None and before_seq is not None:
+        raise HTTPException(status_code=400, detail="Gunakan salah satu: `after_seq` atau `before_seq`")
+    if (after_seq is not None and after_seq < -1) or (before_seq is not None and before_seq < 0):
+        raise HTTPException(status_code=400, detail="Cursor harus >= 0 (`after_seq=-1` = dari record pertama)")
+
+def _history_page(store, limit: int, include_details: bool, after_seq: Optional[int],
+                  before_seq: Optional[int]) -> Dict[str, Any]:
+    """Satu halaman history (cursor) dari storage satu device"""
+    logger.info("Fetching IoT history: limit=%d, after_seq=%s, before_seq=%s, total_records=%d",
+                limit, after_seq, before_seq, len(store), extra=LOG_SAMPLED)
+    
+    # Batas seq dibaca sebelum halaman: record yang masuk setelahnya terambil di polling berikutnya
+    first_seq, end_seq = store.first_seq, store.next_seq
+    if len(store) == 0:
         logger.warning("No IoT history data available")
         return {
             "status": "no_data",
             "message": "No IoT data available yet",
-            "data": []
+            "data": [],
+            "next_cursor": end_seq - 1 if after_seq is None else min(after_seq, end_seq - 1),
+            "prev_cursor": None,
+            "has_more": False
         }
     
-    # Ambil data terbaru sebanyak limit
-    history = list(iot_data_storage)[-limit:]
-    
-    logger.info(f"✓ Returning {len(history)} history records")
+    # Hanya baris halaman (limit) yang dibaca & dimaterialisasi
+    limit = max(1, min(limit, IOT_HISTORY_MAX_LIMIT))
+    page = store.page(limit, after_seq=after_seq, before_seq=before_seq)
+    history = _materialize_records(page, include_details)
+    seqs = page["seq"]
+    if len(seqs):
+        next_cursor = int(seqs[-1])
+        prev_cursor = int(seqs[0]) if seqs[0] > first_seq else None
+    else:
+        # halaman kosong: cursor tetap (dibatasi seq terakhir jika storage pernah di-reset)
+        cursor = after_seq if after_seq is not None else (before_seq - 1 if before_seq is not None else end_seq - 1)
+        next_cursor, prev_cursor = min(cursor, end_seq - 1), None
+    has_more = next_cursor + 1 < end_seq if after_seq is not None else prev_cursor is not None
+    
+    logger.info("✓ Returning %d history records", len(history), extra=LOG_SAMPLED)
     
     return {
         "status": "success",
         "data": history,
         "sensor_ids": SENSOR_IDS,  # Include sensor IDs configuration
         "count": len(history),
-        "total_records": len(iot_data_storage)
+        "total_records": len(store),
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "has_more": has_more
+    }
+
+# Parameter yang bisa diagregasi (sensor + prediksi AI); nilai -1 dari sensor = rusak, tidak dihitung
+AGGREGATE_FIELDS = ("temp_c", "do_mgl", "ph", "conductivity_uscm", "totalcoliform_mv", "pred_total_coliform_mv")
+AGGREGATE_SENSOR_FIELDS = ("temp_c", "do_mgl", "ph", "conductivity_uscm", "totalcoliform_mv")
+AGGREGATE_DEFAULT_POINTS = 500
+
+def _parse_time_param(name: str, value: Optional[str]) -> Optional[float]:
+    """Query waktu: epoch detik atau ISO 8601 (tanpa offset = WIB)"""
+    if value is None or not value.strip():
+        return None
+    try:
+        ts = float(value)
+    except ValueError:
+        try:
+            dt = datetime.fromisoformat(value.strip())
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"`{name}` harus ISO 8601 atau epoch detik (diterima: {value})")
+        ts = (dt if dt.tzinfo else dt.replace(tzinfo=WIB)).timestamp()
+    if not (math.isfinite(ts) and 0 <= ts <= MAX_EPOCH):
+        raise HTTPException(status_code=400, detail=f"`{name}` di luar rentang waktu yang didukung (1970..3000, diterima: {value})")
+    return ts
+
+def _iso_wib(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=WIB).isoformat()
+
+@app.get(
+    "/iot/history/aggregate",
+    tags=["IoT Data Management"],
+    summary="History IoT Teragregasi untuk Chart (Bucket Waktu / LTTB)",
+    response_description="Statistik per bucket waktu atau titik hasil downsampling LTTB"
+)
+def get_iot_history_aggregate(request: Request, response: Response, start: Optional[str] = None,
+                              end: Optional[str] = None, mode: str = "buckets",
+                              bucket_seconds: Optional[float] = None, points: Optional[int] = None,
+                              fields: Optional[str] = None):
+    """
+    ## IoT History Aggregate (Downsampling Server-side)
+    
+    Reduksi history untuk chart: berapa pun jumlah record di rentang waktu, response dibatasi
+    `points` bucket/titik. Dihitung vektor langsung dari kolom storage.
+    
+    **Use Case**:
+    - Chart tren harian/mingguan/bulanan tanpa mengirim semua record
+    - Line chart yang tetap mempertahankan bentuk puncak/lembah (LTTB)
+    
+    **Query Parameters**:
+    - `start`, `end` (opsional): rentang waktu, ISO 8601 (tanpa offset = WIB) atau epoch detik; default seluruh data
+    - `mode`: `buckets` (default) atau `lttb`
+    - `bucket_seconds` (mode buckets): lebar bucket; jika kosong = rentang / `points`
+    - `points`: target jumlah bucket / titik (default 500, max `IOT_AGGREGATE_MAX_POINTS`)
+    - `fields`: parameter dipisah koma (default semua: temp_c, do_mgl, ph, conductivity_uscm, totalcoliform_mv, pred_total_coliform_mv)
+    
+    **Response Example (buckets)**:
+    ```json
+    {
+        "status": "success",
+        "mode": "buckets",
+        "start": "2025-11-13T00:00:00+07:00",
+        "end": "2025-11-13T23:59:00+07:00",
+        "bucket_seconds": 3600,
+        "count": 24,
+        "total_points": 1440,
+        "buckets": [
+            {
+                "start": "2025-11-13T00:00:00+07:00",
+                "count": 60,
+                "severity_worst": "warning",
+                "temp_c": {"min": 27.1, "max": 28.4, "mean": 27.8, "count": 60},
+                "ph": {"min": 7.0, "max": 7.3, "mean": 7.1, "count": 60}
+            }
+        ]
+    }
+    ```
+    
+    **Response Example (lttb)**:
+    ```json
+    {
+        "status": "success",
+        "mode": "lttb",
+        "points": 500,
+        "total_points": 20000,
+        "series": {
+            "temp_c": [{"timestamp": "2025-11-13T00:00:00+07:00", "value": 27.8}]
+        }
+    }
+    ```
+    
+    **Keterangan**:
+    - Nilai kosong dan sensor rusak (-1) tidak ikut dihitung; statistik parameter bernilai `null` jika bucket tidak punya nilai
+    - `severity_worst`: severity terburuk di bucket (`null` jika belum ada record yang di-enrich)
+    - Bucket tanpa record tidak dikembalikan
+    
+    **Status Codes**:
+    - `200 OK`: Data teragregasi (atau no_data)
+    - `304 Not Modified`: `If-None-Match` cocok, data belum berubah
+    - `400 Bad Request`: Parameter tidak valid
+    """
+    if mode not in ("buckets", "lttb"):
+        raise HTTPException(status_code=400, detail="`mode` harus `buckets` atau `lttb`")
+    names = list(AGGREGATE_FIELDS) if not fields else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [name for name in names if name not in AGGREGATE_FIELDS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"`fields` tidak dikenal: {unknown}. Pilihan: {list(AGGREGATE_FIELDS)}")
+    if points is not None and not 1 <= points <= IOT_AGGREGATE_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"`points` harus 1..{IOT_AGGREGATE_MAX_POINTS}")
+    if bucket_seconds is not None and not (math.isfinite(bucket_seconds) and bucket_seconds > 0):
+        raise HTTPException(status_code=400, detail="`bucket_seconds` harus bilangan > 0")
+    start_ts, end_ts = _parse_time_param("start", start), _parse_time_param("end", end)
+    if start_ts is not None and end_ts is not None and start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="`start` harus <= `end`")
+
+    etag = f'"iot-aggregate-{BOOT_ID}-{iot_data_storage.version}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+    columns = iot_data_storage.read_time_range(start_ts, end_ts, ["timestamp", "severity"] + names)
+    has_ts = ~np.isnan(columns["timestamp"])
+    ts = columns["timestamp"][has_ts]
+    values = {}
+    for name in names:
+        v = columns[name][has_ts].astype(np.float64)
+        if name in AGGREGATE_SENSOR_FIELDS:
+            v[v == -1] = np.nan
+        values[name] = v
+    if len(ts) == 0:
+        return {"status": "no_data", "message": "No IoT data in range", "mode": mode, "total_points": 0}
+
+    lo = start_ts if start_ts is not None else float(ts.min())
+    hi = end_ts if end_ts is not None else float(ts.max())
+    n_points = points or AGGREGATE_DEFAULT_POINTS
+    logger.info("IoT history aggregate: mode=%s, rows=%d, points=%d", mode, len(ts), n_points, extra=LOG_SAMPLED)
+
+    if mode == "lttb":
+        order = np.argsort(ts, kind="stable")
+        ts_sorted = ts[order]
+        series = {}
+        for name in names:
+            y = values[name][order]
+            ok = ~np.isnan(y)
+            x, y = ts_sorted[ok], y[ok]
+            picked = lttb(x, y, n_points)
+            series[name] = [{"timestamp": _iso_wib(t), "value": v}
+                            for t, v in zip(x[picked].tolist(), y[picked].tolist())]
+        return {
+            "status": "success",
+            "mode": "lttb",
+            "start": _iso_wib(lo),
+            "end": _iso_wib(hi),
+            "points": n_points,
+            "total_points": int(len(ts)),
+            "series": series
+        }
+
+    width = float(bucket_seconds) if bucket_seconds else max((hi - lo) / n_points, 1.0)
+    # cek sebagai float dulu: bucket_seconds sangat kecil membuat (hi - lo) / width = inf
+    span = (hi - lo) / width
+    if bucket_seconds and not span < IOT_AGGREGATE_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Rentang / bucket_seconds menghasilkan {span:.6g} bucket (maks {IOT_AGGREGATE_MAX_POINTS})")
+    n_buckets = int((hi - lo) // width) + 1
+    agg = bucket_aggregate(ts, values, lo, width, columns["severity"][has_ts],
+                           n_buckets=None if bucket_seconds else n_points)
+    stats = {key: arr.tolist() for key, arr in agg.items()}
+    buckets = []
+    for j, k in enumerate(stats["bucket"]):
+        worst = stats["severity_worst"][j]
+        row = {
+            "start": _iso_wib(lo + k * width),
+            "count": stats["count"][j],
+            "severity_worst": SEVERITY_LEVELS[worst] if worst >= 0 else None
+        }
+        for name in names:
+            row[name] = {
+                "min": stats[f"{name}_min"][j],
+                "max": stats[f"{name}_max"][j],
+                "mean": stats[f"{name}_mean"][j],
+                "count": stats[f"{name}_count"][j]
+            } if stats[f"{name}_count"][j] else None
+        buckets.append(row)
+    return {
+        "status": "success",
+        "mode": "buckets",
+        "start": _iso_wib(lo),
+        "end": _iso_wib(hi),
+        "bucket_seconds": width,
+        "count": len(buckets),
+        "total_points": int(len(ts)),
+        "buckets": buckets
     }
 
 @app.post(
@@ -966,10 +2536,16 @@ def predict_from_iot():
     - `404 Not Found`: Belum ada data IoT
     - `500 Internal Server Error`: Error pada model AI
     """
-    if len(iot_data_storage) == 0:
+    _metrics_endpoint.set("/iot/predict")
+    return _predict_latest(iot_data_storage)
+
+def _predict_latest(store) -> Dict[str, Any]:
+    """Prediksi lengkap (seperti /predict) dari record terbaru satu storage device"""
+    latest_row = store.latest()
+    if latest_row is None:
         raise HTTPException(status_code=404, detail="No IoT data available")
     
-    latest = iot_data_storage[-1]
+    latest = _materialize_record(latest_row)
     
     # Convert ke PredictRequest
     req = PredictRequest(
@@ -980,8 +2556,8 @@ def predict_from_iot():
         totalcoliform_mv=None
     )
     
-    # Gunakan endpoint predict yang sudah ada
-    result = predict(req)
+    # Gunakan logika predict yang sudah ada
+    result = _predict_result(req)
     
     # Tambahkan info IoT
     result["iot_timestamp"] = latest["timestamp"]
@@ -1009,7 +2585,7 @@ def clear_iot_data():
     - Clear data sebelum deployment baru
     
     **Behavior**:
-    - Menghapus semua data dari in-memory deque
+    - Menghapus semua segment data dari storage (disk)
     - Tidak dapat di-undo (permanent deletion)
     - Storage kembali ke state kosong
     
@@ -1034,10 +2610,9 @@ def clear_iot_data():
     **Status Codes**:
     - `200 OK`: Data berhasil dihapus
     """
-    record_count = len(iot_data_storage)
-    logger.warning(f"🗑️ CLEAR REQUEST: Deleting {record_count} IoT records from storage")
+    logger.warning(f"🗑️ CLEAR REQUEST: Deleting {len(iot_data_storage)} IoT records from storage")
     
-    iot_data_storage.clear()
+    record_count = iot_data_storage.clear()
     
     logger.warning(f"✓ All IoT data cleared successfully. {record_count} records deleted.")
     
@@ -1055,7 +2630,7 @@ def clear_iot_data():
     summary="Get Latest Water Quality Status (Simple GET)",
     response_description="Status kualitas air terbaru (sensor + AI prediction)"
 )
-def get_latest_status():
+async def get_latest_status(request: Request):
     """
     ## 🌐 Public API: Latest Water Quality Status
     
@@ -1203,99 +2778,221 @@ def get_latest_status():
     
     ---
     
+    ### ⚡ **Caching (ETag):**
+    
+    Response di-materialize sekali per record terbaru dan membawa `ETag` + `Cache-Control`.
+    Widget yang polling cukup mengirim ulang ETag lewat `If-None-Match`; selama belum ada data
+    baru, server membalas `304 Not Modified` tanpa body dan tanpa inferensi.
+    
+    ```bash
+    curl -i https://gary29-water-quality-ai.hf.space/api/latest -H 'If-None-Match: "latest-120-1-3f2a9c0d11be"'
+    ```
+    
     **Status Codes:**
     - `200 OK`: Data berhasil diambil
+    - `304 Not Modified`: `If-None-Match` cocok, belum ada data baru
     - `404 Not Found`: Belum ada data IoT
     - `500 Internal Server Error`: Error pada server
     """
     
+    _metrics_endpoint.set("/api/latest")
+
     # Check if IoT data available
-    if len(iot_data_storage) == 0:
+    latest_row = iot_data_storage.latest()
+    if latest_row is None:
         logger.warning("GET /api/latest - No IoT data available")
         raise HTTPException(
             status_code=404,
             detail="Belum ada data IoT. Tunggu ESP32 mengirim data pertama."
         )
-    
-    try:
-        # Get latest IoT data
-        latest = iot_data_storage[-1]
-        
-        logger.info(f"GET /api/latest - Fetching data from timestamp: {latest.get('timestamp')}")
-        
-        # Build predict request
-        req = PredictRequest(
-            temp_c=latest.get("temp_c", 0),
-            do_mgl=latest.get("do_mgl", 0),
-            ph=latest.get("ph", 0),
-            conductivity_uscm=latest.get("conductivity_uscm", 0),
-            totalcoliform_mv=latest.get("totalcoliform_mv", None)
-        )
-        
-        # Use default thresholds
-        th = Thresholds()
-        
-        # 1) Prediksi mikroba dari 4 fitur
-        features = {
-            "temp_c": float(req.temp_c),
-            "do_mgl": float(req.do_mgl),
-            "ph": float(req.ph),
-            "conductivity_uscm": float(req.conductivity_uscm),
-        }
-        infer = rfw.predict_with_interval(features)
-
-        # 2) Keputusan potabilitas
-        readings = dict(features)
-        if req.totalcoliform_mv is not None:
-            readings["totalcoliform_mv"] = float(req.totalcoliform_mv)
 
-        decision = decide_potability(readings, infer.pred_total_coliform_mv, th)
+    # Materialized view: dibangun sekali per (seq terbaru, status enrichment), dipakai ulang
+    # oleh semua poller; If-None-Match yang cocok langsung 304 tanpa kerja model
+    key = (latest_row["seq"], latest_row["severity"] >= 0)
+    etag = f'"latest-{BOOT_ID}-{key[0]}-{int(key[1])}-{MODEL_TAG}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    cached = latest_status_view.get(key)
+    if cached is not None:
+        return _cached_json(cached[2], etag)
 
-        # 3) Badge status per parameter
-        readings_for_badge = dict(readings)
-        badges = status_badges(readings_for_badge, th)
-        
-        # 4) Determine color and icon based on severity
-        severity_map = {
-            "safe": {"color": "green", "icon": "✅", "label": "LAYAK MINUM"},
-            "warning": {"color": "yellow", "icon": "⚠️", "label": "PERLU PERHATIAN"},
-            "danger": {"color": "red", "icon": "❌", "label": "TIDAK LAYAK MINUM"}
-        }
-        
-        severity_info = severity_map.get(decision.severity, severity_map["safe"])
-        
-        logger.info(f"GET /api/latest - Status: {decision.severity} | Potable: {decision.potable} | Coliform: {infer.pred_total_coliform_mv:.3f}")
-        
-        # 5) Build response
-        return {
-            "timestamp": latest.get("timestamp"),
-            "sensor_data": {
-                "temp_c": latest.get("temp_c"),
-                "do_mgl": latest.get("do_mgl"),
-                "ph": latest.get("ph"),
-                "conductivity_uscm": latest.get("conductivity_uscm"),
-                "totalcoliform_mv_raw": latest.get("totalcoliform_mv_raw"),
-                "totalcoliform_mv": latest.get("totalcoliform_mv")
-            },
-            "prediction": {
-                "total_coliform_mv": infer.pred_total_coliform_mv,
-                "confidence_interval": {
-                    "low": infer.pred_ci90_low,
-                    "high": infer.pred_ci90_high
-                }
-            },
-            "status": {
-                "potable": decision.potable,
-                "severity": decision.severity,
-                "label": severity_info["label"],
-                "color": severity_info["color"],
-                "icon": severity_info["icon"],
-                "reasons": decision.reasons,
-                "recommendations": decision.recommendations
-            },
-            "badges": badges
-        }
-        
+    try:
+        body = await run_in_threadpool(_render_latest_status, latest_row)
     except Exception as e:
         logger.error(f"GET /api/latest - Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating status: {str(e)}")
+    latest_status_view.put(key, etag, body)
+    return _cached_json(body, etag)
+
+def _render_latest_status(latest_row: Dict[str, Any]) -> bytes:
+    """Body JSON `/api/latest` untuk satu baris storage"""
+    logger.info("GET /api/latest - Building status for seq: %s", latest_row["seq"], extra=LOG_SAMPLED)
+
+    # Prediksi tersimpan saat ingest dipakai ulang (forest hanya jika record belum di-enrich),
+    # lalu keputusan potabilitas, badge, dan label/warna status
+    view = _latest_view(latest_row)
+    status = view["status"]
+    logger.info("GET /api/latest - Status: %s | Potable: %s | Coliform: %.3f", status["severity"], status["potable"],
+                view["prediction"]["total_coliform_mv"], extra=LOG_SAMPLED)
+
+    return _serialize(view).body
+
+# ====== MULTI-DEVICE ======
+
+def _device_store(device_id: str):
+    store = iot_devices.get(device_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail=f"Device '{device_id}' belum pernah mengirim data")
+    return store
+
+@app.get(
+    "/devices",
+    tags=["Devices"],
+    summary="Ringkasan Fleet Device IoT",
+    response_description="Record terbaru dan status setiap device"
+)
+def list_devices():
+    """
+    ## Fleet Summary
+    
+    Ringkasan semua device (node ESP32/Mappi32) yang pernah mengirim data: record terbaru,
+    status AI, dan jumlah record per device. Hanya membaca baris terakhir storage setiap device
+    (O(jumlah device)), tidak memindai history.
+    
+    **Use Case**:
+    - Peta / tabel status seluruh site
+    - Mendeteksi device yang berhenti mengirim data (`last_seen_seconds`)
+    
+    **Response Example**:
+    ```json
+    {
+        "status": "success",
+        "count": 2,
+        "severity_counts": {"safe": 1, "warning": 1, "danger": 0, "unknown": 0},
+        "devices": [
+            {
+                "device_id": "default",
+                "total_records": 1200,
+                "last_seq": 1199,
+                "timestamp": "2025-11-07T14:30:00+07:00",
+                "last_seen_seconds": 42.1,
+                "readings": {"temp_c": 27.8, "do_mgl": 6.2, "ph": 7.2, "conductivity_uscm": 620, "totalcoliform_mv": 0.5},
+                "prediction": {"total_coliform_mv": 0.45, "ci90_low": 0.2, "ci90_high": 0.85},
+                "ai_detection": {"potable": true, "severity": "safe"}
+            }
+        ]
+    }
+    ```
+    
+    **Status Codes**:
+    - `200 OK`: Ringkasan tersedia
+    """
+    now = time.time()
+    devices = []
+    severity_counts = {level: 0 for level in SEVERITY_LEVELS}
+    severity_counts["unknown"] = 0
+    for device_id, store in iot_devices.items():
+        latest_row = store.latest()
+        summary = {"device_id": device_id, "total_records": len(store), "last_seq": None, "timestamp": None,
+                   "last_seen_seconds": None, "readings": None, "prediction": None, "ai_detection": None}
+        if latest_row is not None:
+            latest = _materialize_record(latest_row)
+            summary.update({
+                "last_seq": latest_row["seq"],
+                "timestamp": latest["timestamp"],
+                "last_seen_seconds": round(now - latest_row["timestamp"], 1),
+                "readings": {k: latest[k] for k in ENRICH_FIELDS},
+                "prediction": latest["prediction"],
+                "ai_detection": latest["ai_detection"]
+            })
+        severity = (summary["ai_detection"] or {}).get("severity", "unknown")
+        severity_counts[severity] += 1
+        devices.append(summary)
+    return {
+        "status": "success",
+        "count": len(devices),
+        "severity_counts": severity_counts,
+        "devices": devices
+    }
+
+@app.get(
+    "/devices/{device_id}/latest",
+    tags=["Devices"],
+    summary="Data Sensor Terbaru Satu Device",
+    response_description="Data sensor terbaru device dengan status badges"
+)
+async def get_device_latest(request: Request, device_id: str):
+    """
+    ## Latest Data per Device
+    
+    Sama dengan `/iot/latest`, untuk satu device. Response ditambah `device_id`.
+    
+    **Status Codes**:
+    - `200 OK`: Data tersedia (atau no_data)
+    - `304 Not Modified`: `If-None-Match` cocok, belum ada data baru
+    - `404 Not Found`: Device tidak dikenal
+    """
+    store = _device_store(device_id)
+    latest_row = store.latest()
+    if latest_row is None:
+        return {"status": "no_data", "message": "No IoT data available yet", "device_id": device_id, "data": None}
+    total = len(store)
+    etag = f'"device-latest-{BOOT_ID}-{device_id}-{latest_row["seq"]}-{int(latest_row["severity"] >= 0)}-{total}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    body = await run_in_threadpool(_render_latest_iot, latest_row, total, device_id)
+    return _cached_json(body, etag)
+
+@app.get(
+    "/devices/{device_id}/history",
+    tags=["Devices"],
+    summary="History Data Satu Device",
+    response_description="Daftar data sensor historis device"
+)
+def get_device_history(request: Request, response: Response, device_id: str, limit: int = 50,
+                       include_details: bool = False, after_seq: Optional[int] = None,
+                       before_seq: Optional[int] = None):
+    """
+    ## History per Device
+    
+    Sama dengan `/iot/history` (termasuk cursor `after_seq` / `before_seq`), untuk satu device.
+    `seq` berurutan per device.
+    
+    **Status Codes**:
+    - `200 OK`: Data tersedia (atau no_data)
+    - `304 Not Modified`: `If-None-Match` cocok, data belum berubah
+    - `400 Bad Request`: Cursor tidak valid
+    - `404 Not Found`: Device tidak dikenal
+    """
+    _check_cursors(after_seq, before_seq)
+    store = _device_store(device_id)
+    etag = f'"device-history-{BOOT_ID}-{device_id}-{store.version}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    result = _history_page(store, limit, include_details, after_seq, before_seq)
+    return {"device_id": device_id, **result}
+
+@app.post(
+    "/devices/{device_id}/predict",
+    tags=["Devices"],
+    summary="Auto-Predict dari Data Terbaru Satu Device",
+    response_description="Hasil prediksi AI dari data sensor terbaru device"
+)
+def predict_device(device_id: str):
+    """
+    ## Auto-Prediction per Device
+    
+    Sama dengan `/iot/predict` (tanpa body), memakai record terbaru device. Response ditambah `device_id`.
+    
+    **Status Codes**:
+    - `200 OK`: Prediksi berhasil
+    - `404 Not Found`: Device tidak dikenal atau belum ada data
+    - `500 Internal Server Error`: Error pada model AI
+    """
+    store = _device_store(device_id)
+    _metrics_endpoint.set("/devices/{device_id}/predict")
+    result = _predict_latest(store)
+    result["device_id"] = device_id
+    return result
@@ -0,0 +1,274 @@
+"""
+Benchmark lokal untuk jalur inferensi & endpoint FastAPI, dengan baseline JSON untuk deteksi regresi.
+
+Yang diukur:
+- `RFRegressorWrapper.predict_with_interval` (1 bacaan) dan `predict_batch_with_interval` (batch 1..10000)
+- `_to_feature_array`, `decide_potability`, `status_badges`, serta versi batch rules
+- Endpoint `/predict`, `/iot/data`, `/iot/history`, `/api/latest` lewat client ASGI in-process
+  (storage IoT di direktori sementara, tidak menyentuh data asli)
+
+Contoh:
+    python benchmark_rf.py --out bench_baseline.json                 # simpan baseline
+    python benchmark_rf.py --compare bench_baseline.json              # jalankan + bandingkan (exit 1 jika regresi)
+    python benchmark_rf.py --compare bench_baseline.json --current bench_new.json   # bandingkan dua file saja
+    python benchmark_rf.py --quick --only inference,rules
+    python benchmark_rf.py --only inference --threads 0 --compare bench_baseline.json   # scaling thread pool
+    python benchmark_rf.py --only inference --processes 4                               # process pool (shared memory)
+
+Regresi = throughput turun lebih dari `--tolerance` (default 10%) atau p99 naik lebih dari
+`--p99-tolerance` (default 20%) dibanding baseline. Baseline hanya sebanding jika diukur di mesin yang sama.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+from inference_rf import (RFRegressorWrapper, decide_potability, status_badges,
+                          decide_potability_batch, status_badges_batch)
+
+WIB = timezone(timedelta(hours=7))
+GROUPS = ("inference", "rules", "endpoints")
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+# ---------- data sintetis (rentang operasi sensor) ----------
+
+def random_readings(rng: np.random.Generator, n: int) -> np.ndarray:
+    """(n, 4) berurutan temp_c, do_mgl, ph, conductivity_uscm"""
+    return np.column_stack([
+        rng.uniform(15, 40, n),       # temp_c
+        rng.uniform(2, 10, n),        # do_mgl
+        rng.uniform(5.5, 9.5, n),     # ph
+        rng.uniform(50, 2000, n),     # conductivity_uscm
+    ]).round(2)
+
+def reading_dict(row: np.ndarray) -> Dict[str, float]:
+    return {"temp_c": float(row[0]), "do_mgl": float(row[1]), "ph": float(row[2]), "conductivity_uscm": float(row[3])}
+
+# ---------- pengukuran ----------
+
+def measure(fn: Callable[[], Any], items: int, min_time: float, min_calls: int = 5,
+            max_calls: int = 100000, warmup: int = 3) -> Dict[str, float]:
+    """Jalankan `fn` berulang minimal `min_time` detik; latensi per panggilan, throughput per item"""
+    for _ in range(warmup):
+        fn()
+    latencies: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(latencies) < max_calls and (len(latencies) < min_calls or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    lat = np.array(latencies)
+    return {
+        "items_per_call": items,
+        "calls": len(lat),
+        "throughput_per_s": items * len(lat) / lat.sum(),
+        "mean_ms": float(lat.mean() * 1000),
+        "p50_ms": float(np.percentile(lat, 50) * 1000),
+        "p99_ms": float(np.percentile(lat, 99) * 1000),
+    }
+
+def bench_inference(min_time: float, batch_sizes: List[int], seed: int, threads: int = 1,
+                    processes: int = 0) -> Dict[str, Dict[str, float]]:
+    # tanpa cache prediksi: yang diukur traversal forest, bukan hit LRU
+    rfw = RFRegressorWrapper(os.path.join(HERE, "rf_total_coliform_log1p_improved.joblib"),
+                             os.path.join(HERE, "model_features_order.txt"), threads=threads, processes=processes)
+    rng = np.random.default_rng(seed)
+    pool = random_readings(rng, max(batch_sizes) * 4)
+    dicts = [reading_dict(row) for row in pool[:1024]]
+    results = {}
+
+    i = iter(range(10 ** 9))
+    results["rf._to_feature_array"] = measure(
+        lambda: rfw._to_feature_array(dicts[next(i) % len(dicts)]), 1, min_time)
+    results["rf.predict_with_interval"] = measure(
+        lambda: rfw.predict_with_interval(dicts[next(i) % len(dicts)]), 1, min_time)
+    for n in batch_sizes:
+        offsets = iter(range(10 ** 9))
+        def run(n=n, offsets=offsets):
+            start = (next(offsets) * n) % (len(pool) - n + 1)
+            rfw.predict_batch_with_interval(pool[start:start + n])
+        results[f"rf.predict_batch_with_interval[n={n}]"] = measure(run, n, min_time, warmup=1 if n >= 1000 else 3)
+    rfw.close()
+    return results
+
+def bench_rules(min_time: float, seed: int) -> Dict[str, Dict[str, float]]:
+    rng = np.random.default_rng(seed)
+    pool = random_readings(rng, 10000)
+    coliform = rng.uniform(0, 2, len(pool)).round(3)
+    dicts = [dict(reading_dict(row), totalcoliform_mv=float(c)) for row, c in zip(pool[:1024], coliform)]
+    results = {}
+
+    i = iter(range(10 ** 9))
+    def decide():
+        k = next(i) % len(dicts)
+        decide_potability(dicts[k], float(coliform[k]))
+    results["rules.decide_potability"] = measure(decide, 1, min_time)
+    results["rules.status_badges"] = measure(lambda: status_badges(dicts[next(i) % len(dicts)]), 1, min_time)
+
+    cols = [pool[:, j] for j in range(4)]
+    results["rules.decide_potability_batch[n=10000]"] = measure(
+        lambda: decide_potability_batch(*cols, sensor_coliform=coliform, predicted_coliform_mpn_100ml=coliform),
+        len(pool), min_time)
+    results["rules.status_badges_batch[n=10000]"] = measure(
+        lambda: status_badges_batch(*cols, totalcoliform_mv=coliform), len(pool), min_time)
+    return results
+
+def bench_endpoints(min_time: float, seed: int, history_rows: int = 5000) -> Dict[str, Dict[str, float]]:
+    # backend dibaca env saat import: storage ke direktori sementara, log per request di-sampling habis
+    storage_dir = tempfile.mkdtemp(prefix="bench_iot_")
+    os.environ["IOT_STORAGE_DIR"] = storage_dir
+    os.environ.setdefault("LOG_SAMPLE_RATES", "INFO=0")
+    import backend_fastapi
+    from fastapi.testclient import TestClient
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    with TestClient(backend_fastapi.app) as client:
+        def post_predict():
+            r = client.post("/predict", json=reading_dict(random_readings(rng, 1)[0]))
+            r.raise_for_status()
+        results["endpoint.POST /predict"] = measure(post_predict, 1, min_time)
+
+        def post_iot_data():
+            r = client.post("/iot/data", json=dict(reading_dict(random_readings(rng, 1)[0]),
+                                                    totalcoliform_mv_raw=float(rng.uniform(0, 100))))
+            r.raise_for_status()
+        results["endpoint.POST /iot/data"] = measure(post_iot_data, 1, min_time)
+
+        # isi history sampai `history_rows`, tunggu enrichment selesai agar tidak ikut terukur
+        missing = history_rows - len(backend_fastapi.iot_data_storage)
+        if missing > 0:
+            items = [dict(reading_dict(row), totalcoliform_mv_raw=50.0) for row in random_readings(rng, missing)]
+            client.post("/iot/data/bulk", json=items).raise_for_status()
+        if backend_fastapi.iot_ingest_queue is not None:
+            backend_fastapi.iot_ingest_queue.wait_idle(60)
+
+        for limit in (50, 1000):
+            def get_history(limit=limit):
+                client.get("/iot/history", params={"limit": limit}).raise_for_status()
+            results[f"endpoint.GET /iot/history[limit={limit}]"] = measure(get_history, 1, min_time)
+
+        def get_latest():
+            client.get("/api/latest").raise_for_status()
+        results["endpoint.GET /api/latest"] = measure(get_latest, 1, min_time)
+    return results
+
+# ---------- baseline & perbandingan ----------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmarks(groups: List[str], min_time: float, batch_sizes: List[int], seed: int,
+                   threads: int = 1, processes: int = 0) -> Dict[str, Any]:
+    import sklearn
+    results: Dict[str, Dict[str, float]] = {}
+    if "inference" in groups:
+        results.update(bench_inference(min_time, batch_sizes, seed, threads, processes))
+    if "rules" in groups:
+        results.update(bench_rules(min_time, seed))
+    if "endpoints" in groups:
+        results.update(bench_endpoints(min_time, seed))
+    return {
+        "meta": {
+            "created": datetime.now(WIB).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "inference_threads": threads,
+            "inference_processes": processes,
+            "min_time_s": min_time,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float, p99_tolerance: float) -> List[str]:
+    """Cetak tabel perbandingan; return daftar nama benchmark yang regresi"""
+    base, cur = baseline["results"], current["results"]
+    regressions = []
+    print(f"{'benchmark':48} {'throughput/s (base → now)':>32} {'p99 ms (base → now)':>28}  status")
+    for name in sorted(set(base) | set(cur)):
+        if name not in cur:
+            print(f"{name:48} {'-':>32} {'-':>28}  missing")
+            continue
+        if name not in base:
+            print(f"{name:48} {cur[name]['throughput_per_s']:>32,.1f} {cur[name]['p99_ms']:>28.3f}  new")
+            continue
+        b, c = base[name], cur[name]
+        thr_delta = c["throughput_per_s"] / b["throughput_per_s"] - 1
+        p99_delta = c["p99_ms"] / b["p99_ms"] - 1 if b["p99_ms"] > 0 else 0.0
+        failed = thr_delta < -tolerance or p99_delta > p99_tolerance
+        if failed:
+            regressions.append(name)
+        thr = f"{b['throughput_per_s']:,.1f} → {c['throughput_per_s']:,.1f} ({thr_delta:+.0%})"
+        p99 = f"{b['p99_ms']:.3f} → {c['p99_ms']:.3f} ({p99_delta:+.0%})"
+        print(f"{name:48} {thr:>32} {p99:>28}  {'REGRESSION' if failed else 'ok'}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inferensi RF + endpoint FastAPI dengan baseline JSON")
+    parser.add_argument("--out", help="Tulis hasil ke file JSON (mis. sebagai baseline baru)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Bandingkan hasil dengan baseline JSON; exit 1 jika regresi")
+    parser.add_argument("--current", help="Dengan --compare: pakai hasil JSON ini alih-alih menjalankan benchmark")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"Grup benchmark, dipisah koma ({', '.join(GROUPS)})")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Durasi minimal per benchmark (detik)")
+    parser.add_argument("--quick", action="store_true", help="Mode cepat: min-time 0.2 detik, batch maks. 1000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=1, help="INFERENCE_THREADS untuk grup inference (0 = jumlah core)")
+    parser.add_argument("--processes", type=int, default=0, help="INFERENCE_PROCESSES untuk grup inference (0 = nonaktif)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Toleransi penurunan throughput (fraksi)")
+    parser.add_argument("--p99-tolerance", type=float, default=0.20, help="Toleransi kenaikan p99 (fraksi)")
+    args = parser.parse_args()
+
+    if args.current:
+        if not args.compare:
+            parser.error("--current hanya dipakai bersama --compare")
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        groups = [g.strip() for g in args.only.split(",") if g.strip()]
+        unknown = set(groups) - set(GROUPS)
+        if unknown:
+            parser.error(f"grup tidak dikenal: {', '.join(sorted(unknown))}")
+        min_time = 0.2 if args.quick else args.min_time
+        batch_sizes = [n for n in BATCH_SIZES if not args.quick or n <= 1000]
+        current = run_benchmarks(groups, min_time, batch_sizes, args.seed, args.threads, args.processes)
+        print(f"{'benchmark':48} {'throughput/s':>14} {'p50 ms':>10} {'p99 ms':>10} {'calls':>8}")
+        for name, r in current["results"].items():
+            print(f"{name:48} {r['throughput_per_s']:>14,.1f} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['calls']:>8}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"✓ Hasil ditulis: {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, current, args.tolerance, args.p99_tolerance)
+        if regressions:
+            print(f"✗ {len(regressions)} benchmark regresi: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✓ Tidak ada regresi dibanding baseline")
+
+if __name__ == "__main__":
+    main()
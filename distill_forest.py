@@ -0,0 +1,367 @@
+"""
+Distilasi forest offline: turunkan model yang lebih kecil/cepat dari forest yang ada, tanpa data
+training (hanya input sintetis di envelope operasi sensor), lalu tulis artefak forest flat
+(.rfflat) yang bisa langsung dipakai sebagai MODEL_PATH.
+
+Transformasi (bisa dikombinasikan, urutan: subset → truncate → merge):
+- subset tree : pilih k tree secara greedy (forward selection) yang rata-ratanya paling dekat
+                dengan mean forest penuh pada sampel seleksi
+- truncate    : potong setiap tree di kedalaman `max_depth`; node yang terpotong menjadi leaf
+                dengan nilai node tersebut (rata-rata sampel training di node, disimpan sklearn)
+- merge leaf  : gabungkan subtree yang semua leaf-nya berbeda <= `merge_tol` (skala log1p)
+                menjadi satu leaf, sehingga prediksi per tree bergeser maksimal `merge_tol`
+
+Setiap varian dibandingkan dengan forest penuh pada sampel evaluasi terpisah: error mean/q10/q90
+(skala log1p), drift coverage CI90 (porsi prediksi per-tree forest penuh yang jatuh di interval
+varian), kesesuaian severity (decide_potability_batch), jumlah node/ukuran artefak, dan latensi
+lewat RFRegressorWrapper. Varian terkecil yang lolos budget (jumlah tree, lalu jumlah node; tidak
+bergantung noise pengukuran latensi) ditulis ke output; budget dan hasil pengukurannya disimpan di
+metadata artefak (`metadata.distillation`, tampil di GET /model/info).
+
+Contoh:
+    python distill_forest.py rf_total_coliform_log1p_improved.joblib model_features_order.txt \\
+        rf_total_coliform_log1p_distilled.rfflat --trees 25,50,100 --max-depth 8,10,12 \\
+        --merge-tol 0.02,0.05 --report distill_report.json
+    python distill_forest.py ... --variant trees=50,depth=10     # paksa varian tertentu
+
+Lalu jalankan backend dengan:
+    MODEL_PATH=rf_total_coliform_log1p_distilled.rfflat
+    MODEL_SOURCE_PATH=rf_total_coliform_log1p_improved.joblib   # opsional, verifikasi checksum
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+from inference_rf import (FlatForest, RFRegressorWrapper, DEFAULT_LATTICE_ENVELOPE, SEVERITY_LEVELS,
+                          decide_potability_batch, write_flat_forest, _sha256_file)
+from benchmark_rf import measure
+
+WIB = timezone(timedelta(hours=7))
+
+# ---------- transformasi forest ----------
+
+def node_depths(forest: FlatForest) -> np.ndarray:
+    """Kedalaman tiap node (root = 0); -1 untuk node yang tidak terjangkau dari root mana pun"""
+    depth = np.full(forest.n_nodes, -1, dtype=np.intp)
+    frontier = np.asarray(forest.roots, dtype=np.intp)
+    d = 0
+    while frontier.size:
+        depth[frontier] = d
+        frontier = forest.children[frontier[~forest._is_leaf[frontier]]].ravel()
+        d += 1
+    return depth
+
+def compact(forest: FlatForest) -> FlatForest:
+    """Buang node yang tidak terjangkau dari `roots` dan susun ulang index (urutan node dipertahankan)"""
+    keep = np.flatnonzero(node_depths(forest) >= 0)
+    new_index = np.full(forest.n_nodes, -1, dtype=np.intp)
+    new_index[keep] = np.arange(len(keep), dtype=np.intp)
+    children = new_index[forest.children[keep]]
+    is_leaf = children[:, 0] == np.arange(len(keep))
+    feature = np.where(is_leaf, 0, forest.feature[keep]).astype(np.intp)
+    threshold = np.where(is_leaf, 0.0, forest.threshold[keep])
+    value = np.array(forest.value[keep], dtype=np.float64)
+    return FlatForest(feature, threshold, children, value, new_index[forest.roots])
+
+def subset_trees(forest: FlatForest, trees: Sequence[int]) -> FlatForest:
+    """Forest baru yang hanya berisi tree dengan index `trees`"""
+    roots = np.asarray(forest.roots, dtype=np.intp)[np.sort(np.asarray(trees, dtype=np.intp))]
+    return compact(FlatForest(forest.feature, forest.threshold, forest.children, forest.value, roots))
+
+def truncate_depth(forest: FlatForest, max_depth: int) -> FlatForest:
+    """Potong semua tree di kedalaman `max_depth`: node internal di kedalaman itu menjadi leaf"""
+    cut = np.flatnonzero((node_depths(forest) == max_depth) & ~forest._is_leaf)
+    children = np.array(forest.children, dtype=np.intp)
+    children[cut] = cut[:, None]
+    return compact(FlatForest(forest.feature, forest.threshold, children, forest.value, forest.roots))
+
+def merge_leaves(forest: FlatForest, tol: float) -> FlatForest:
+    """
+    Gabungkan node yang kedua anaknya leaf menjadi leaf (nilai = nilai node), berulang dari bawah,
+    selama rentang nilai leaf asli di bawah node <= `tol`. Prediksi per tree bergeser maksimal `tol`.
+    """
+    children = np.array(forest.children, dtype=np.intp)
+    is_leaf = children[:, 0] == np.arange(forest.n_nodes)
+    lo = np.array(forest.value, dtype=np.float64)
+    hi = lo.copy()
+    while True:
+        left, right = children[:, 0], children[:, 1]
+        node_lo = np.minimum(lo[left], lo[right])
+        node_hi = np.maximum(hi[left], hi[right])
+        merge = ~is_leaf & is_leaf[left] & is_leaf[right] & (node_hi - node_lo <= tol)
+        if not merge.any():
+            break
+        idx = np.flatnonzero(merge)
+        lo[idx], hi[idx] = node_lo[idx], node_hi[idx]
+        children[idx] = idx[:, None]
+        is_leaf[idx] = True
+    return compact(FlatForest(forest.feature, forest.threshold, children, forest.value, forest.roots))
+
+def greedy_tree_order(leaf: np.ndarray, max_trees: int) -> np.ndarray:
+    """
+    Urutan forward selection tree dari nilai leaf (n_rows, n_trees): setiap langkah menambah tree
+    yang paling menurunkan MSE rata-rata subset terhadap mean forest penuh. Prefix k pertama =
+    subset k tree.
+    """
+    leaf = np.asarray(leaf, dtype=np.float64)
+    target = leaf.mean(axis=1)
+    total = np.zeros(leaf.shape[0])
+    available = np.ones(leaf.shape[1], dtype=bool)
+    order = []
+    for k in range(1, min(max_trees, leaf.shape[1]) + 1):
+        candidates = np.flatnonzero(available)
+        mse = (((total[:, None] + leaf[:, candidates]) / k - target[:, None]) ** 2).mean(axis=0)
+        best = candidates[int(np.argmin(mse))]
+        order.append(best)
+        available[best] = False
+        total += leaf[:, best]
+    return np.array(order, dtype=np.intp)
+
+# ---------- varian ----------
+
+def variant_name(trees: Optional[int], max_depth: Optional[int], merge_tol: float) -> str:
+    parts = []
+    if trees:
+        parts.append(f"trees={trees}")
+    if max_depth:
+        parts.append(f"depth={max_depth}")
+    if merge_tol > 0:
+        parts.append(f"merge={merge_tol:g}")
+    return ",".join(parts) or "full"
+
+def build_variant(forest: FlatForest, tree_order: np.ndarray, trees: Optional[int],
+                  max_depth: Optional[int], merge_tol: float) -> FlatForest:
+    if trees:
+        forest = subset_trees(forest, tree_order[:trees])
+    if max_depth:
+        forest = truncate_depth(forest, max_depth)
+    if merge_tol > 0:
+        forest = merge_leaves(forest, merge_tol)
+    return forest
+
+def sample_inputs(features_order: List[str], envelope: Dict[str, Tuple[float, float]], n: int, seed: int) -> np.ndarray:
+    """Input sintetis uniform di envelope, kolom berurutan sesuai features_order"""
+    rng = np.random.default_rng(seed)
+    lower = np.array([envelope[k][0] for k in features_order])
+    upper = np.array([envelope[k][1] for k in features_order])
+    return rng.uniform(lower, upper, size=(n, len(features_order)))
+
+def _severity(X: np.ndarray, features_order: List[str], y_log: np.ndarray) -> np.ndarray:
+    col = {k: X[:, features_order.index(k)] for k in ("temp_c", "do_mgl", "ph", "conductivity_uscm")}
+    return decide_potability_batch(col["temp_c"], col["do_mgl"], col["ph"], col["conductivity_uscm"],
+                                   predicted_coliform_mpn_100ml=np.expm1(y_log)).severity
+
+def evaluate(wrapper: RFRegressorWrapper, X: np.ndarray, reference: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Akurasi varian terhadap forest penuh (`reference` dari `reference_outputs`)"""
+    y_log, low_log, high_log = wrapper._predict_log_exact(X)
+    result: Dict[str, Any] = {}
+    for name, a, e in (("mean", y_log, reference["mean"]), ("q10", low_log, reference["q10"]),
+                       ("q90", high_log, reference["q90"])):
+        err = np.abs(a - e)
+        result[f"{name}_mae_log1p"] = round(float(err.mean()), 6)
+        result[f"{name}_p99_error_log1p"] = round(float(np.percentile(err, 99)), 6)
+        result[f"{name}_max_error_log1p"] = round(float(err.max()), 6)
+    tree_values = reference["tree_values"]
+    coverage = float(((tree_values >= low_log[:, None]) & (tree_values <= high_log[:, None])).mean())
+    result["ci90_coverage"] = round(coverage, 6)
+    result["ci90_coverage_drift"] = round(coverage - reference["coverage"], 6)
+    severity = _severity(X, wrapper.features_order, y_log)
+    result["severity_agreement"] = round(float((severity == reference["severity"]).mean()), 6)
+    changed = severity != reference["severity"]
+    result["severity_changes"] = {f"{SEVERITY_LEVELS[a]}->{SEVERITY_LEVELS[b]}": int(n)
+                                  for (a, b), n in _count_pairs(reference["severity"][changed], severity[changed]).items()}
+    return result
+
+def _count_pairs(a: np.ndarray, b: np.ndarray) -> Dict[Tuple[int, int], int]:
+    counts: Dict[Tuple[int, int], int] = {}
+    for pair in zip(a.tolist(), b.tolist()):
+        counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+def reference_outputs(wrapper: RFRegressorWrapper, X: np.ndarray) -> Dict[str, Any]:
+    y_log, low_log, high_log = wrapper._predict_log_exact(X)
+    tree_values = wrapper.engine.leaf_values(X.astype(np.float32)).astype(np.float32)
+    coverage = float(((tree_values >= low_log[:, None]) & (tree_values <= high_log[:, None])).mean())
+    return {"mean": y_log, "q10": low_log, "q90": high_log, "tree_values": tree_values,
+            "coverage": coverage, "severity": _severity(X, wrapper.features_order, y_log)}
+
+def latency(wrapper: RFRegressorWrapper, X: np.ndarray, min_time: float, batch_size: int) -> Dict[str, float]:
+    single = dict(zip(wrapper.features_order, map(float, X[0])))
+    batch = X[:batch_size]
+    one = measure(lambda: wrapper.predict_with_interval(single), 1, min_time)
+    many = measure(lambda: wrapper.predict_batch_with_interval(batch), len(batch), min_time)
+    return {
+        "single_p50_ms": round(one["p50_ms"], 4),
+        "single_p99_ms": round(one["p99_ms"], 4),
+        f"batch{len(batch)}_p50_ms": round(many["p50_ms"], 4),
+        f"batch{len(batch)}_p99_ms": round(many["p99_ms"], 4),
+        "throughput_per_s": round(many["throughput_per_s"], 1),
+    }
+
+def within_budget(accuracy: Dict[str, Any], budget: Dict[str, float]) -> bool:
+    return (accuracy["mean_max_error_log1p"] <= budget["max_error_log1p"]
+            and max(accuracy["q10_max_error_log1p"], accuracy["q90_max_error_log1p"]) <= budget["max_ci_error_log1p"]
+            and abs(accuracy["ci90_coverage_drift"]) <= budget["max_coverage_drift"]
+            and accuracy["severity_agreement"] >= budget["min_severity_agreement"])
+
+# ---------- CLI ----------
+
+def _int_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+def _float_list(text: str) -> List[float]:
+    return [float(v) for v in text.split(",") if v.strip()]
+
+def _parse_envelope(text: str) -> Dict[str, Tuple[float, float]]:
+    """Format sama dengan LATTICE_ENVELOPE: temp_c=10:45,do_mgl=0:10,..."""
+    envelope = dict(DEFAULT_LATTICE_ENVELOPE)
+    for part in text.split(","):
+        if part.strip():
+            name, bounds = part.split("=", 1)
+            lo, hi = bounds.split(":", 1)
+            envelope[name.strip()] = (float(lo), float(hi))
+    return envelope
+
+def print_table(rows: List[Dict[str, Any]], batch_key: str) -> None:
+    print(f"\n{'varian':<28} {'tree':>5} {'node':>7} {'KB':>7} {'mean max':>9} {'CI max':>8} "
+          f"{'cov drift':>9} {'sev %':>7} {'1x p50':>8} {batch_key:>10}  budget")
+    for r in rows:
+        acc, lat = r["accuracy"], r["latency"]
+        ci = max(acc["q10_max_error_log1p"], acc["q90_max_error_log1p"])
+        print(f"{r['variant']:<28} {r['n_trees']:>5} {r['n_nodes']:>7} {r['size_bytes'] / 1024:>7.0f} "
+              f"{acc['mean_max_error_log1p']:>9.4f} {ci:>8.4f} {acc['ci90_coverage_drift']:>+9.4f} "
+              f"{acc['severity_agreement'] * 100:>7.2f} {lat['single_p50_ms']:>8.3f} {lat[batch_key]:>10.3f}  "
+              f"{'✓' if r['within_budget'] else '✗'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Distilasi forest (subset tree, truncate depth, merge leaf) ke artefak .rfflat")
+    parser.add_argument("model_path", help="Model sumber (joblib atau .rfflat)")
+    parser.add_argument("features_order_path", help="Path model_features_order.txt")
+    parser.add_argument("out_path", nargs="?", help="Artefak output (.rfflat); kosong = hanya laporan")
+    parser.add_argument("--trees", type=_int_list, default=[25, 50, 100], help="Jumlah tree subset (default 25,50,100)")
+    parser.add_argument("--max-depth", type=_int_list, default=[8, 10, 12], help="Kedalaman maks. (default 8,10,12)")
+    parser.add_argument("--merge-tol", type=_float_list, default=[0.02, 0.05], help="Toleransi merge leaf, skala log1p (default 0.02,0.05)")
+    parser.add_argument("--samples", type=int, default=4000, help="Sampel seleksi dan sampel evaluasi (masing-masing)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--envelope", default="", help="Rentang input sintetis, format LATTICE_ENVELOPE (default envelope operasi)")
+    parser.add_argument("--max-error", type=float, default=0.05, help="Budget error maks. mean (log1p)")
+    parser.add_argument("--max-ci-error", type=float, default=0.10, help="Budget error maks. q10/q90 (log1p)")
+    parser.add_argument("--max-coverage-drift", type=float, default=0.02, help="Budget |drift coverage CI90|")
+    parser.add_argument("--min-severity-agreement", type=float, default=0.995, help="Budget min. kesesuaian severity")
+    parser.add_argument("--variant", help="Paksa varian ini (nama dari tabel), meski di luar budget")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Durasi pengukuran latensi per varian (detik)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Ukuran batch untuk latensi batch")
+    parser.add_argument("--report", help="Simpan laporan semua varian ke file JSON")
+    args = parser.parse_args()
+
+    source = RFRegressorWrapper(args.model_path, args.features_order_path)
+    features_order = source.features_order
+    envelope = _parse_envelope(args.envelope)
+    budget = {
+        "max_error_log1p": args.max_error,
+        "max_ci_error_log1p": args.max_ci_error,
+        "max_coverage_drift": args.max_coverage_drift,
+        "min_severity_agreement": args.min_severity_agreement,
+    }
+    X_select = sample_inputs(features_order, envelope, args.samples, args.seed)
+    X_eval = sample_inputs(features_order, envelope, args.samples, args.seed + 1)
+    reference = reference_outputs(source, X_eval)
+    print(f"Forest sumber: {source.engine.n_trees} tree, {source.engine.n_nodes} node "
+          f"(coverage CI90 referensi {reference['coverage']:.4f})")
+
+    tree_counts = sorted(k for k in set(args.trees) if 0 < k < source.engine.n_trees)
+    tree_order = greedy_tree_order(source.engine.leaf_values(X_select.astype(np.float32)),
+                                   max(tree_counts, default=0))
+    source_sha256 = (source.model_header or {}).get("source_sha256") or _sha256_file(args.model_path)
+    fingerprint = source.engine.fingerprint()
+
+    rows: List[Dict[str, Any]] = []
+    forests: Dict[str, FlatForest] = {}
+    with tempfile.TemporaryDirectory(prefix="distill_") as tmp:
+        for trees, max_depth, merge_tol in itertools.product([None] + tree_counts,
+                                                              [None] + sorted(set(args.max_depth)),
+                                                              [0.0] + sorted(set(args.merge_tol))):
+            name = variant_name(trees, max_depth, merge_tol)
+            forest = build_variant(source.engine, tree_order, trees, max_depth, merge_tol)
+            path = os.path.join(tmp, "variant.rfflat")
+            write_flat_forest(forest, features_order, path)
+            wrapper = RFRegressorWrapper(path, args.features_order_path)
+            accuracy = evaluate(wrapper, X_eval, reference)
+            row = {
+                "variant": name,
+                "transforms": {"trees": trees or forest.n_trees, "max_depth": max_depth, "merge_tol": merge_tol},
+                "n_trees": forest.n_trees,
+                "n_nodes": forest.n_nodes,
+                "size_bytes": os.path.getsize(path),
+                "accuracy": accuracy,
+                "latency": latency(wrapper, X_eval, args.min_time, args.batch_size),
+                "within_budget": within_budget(accuracy, budget),
+            }
+            del wrapper
+            rows.append(row)
+            forests[name] = forest
+            print(f"  {name:<28} {forest.n_nodes:>7} node  {'✓' if row['within_budget'] else '✗'}")
+
+    batch_key = f"batch{min(args.batch_size, len(X_eval))}_p50_ms"
+    print_table(rows, batch_key)
+
+    if args.variant:
+        chosen = next((r for r in rows if r["variant"] == args.variant), None)
+        if chosen is None:
+            print(f"✗ Varian tidak dikenal: {args.variant}")
+            sys.exit(1)
+    else:
+        candidates = [r for r in rows if r["within_budget"] and r["variant"] != "full"]
+        chosen = min(candidates, key=lambda r: (r["n_trees"], r["n_nodes"]), default=None)
+
+    report = {
+        "created_at": datetime.now(WIB).isoformat(timespec="seconds"),
+        "source_file": os.path.basename(args.model_path),
+        "source_fingerprint": fingerprint,
+        "budget": budget,
+        "eval": {"samples": args.samples, "seed": args.seed, "envelope": {k: list(envelope[k]) for k in features_order},
+                 "reference_ci90_coverage": round(reference["coverage"], 6)},
+        "variants": rows,
+        "chosen": chosen["variant"] if chosen else None,
+    }
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Laporan ditulis: {args.report}")
+
+    if chosen is None:
+        print("\n✗ Tidak ada varian yang lolos budget; artefak tidak ditulis")
+        sys.exit(1)
+    print(f"\nVarian terpilih: {chosen['variant']}{'' if chosen['within_budget'] else ' (DI LUAR BUDGET)'}")
+    if not args.out_path:
+        return
+
+    distillation = {key: report[key] for key in ("created_at", "source_fingerprint", "budget", "eval")}
+    distillation.update({key: chosen[key] for key in ("variant", "transforms", "accuracy", "latency", "within_budget")})
+    source_meta = (source.model_header or {}).get("metadata", {})
+    metadata = {"source_file": source_meta.get("source_file", os.path.basename(args.model_path)),
+                "distillation": distillation}
+    header = write_flat_forest(forests[chosen["variant"]], features_order, args.out_path,
+                               source_sha256=source_sha256, metadata=metadata)
+    print(f"✓ Artefak ditulis: {args.out_path} ({os.path.getsize(args.out_path)} bytes)")
+    print(f"  trees={header['n_trees']} nodes={header['n_nodes']} (sumber: {source.engine.n_trees} tree, {source.engine.n_nodes} node)")
+
+    # sanity check: artefak harus memberi prediksi yang sama dengan varian yang dievaluasi
+    check = RFRegressorWrapper(args.out_path, args.features_order_path, verify_source=args.model_path if source.model_format == "joblib" else None)
+    if evaluate(check, X_eval, reference) != chosen["accuracy"]:
+        print("✗ Prediksi artefak berbeda dengan varian yang dievaluasi")
+        sys.exit(1)
+    print("✓ Artefak terverifikasi (akurasi identik dengan laporan)")
+
+if __name__ == "__main__":
+    main()
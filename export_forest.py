@@ -0,0 +1,52 @@
+"""
+Export model Random Forest (joblib) ke artefak forest flat yang bisa di-memory-map.
+
+Contoh:
+    python export_forest.py rf_total_coliform_log1p_improved.joblib model_features_order.txt \
+        rf_total_coliform_log1p_improved.rfflat
+
+Lalu jalankan backend dengan:
+    MODEL_PATH=rf_total_coliform_log1p_improved.rfflat
+    MODEL_SOURCE_PATH=rf_total_coliform_log1p_improved.joblib   # opsional, verifikasi checksum
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+from inference_rf import export_flat_forest, RFRegressorWrapper
+
+def main():
+    parser = argparse.ArgumentParser(description="Export RandomForestRegressor joblib ke artefak forest flat (mmap)")
+    parser.add_argument("model_path", help="Path model joblib")
+    parser.add_argument("features_order_path", help="Path model_features_order.txt")
+    parser.add_argument("out_path", help="Path artefak output (.rfflat)")
+    args = parser.parse_args()
+
+    header = export_flat_forest(args.model_path, args.features_order_path, args.out_path)
+    print(f"✓ Artefak ditulis: {args.out_path} ({os.path.getsize(args.out_path)} bytes)")
+    print(f"  trees={header['n_trees']} nodes={header['n_nodes']} features={header['features_order']}")
+    print(f"  source_sha256={header['source_sha256']}")
+
+    # sanity check: artefak harus memberi prediksi identik dengan joblib asli
+    import numpy as np
+    original = RFRegressorWrapper(args.model_path, args.features_order_path)
+    flat = RFRegressorWrapper(args.out_path, args.features_order_path, verify_source=args.model_path)
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.uniform(0, 50, 256),      # temp_c
+        rng.uniform(0, 14, 256),      # do_mgl
+        rng.uniform(4, 10, 256),      # ph
+        rng.uniform(0, 3000, 256),    # conductivity_uscm
+    ])
+    a = original.predict_batch_with_interval(X)
+    b = flat.predict_batch_with_interval(X)
+    if any(x != y for x, y in zip(a, b)):
+        print("✗ Prediksi artefak berbeda dengan model asli")
+        sys.exit(1)
+    print("✓ Prediksi artefak identik dengan model asli (256 sampel)")
+
+if __name__ == "__main__":
+    main()
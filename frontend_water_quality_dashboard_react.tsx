@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import {
   LineChart,
   Line,
@@ -168,6 +168,8 @@ export default function WaterQualityDashboard() {
 
   // ---- IoT History state ----
   const [iotHistory, setIotHistory] = useState<any[]>([]);
+  // seq record terbaru di tabel history (cursor `after_seq` untuk ambil data baru saja)
+  const historyCursor = useRef<number | null>(null);
   const [historyLoading, setHistoryLoading] = useState(false);
 
   // ---- Modal state ----
@@ -189,54 +191,7 @@ export default function WaterQualityDashboard() {
         throw new Error(`HTTP ${res.status}`);
       }
       const data = await res.json();
-      
-      // Validasi response
-      if (!data || !data.sensor_data || !data.prediction || !data.status) {
-        throw new Error("Data IoT tidak valid atau kosong.");
-      }
-      
-      // Update sensor readings dari sensor_data
-      setTemp(data.sensor_data.temp_c ?? 0);
-      setDoMgl(data.sensor_data.do_mgl ?? 0);
-      setPh(data.sensor_data.ph ?? 0);
-      setCond(data.sensor_data.conductivity_uscm ?? 0);
-      setColiform(data.sensor_data.totalcoliform_mv_raw ?? 0);
-      setColiformMv(data.sensor_data.totalcoliform_mv ?? 0);
-      setLastUpdate(data.timestamp ? formatDateWIB(data.timestamp) : "");
-      
-      // Update prediction dari response
-      setPrediction({
-        total_coliform_mv: data.prediction.total_coliform_mv ?? 0,
-        ci90_low: data.prediction.confidence_interval.low ?? 0,
-        ci90_high: data.prediction.confidence_interval.high ?? 0,
-      });
-      
-      // Update badges dari response
-      if (data.badges) {
-        setBadges(data.badges);
-      }
-      
-      // Update decision dari status
-      setDecision({
-        potable: data.status.potable ?? false,
-        severity: data.status.severity ?? "safe",
-        reasons: data.status.reasons ?? [],
-        recommendations: data.status.recommendations ?? [],
-        alternative_use: [], // endpoint baru tidak include alternative_use
-      });
-      
-      // Update history chart
-      const t = new Date();
-      setHistory((h) => [
-        ...h.slice(-49),
-        {
-          t: t.toLocaleTimeString([], { hour12: false }),
-          pred: data.prediction.total_coliform_mv ?? 0,
-          low: data.prediction.confidence_interval.low ?? 0,
-          high: data.prediction.confidence_interval.high ?? 0,
-        },
-      ]);
-      
+      applyLatestStatus(data);
     } catch (e: any) {
       setError(e.message || String(e));
       console.error("Error fetching latest IoT data:", e);
@@ -245,6 +200,56 @@ export default function WaterQualityDashboard() {
     }
   }
 
+  // Terapkan status terbaru (response /api/latest atau event `reading` dari /iot/stream)
+  function applyLatestStatus(data: any) {
+    // Validasi response
+    if (!data || !data.sensor_data || !data.prediction || !data.status) {
+      throw new Error("Data IoT tidak valid atau kosong.");
+    }
+    
+    // Update sensor readings dari sensor_data
+    setTemp(data.sensor_data.temp_c ?? 0);
+    setDoMgl(data.sensor_data.do_mgl ?? 0);
+    setPh(data.sensor_data.ph ?? 0);
+    setCond(data.sensor_data.conductivity_uscm ?? 0);
+    setColiform(data.sensor_data.totalcoliform_mv_raw ?? 0);
+    setColiformMv(data.sensor_data.totalcoliform_mv ?? 0);
+    setLastUpdate(data.timestamp ? formatDateWIB(data.timestamp) : "");
+    
+    // Update prediction dari response
+    setPrediction({
+      total_coliform_mv: data.prediction.total_coliform_mv ?? 0,
+      ci90_low: data.prediction.confidence_interval.low ?? 0,
+      ci90_high: data.prediction.confidence_interval.high ?? 0,
+    });
+    
+    // Update badges dari response
+    if (data.badges) {
+      setBadges(data.badges);
+    }
+    
+    // Update decision dari status
+    setDecision({
+      potable: data.status.potable ?? false,
+      severity: data.status.severity ?? "safe",
+      reasons: data.status.reasons ?? [],
+      recommendations: data.status.recommendations ?? [],
+      alternative_use: [], // endpoint baru tidak include alternative_use
+    });
+    
+    // Update history chart
+    const t = new Date();
+    setHistory((h) => [
+      ...h.slice(-49),
+      {
+        t: t.toLocaleTimeString([], { hour12: false }),
+        pred: data.prediction.total_coliform_mv ?? 0,
+        low: data.prediction.confidence_interval.low ?? 0,
+        high: data.prediction.confidence_interval.high ?? 0,
+      },
+    ]);
+  }
+
   async function handlePredict(iotData?: any) {
     try {
       const body: any = {
@@ -334,50 +339,41 @@ export default function WaterQualityDashboard() {
     }
   }
 
+  // Gabung record baru ke tabel history: unik per seq (record masuk menimpa yang lama, mis. hasil
+  // enrichment yang datang belakangan), urut lama → baru, maks. 50 baris
+  function mergeHistory(current: any[], incoming: any[]) {
+    const bySeq = new Map<number, any>();
+    for (const row of [...current, ...incoming]) bySeq.set(row.seq, row);
+    return [...bySeq.values()].sort((a, b) => a.seq - b.seq).slice(-50);
+  }
+
   // Fungsi untuk fetch history data dari IoT
-  async function fetchIoTHistory() {
+  // incremental = true: hanya ambil record setelah cursor (after_seq) lalu append ke tabel
+  async function fetchIoTHistory(incremental = false) {
+    const afterSeq = incremental ? historyCursor.current : null;
     setHistoryLoading(true);
     try {
-      const res = await fetch(`${API_BASE}/iot/history?limit=50`);
+      const query = afterSeq !== null ? `after_seq=${afterSeq}&limit=50` : "limit=50";
+      const res = await fetch(`${API_BASE}/iot/history?${query}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const response = await res.json();
+      if (afterSeq !== null && response.has_more) {
+        // Tertinggal lebih dari 50 record: ambil ulang 50 terbaru
+        return await fetchIoTHistory(false);
+      }
       
-      // Predict untuk setiap data history
-      const historyWithPredictions = await Promise.all(
-        response.data.map(async (item: any) => {
-          try {
-            const predictBody = {
-              temp_c: item.temp_c,
-              do_mgl: item.do_mgl,
-              ph: item.ph,
-              conductivity_uscm: item.conductivity_uscm,
-              totalcoliform_mv: item.totalcoliform_mv,  // KIRIM sensor ke backend untuk priority logic
-            };
-            const predictRes = await fetch(`${API_BASE}/predict`, {
-              method: "POST",
-              headers: { "Content-Type": "application/json" },
-              body: JSON.stringify(predictBody),
-            });
-            const predictData = await predictRes.json();
-            
-            return {
-              ...item,
-              prediction: predictData.prediction.total_coliform_mv,
-              potable: predictData.ai_detection.potable,
-              severity: predictData.ai_detection.severity,  // TAMBAHKAN severity (safe/warning/danger)
-            };
-          } catch (e) {
-            return {
-              ...item,
-              prediction: null,
-              potable: null,
-              severity: null,  // TAMBAHKAN null jika error
-            };
-          }
-        })
-      );
+      // Prediksi, potable & severity sudah dihitung backend saat ingest (inline di setiap record)
+      const historyWithPredictions = response.data.map((item: any) => ({
+        ...item,
+        prediction: item.prediction?.total_coliform_mv ?? null,
+        potable: item.ai_detection?.potable ?? null,
+        severity: item.ai_detection?.severity ?? null,  // safe/warning/danger
+      }));
       
-      setIotHistory(historyWithPredictions);
+      historyCursor.current = response.next_cursor ?? null;
+      setIotHistory((h) =>
+        afterSeq !== null ? mergeHistory(h, historyWithPredictions) : historyWithPredictions
+      );
     } catch (e: any) {
       console.error("Error fetching history:", e);
     } finally {
@@ -400,6 +396,7 @@ export default function WaterQualityDashboard() {
       
       // Clear local state - history table
       setIotHistory([]);
+      historyCursor.current = null;
       
       // Reset grafik history
       setHistory([]);
@@ -429,7 +426,7 @@ export default function WaterQualityDashboard() {
   // Fungsi untuk refresh semua data (latest + history)
   async function refreshAllData() {
     await fetchLatestIoTData();
-    await fetchIoTHistory();
+    await fetchIoTHistory(historyCursor.current !== null);
   }
 
   // Auto-refresh setiap interval
@@ -438,13 +435,42 @@ export default function WaterQualityDashboard() {
     fetchSensorIds();    // Fetch sensor IDs dari backend
     refreshAllData();
     
-    // Set interval untuk auto-refresh
+    // Live update via Server-Sent Events: server push setiap record baru (tanpa polling)
+    const stream = new EventSource(`${API_BASE}/iot/stream?replay=0`);
+    stream.addEventListener("reading", (e: MessageEvent) => {
+      try {
+        const data = JSON.parse(e.data);
+        setError(null);
+        applyLatestStatus(data);
+        historyCursor.current = Math.max(historyCursor.current ?? -1, Number(e.lastEventId));
+        // Tambahkan ke tabel history (urut lama → baru, maks. 50 baris)
+        setIotHistory((h) => mergeHistory(h, [
+          {
+            ...data.sensor_data,
+            seq: Number(e.lastEventId),
+            timestamp: data.timestamp,
+            prediction: data.prediction?.total_coliform_mv ?? null,
+            potable: data.status?.potable ?? null,
+            severity: data.status?.severity ?? null,
+          },
+        ]));
+      } catch (err) {
+        console.error("Error applying stream event:", err);
+      }
+    });
+    // Event terlewat (koneksi lambat): ambil hanya record setelah cursor terakhir
+    stream.addEventListener("dropped", () => fetchIoTHistory(true));
+    
+    // Interval auto-refresh tetap ada sebagai fallback (mis. stream terputus lama)
     const intervalId = setInterval(() => {
       refreshAllData();
     }, REFRESH_INTERVAL);
     
-    // Cleanup interval saat component unmount
-    return () => clearInterval(intervalId);
+    // Cleanup stream & interval saat component unmount
+    return () => {
+      stream.close();
+      clearInterval(intervalId);
+    };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
@@ -787,7 +813,7 @@ export default function WaterQualityDashboard() {
             </div>
             <div className="flex gap-2">
               <button 
-                onClick={fetchIoTHistory} 
+                onClick={() => fetchIoTHistory()} 
                 disabled={historyLoading}
                 className="px-4 py-2 text-sm rounded-lg bg-indigo-600 text-white hover:bg-indigo-700 disabled:opacity-50 disabled:cursor-not-allowed flex items-center gap-2"
               >
@@ -0,0 +1,155 @@
+"""
+Process pool inferensi yang berbagi SATU salinan forest lewat shared memory.
+
+Proses API (supervisor) menyalin array node FlatForest sekali ke satu blok
+`multiprocessing.shared_memory`; setiap proses worker (spawn) meng-attach blok tersebut dan
+membangun FlatForest di atas view NumPy (tanpa salinan, tanpa unpickling model). Batch dikirim
+sebagai array fitur float32 per potongan baris; worker mengembalikan mean + kuantil (skala log1p).
+
+Dengan mode ini API cukup berjalan sebagai satu proses uvicorn (storage IoT tetap satu writer,
+semua request melihat history yang sama), sementara inferensi batch besar memakai semua core
+tanpa GIL dan tanpa menduplikasi memori model per worker.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from inference_rf import FlatForest, tree_quantiles
+
+# array node yang disalin ke shared memory, urutan = urutan di blok
+_SHARED_ARRAYS = ("feature", "threshold", "children", "value", "roots")
+_ALIGN = 64
+
+class SharedForest:
+    """Array node FlatForest di satu blok SharedMemory (dibuat oleh supervisor)"""
+
+    def __init__(self, forest: FlatForest):
+        layout: Dict[str, Tuple[str, List[int], int]] = {}
+        offset = 0
+        for name in _SHARED_ARRAYS:
+            arr = np.ascontiguousarray(getattr(forest, name))
+            layout[name] = (arr.dtype.str, list(arr.shape), offset)
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+        self.shm = SharedMemory(create=True, size=max(offset, 1))
+        for name in _SHARED_ARRAYS:
+            dtype, shape, start = layout[name]
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[...] = getattr(forest, name)
+            del view
+        self.spec = {"name": self.shm.name, "layout": layout}
+        self.nbytes = self.shm.size
+
+    @staticmethod
+    def attach(spec: Dict[str, Any]) -> Tuple[FlatForest, SharedMemory]:
+        """Bangun FlatForest di atas blok shared memory yang sudah ada (di proses worker)"""
+        shm = _attach_untracked(spec["name"])
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+                  for name, (dtype, shape, start) in spec["layout"].items()}
+        for arr in arrays.values():
+            arr.flags.writeable = False
+        return FlatForest(**arrays), shm
+
+    def close(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def _attach_untracked(name: str) -> SharedMemory:
+    """
+    Attach blok milik supervisor tanpa mendaftarkannya ke resource tracker. Worker spawn memakai
+    tracker yang sama dengan supervisor; registrasi ganda membuat blok di-unlink/di-unregister
+    dua kali (KeyError di tracker, peringatan "leaked shared_memory").
+    """
+    try:
+        return SharedMemory(name=name, track=False)   # Python >= 3.13
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+# ---------- sisi worker ----------
+
+_worker_forest: Optional[FlatForest] = None
+_worker_shm: Optional[SharedMemory] = None
+
+def _init_worker(spec: Dict[str, Any]) -> None:
+    global _worker_forest, _worker_shm
+    _worker_forest, _worker_shm = SharedForest.attach(spec)
+
+def _worker_outputs(X: np.ndarray, quantiles: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean + kuantil antar-tree (log1p) untuk satu potongan baris float32"""
+    leaves = _worker_forest.apply(X)
+    return _worker_forest.value[leaves].mean(axis=1), tree_quantiles(_worker_forest.value32[leaves], quantiles)
+
+def _worker_ready(_: int) -> int:
+    return _worker_forest.n_nodes
+
+# ---------- sisi supervisor ----------
+
+class InferenceProcessPool:
+    """
+    Pool `processes` proses worker yang berbagi satu SharedForest.
+
+    - `outputs(X, quantiles)`: batch dibagi rata per potongan baris ke semua worker. Jika worker
+      mati (BrokenProcessPool), pool dibuat ulang (blok forest dipakai ulang) lalu error diteruskan
+      agar caller bisa menghitung batch tersebut sendiri.
+    - `close()`: hentikan worker dan lepaskan shared memory
+    """
+
+    def __init__(self, forest: FlatForest, processes: int):
+        self.processes = max(1, int(processes))
+        self.shared = SharedForest(forest)
+        self.restarts = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # spawn, bukan fork: proses API sudah punya thread (ingest, logging, threadpool request)
+        executor = ProcessPoolExecutor(max_workers=self.processes,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(self.shared.spec,))
+        # pastikan semua worker sudah attach sebelum request pertama (startup, bukan di request path)
+        list(executor.map(_worker_ready, range(self.processes)))
+        return executor
+
+    def outputs(self, X: np.ndarray, quantiles: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        bounds = np.linspace(0, X.shape[0], self.processes + 1).astype(np.intp)
+        chunks = [X[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        executor = self._executor
+        try:
+            parts = list(executor.map(_worker_outputs, chunks, [list(quantiles)] * len(chunks)))
+        except BrokenProcessPool:
+            with self._lock:
+                # request lain mungkin sudah membuat ulang pool
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._start()
+                    self.restarts += 1
+            raise
+        self.batches += 1
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts], axis=1)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.shared.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processes": self.processes,
+            "shared_memory_bytes": self.shared.nbytes,
+            "batches": self.batches,
+            "restarts": self.restarts,
+        }
@@ -1,7 +1,13 @@
 
 import json
-from dataclasses import dataclass, asdict
-from typing import Dict, Any, List, Tuple, Optional
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict, replace
+from typing import Callable, Dict, Any, List, Tuple, Optional, Sequence, Union
 import numpy as np
 import joblib
 
@@ -40,6 +46,42 @@ class InferenceOutput:
     pred_total_coliform_mv: float
     pred_ci90_low: float
     pred_ci90_high: float
+    # kuantil tambahan yang diminta caller, key = quantile_key(q); None = tidak diminta
+    pred_quantiles: Optional[Dict[str, float]] = None
+
+# Kuantil interval default (pred_ci90_low / pred_ci90_high) dan batas jumlah kuantil per request
+INTERVAL_QUANTILES = (0.10, 0.90)
+MAX_QUANTILES = 16
+
+def quantile_key(q: float) -> str:
+    """Key kuantil di response (mis. 0.05 → `0.05`, 0.5 → `0.5`)"""
+    return f"{q:g}"
+
+def tree_quantiles(est_preds: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    """
+    Kuantil antar-tree per baris untuk semua `quantiles` sekaligus, shape (len(quantiles), n_rows).
+
+    Hasil identik dengan `np.quantile(est_preds, q, axis=1)` (metode linear, dtype est_preds) untuk
+    setiap q, tetapi semua order statistic yang dibutuhkan diambil dengan SATU `np.partition`
+    sepanjang baris (kontigu), bukan satu partition per kuantil.
+    """
+    n_trees = est_preds.shape[1]
+    q = np.asarray(quantiles, dtype=est_preds.dtype)
+    position = q * (n_trees - 1)
+    lower = np.floor(position).astype(np.intp)
+    upper = np.minimum(lower + 1, n_trees - 1)
+    part = np.partition(est_preds, np.unique(np.concatenate([lower, upper])), axis=1)
+    a, b = part[:, lower], part[:, upper]
+    gamma = (position - lower).astype(est_preds.dtype)
+    diff = b - a
+    # sama dengan numpy _lerp: dari sisi atas untuk gamma >= 0.5 (presisi di dekat b)
+    result = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+    return result.T
+
+# Kode numerik untuk menyimpan hasil rules secara ringkas (index ke tuple di bawah)
+SEVERITY_LEVELS = ("safe", "warning", "danger")
+BADGE_LEVELS = ("unknown", "optimal", "warning", "danger", "faulty")
+BADGE_PARAMS = ("temp_c", "ph", "do_mgl", "conductivity_uscm", "totalcoliform_mv")
 
 @dataclass
 class DetectionDecision:
@@ -49,19 +91,533 @@ class DetectionDecision:
     recommendations: List[str]
     alternative_use: List[str]
 
+class FlatForest:
+    """
+    Forest yang di-flatten: node semua tree dipack ke array NumPy kontigu (sekali saat load),
+    lalu semua tree untuk semua baris ditelusuri bersamaan dengan operasi vektor.
+
+    Layout node (index global, tree disusun berurutan):
+    - feature  (n_nodes,)    intp    : index fitur split (0 untuk leaf)
+    - threshold (n_nodes,)   float64 : ambang split (x <= threshold → kiri)
+    - children (n_nodes, 2)  intp    : [kiri, kanan]; leaf menunjuk ke dirinya sendiri
+    - value    (n_nodes,)    float64 : nilai prediksi node (skala log1p)
+    - roots    (n_trees,)    intp    : index root tiap tree
+    """
+    # jumlah elemen (baris x tree) per potongan traversal, supaya array kerja tetap di cache
+    CHUNK_ELEMENTS = 8192
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self._children_flat = children.reshape(-1)
+        self._is_leaf = children[:, 0] == np.arange(len(children))
+        # nilai node float32 (presisi prediksi per-tree sklearn), dihitung sekali saat load
+        # untuk kuantil antar-tree: lookup langsung, tanpa konversi matriks (N, n_trees) per request
+        self.value32 = np.asarray(value, dtype=np.float32)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatForest":
+        """Pack semua `estimators_` dari RandomForestRegressor (single output) ke array flat."""
+        trees = [est.tree_ for est in model.estimators_]
+        n_nodes = sum(t.node_count for t in trees)
+        feature = np.zeros(n_nodes, dtype=np.intp)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        children = np.empty((n_nodes, 2), dtype=np.intp)
+        value = np.empty(n_nodes, dtype=np.float64)
+        roots = np.empty(len(trees), dtype=np.intp)
+
+        offset = 0
+        for i, t in enumerate(trees):
+            n = t.node_count
+            nodes = slice(offset, offset + n)
+            idx = np.arange(offset, offset + n, dtype=np.intp)
+            is_leaf = t.children_left == -1
+            feature[nodes] = np.where(is_leaf, 0, t.feature)
+            threshold[nodes] = np.where(is_leaf, 0.0, t.threshold)
+            children[nodes, 0] = np.where(is_leaf, idx, t.children_left + offset)
+            children[nodes, 1] = np.where(is_leaf, idx, t.children_right + offset)
+            value[nodes] = t.value[:, 0, 0]
+            roots[i] = offset
+            offset += n
+
+        return cls(feature, threshold, children, value, roots)
+
+    def fingerprint(self) -> str:
+        """sha256 dari struktur + nilai node, untuk mendeteksi artefak turunan yang basi."""
+        h = hashlib.sha256()
+        for arr in (self.feature, self.threshold, self.children, self.value, self.roots):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Index global leaf untuk setiap baris x tree, shape (n_rows, n_trees).
+        X harus float32 (N, n_fitur), sama seperti yang dipakai sklearn saat predict.
+        """
+        n_rows, n_features = X.shape
+        n_trees = self.n_trees
+        x_flat = X.astype(np.float64).ravel()
+        leaves = np.empty(n_rows * n_trees, dtype=np.intp)
+
+        rows_per_chunk = max(1, self.CHUNK_ELEMENTS // n_trees)
+        for start in range(0, n_rows, rows_per_chunk):
+            stop = min(start + rows_per_chunk, n_rows)
+            m = stop - start
+            # posisi (baris, tree) yang masih berada di node internal
+            pos = np.arange(start * n_trees, stop * n_trees, dtype=np.intp)
+            row_offset = np.repeat(np.arange(start, stop, dtype=np.intp) * n_features, n_trees)
+            idx = np.tile(self.roots, m)
+            while pos.size:
+                go_right = x_flat[row_offset + self.feature[idx]] > self.threshold[idx]
+                idx = self._children_flat[2 * idx + go_right]
+                done = self._is_leaf[idx]
+                if done.any():
+                    leaves[pos[done]] = idx[done]
+                    active = ~done
+                    pos, idx, row_offset = pos[active], idx[active], row_offset[active]
+
+        return leaves.reshape(n_rows, n_trees)
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Nilai leaf (skala log1p) untuk setiap baris x tree, shape (n_rows, n_trees)."""
+        return self.value[self.apply(X)]
+
+# ========================================
+# FORMAT ARTEFAK FOREST FLAT (memory-mappable)
+# ========================================
+# Layout file (little-endian):
+#   [0:8]    magic  b"RFFLAT\0\0"
+#   [8:12]   uint32 versi format
+#   [12:16]  uint32 panjang header JSON (byte)
+#   [16:..]  header JSON (utf-8): features_order, checksum, offset/dtype/shape tiap array
+#   array node, masing-masing mulai di offset kelipatan FLAT_FOREST_ALIGN
+FLAT_FOREST_MAGIC = b"RFFLAT\0\0"
+FLAT_FOREST_VERSION = 1
+FLAT_FOREST_ALIGN = 64
+_FLAT_FOREST_PREFIX = 16
+_FLAT_FOREST_ARRAYS = {
+    "feature": "<i8",
+    "threshold": "<f8",
+    "children": "<i8",
+    "value": "<f8",
+    "roots": "<i8",
+}
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _align(n: int) -> int:
+    return -(-n // FLAT_FOREST_ALIGN) * FLAT_FOREST_ALIGN
+
+def is_flat_forest_file(path: str) -> bool:
+    """True jika file diawali magic artefak forest flat."""
+    with open(path, "rb") as f:
+        return f.read(len(FLAT_FOREST_MAGIC)) == FLAT_FOREST_MAGIC
+
+def write_flat_forest(forest: FlatForest, features_order: List[str], out_path: str,
+                      source_sha256: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Tulis FlatForest ke artefak biner flat. Return header yang ditulis."""
+    arrays = {name: np.ascontiguousarray(getattr(forest, name), dtype=dtype)
+              for name, dtype in _FLAT_FOREST_ARRAYS.items()}
+    payload_hash = hashlib.sha256()
+    for name in _FLAT_FOREST_ARRAYS:
+        payload_hash.update(arrays[name].tobytes())
+
+    header = {
+        "format_version": FLAT_FOREST_VERSION,
+        "n_trees": int(forest.n_trees),
+        "n_nodes": int(forest.n_nodes),
+        "n_features": len(features_order),
+        "features_order": list(features_order),
+        "source_sha256": source_sha256,
+        "payload_sha256": payload_hash.hexdigest(),
+        "metadata": metadata or {},
+        "arrays": {},
+    }
+    # offset array bergantung pada panjang header: hitung ulang sampai stabil
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, dtype in _FLAT_FOREST_ARRAYS.items():
+            header["arrays"][name] = {"dtype": dtype, "shape": list(arrays[name].shape), "offset": offset}
+            offset = _align(offset + arrays[name].nbytes)
+        header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+        needed = _align(_FLAT_FOREST_PREFIX + len(header_bytes))
+        if needed == data_start:
+            break
+        data_start = needed
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(FLAT_FOREST_MAGIC)
+        f.write(np.array([FLAT_FOREST_VERSION, len(header_bytes)], dtype="<u4").tobytes())
+        f.write(header_bytes)
+        for name in _FLAT_FOREST_ARRAYS:
+            f.seek(header["arrays"][name]["offset"])
+            f.write(arrays[name].tobytes())
+    os.replace(tmp_path, out_path)
+    return header
+
+def read_flat_forest_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        prefix = f.read(_FLAT_FOREST_PREFIX)
+        if prefix[:len(FLAT_FOREST_MAGIC)] != FLAT_FOREST_MAGIC:
+            raise ValueError(f"Bukan artefak forest flat: {path}")
+        version, header_len = np.frombuffer(prefix[len(FLAT_FOREST_MAGIC):], dtype="<u4")
+        if version != FLAT_FOREST_VERSION:
+            raise ValueError(f"Versi artefak forest flat tidak didukung: {version} (didukung: {FLAT_FOREST_VERSION})")
+        return json.loads(f.read(int(header_len)).decode("utf-8"))
+
+def load_flat_forest(path: str, verify_source: Optional[str] = None) -> Tuple[FlatForest, Dict[str, Any]]:
+    """
+    Buka artefak forest flat dengan np.memmap (read-only): tidak ada unpickling, dan
+    semua worker yang membuka file yang sama berbagi page cache.
+
+    Checksum payload selalu diverifikasi. Jika `verify_source` (path joblib asli) diberikan,
+    sha256 file tersebut harus sama dengan `source_sha256` di header.
+    """
+    header = read_flat_forest_header(path)
+    arrays = {}
+    payload_hash = hashlib.sha256()
+    for name in _FLAT_FOREST_ARRAYS:
+        spec = header["arrays"][name]
+        arr = np.memmap(path, dtype=np.dtype(spec["dtype"]), mode="r",
+                        offset=spec["offset"], shape=tuple(spec["shape"]))
+        payload_hash.update(arr)
+        arrays[name] = arr
+    if payload_hash.hexdigest() != header["payload_sha256"]:
+        raise ValueError(f"Checksum payload artefak forest tidak cocok (file rusak?): {path}")
+    if verify_source is not None:
+        source_sha256 = _sha256_file(verify_source)
+        if source_sha256 != header.get("source_sha256"):
+            raise ValueError(f"Artefak forest {path} tidak dibuat dari {verify_source} (checksum berbeda)")
+
+    # index node disimpan int64; hanya dikonversi bila intp platform berbeda
+    for name in ("feature", "children", "roots"):
+        if arrays[name].dtype != np.intp:
+            arrays[name] = arrays[name].astype(np.intp)
+    return FlatForest(**arrays), header
+
+def export_flat_forest(model_path: str, features_order_path: str, out_path: str,
+                       metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Konversi model joblib (RandomForestRegressor) ke artefak forest flat."""
+    import warnings
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    model = joblib.load(model_path)
+    with open(features_order_path, "r") as f:
+        features_order = [line.strip() for line in f if line.strip()]
+    meta = {"source_file": os.path.basename(model_path)}
+    meta.update(metadata or {})
+    return write_flat_forest(FlatForest.from_sklearn(model), features_order, out_path,
+                             source_sha256=_sha256_file(model_path), metadata=meta)
+
+# Langkah kuantisasi default = resolusi sensor ESP32
+DEFAULT_CACHE_STEPS = {
+    "temp_c": 0.1,               # °C
+    "do_mgl": 0.01,              # mg/L
+    "ph": 0.01,
+    "conductivity_uscm": 1.0,    # µS/cm
+}
+
+class PredictionCache:
+    """
+    LRU cache (thread-safe) untuk InferenceOutput, dengan key vektor fitur yang dikuantisasi
+    per fitur. Bacaan dalam satu "bucket" kuantisasi berbagi hasil yang sama: hasil dihitung
+    dari nilai representatif bucket (key * step), sehingga tidak bergantung urutan request.
+    Step 0 berarti fitur tersebut tidak dikuantisasi (key = nilai persis).
+    """
+    def __init__(self, features_order: List[str], max_size: int = 4096,
+                 steps: Optional[Dict[str, float]] = None):
+        if max_size <= 0:
+            raise ValueError("max_size cache harus > 0")
+        steps = DEFAULT_CACHE_STEPS if steps is None else steps
+        self.features_order = list(features_order)
+        self.max_size = int(max_size)
+        self.steps = np.array([float(steps.get(k, 0.0)) for k in self.features_order], dtype=np.float64)
+        self._quantized = self.steps > 0
+        self._safe_steps = np.where(self._quantized, self.steps, 1.0)
+        self._data: "OrderedDict[Tuple[float, ...], InferenceOutput]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, X: np.ndarray) -> Tuple[List[Tuple[float, ...]], np.ndarray]:
+        """Return (keys, X_representatif) untuk semua baris X (float64, (N, n_fitur))."""
+        Q = np.where(self._quantized, np.rint(X / self._safe_steps), X)
+        X_rep = np.where(self._quantized, Q * self._safe_steps, X)
+        return list(map(tuple, Q.tolist())), X_rep
+
+    def get_many(self, keys: List[Tuple[float, ...]]) -> List[Optional[InferenceOutput]]:
+        out = []
+        with self._lock:
+            for key in keys:
+                hit = self._data.get(key)
+                if hit is None:
+                    self.misses += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                out.append(hit)
+        return out
+
+    def put_many(self, items: List[Tuple[Tuple[float, ...], InferenceOutput]]) -> None:
+        with self._lock:
+            for key, value in items:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "steps": dict(zip(self.features_order, self.steps.tolist())),
+            }
+
+# Envelope operasi untuk mode "fast" (lattice), dari rentang di IoTDataInput / Thresholds
+DEFAULT_LATTICE_ENVELOPE = {
+    "temp_c": (10.0, 45.0),              # Thresholds: temp_safe_min_c .. temp_hot_safe_c
+    "do_mgl": (0.0, 10.0),               # IoTDataInput: normal 6-8 mg/L, Thresholds: do_low_mgl 5
+    "ph": (6.0, 9.0),                    # Thresholds: 6.5-8.5, alternatif penggunaan 6.0-9.0
+    "conductivity_uscm": (0.0, 2000.0),  # IoTDataInput: normal 50-1500 µS/cm
+}
+
+class InterpolationLattice:
+    """
+    Lattice reguler di atas envelope operasi yang menyimpan output forest (mean, q10, q90;
+    skala log1p) di setiap titik grid. Query dijawab dengan interpolasi multilinear: biaya
+    O(2^n_fitur) per baris, tidak bergantung jumlah/kedalaman tree.
+    """
+    def __init__(self, features_order: List[str], axes: List[np.ndarray], table: np.ndarray, fingerprint: str):
+        self.features_order = list(features_order)
+        self.axes = [np.asarray(a, dtype=np.float64) for a in axes]
+        self.table = table.reshape(-1, table.shape[-1])   # (n_titik, 3)
+        self.shape = tuple(len(a) for a in self.axes)
+        self.fingerprint = fingerprint
+        self.lower = np.array([a[0] for a in self.axes])
+        self.upper = np.array([a[-1] for a in self.axes])
+        self._strides = np.array([int(np.prod(self.shape[d + 1:])) for d in range(len(self.shape))], dtype=np.intp)
+
+    @classmethod
+    def build(cls, predict_log, features_order: List[str], envelope: Dict[str, Tuple[float, float]],
+              points_per_axis: int, fingerprint: str, chunk_rows: int = 8192) -> "InterpolationLattice":
+        """Evaluasi `predict_log(X) -> (mean, q10, q90)` di semua titik grid."""
+        if points_per_axis < 2:
+            raise ValueError("points_per_axis minimal 2")
+        axes = [np.linspace(envelope[k][0], envelope[k][1], points_per_axis) for k in features_order]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes))
+        table = np.empty((grid.shape[0], 3), dtype=np.float64)
+        for start in range(0, grid.shape[0], chunk_rows):
+            stop = start + chunk_rows
+            table[start:stop] = np.column_stack(predict_log(grid[start:stop]))
+        return cls(features_order, axes, table, fingerprint)
+
+    def contains(self, X: np.ndarray) -> np.ndarray:
+        """Mask baris yang seluruh fiturnya berada di dalam envelope lattice."""
+        return ((X >= self.lower) & (X <= self.upper)).all(axis=1)
+
+    def interpolate(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Interpolasi multilinear (mean, q10, q90) skala log1p untuk baris X di dalam envelope."""
+        n_rows, n_dims = X.shape
+        base = np.zeros(n_rows, dtype=np.intp)
+        frac = np.empty((n_rows, n_dims), dtype=np.float64)
+        for d, axis in enumerate(self.axes):
+            i = np.clip(np.searchsorted(axis, X[:, d], side="right") - 1, 0, len(axis) - 2)
+            frac[:, d] = (X[:, d] - axis[i]) / (axis[i + 1] - axis[i])
+            base += i * self._strides[d]
+
+        out = np.zeros((n_rows, self.table.shape[1]), dtype=np.float64)
+        for corner in range(1 << n_dims):
+            weight = np.ones(n_rows, dtype=np.float64)
+            idx = base.copy()
+            for d in range(n_dims):
+                if corner >> d & 1:
+                    weight *= frac[:, d]
+                    idx += self._strides[d]
+                else:
+                    weight *= 1.0 - frac[:, d]
+            out += weight[:, None] * self.table[idx]
+        return out[:, 0], out[:, 1], out[:, 2]
+
+    def check(self, predict_log, n_samples: int = 2000, seed: int = 0) -> Dict[str, Any]:
+        """Bandingkan lattice vs forest exact di titik acak dalam envelope (error absolut log1p)."""
+        rng = np.random.default_rng(seed)
+        X = rng.uniform(self.lower, self.upper, size=(n_samples, len(self.axes)))
+        exact = predict_log(X)
+        approx = self.interpolate(X)
+        errors = {name: float(np.max(np.abs(a - e)))
+                  for name, a, e in zip(("mean", "q10", "q90"), approx, exact)}
+        return {
+            "points": int(self.table.shape[0]),
+            "points_per_axis": list(self.shape),
+            "envelope": {k: [float(lo), float(hi)] for k, lo, hi in zip(self.features_order, self.lower, self.upper)},
+            "n_check": int(n_samples),
+            "max_abs_error_log1p": max(errors.values()),
+            "max_abs_error_log1p_by_output": errors,
+        }
+
+    def save(self, path: str) -> None:
+        # lewat file handle: np.savez menambah akhiran ".npz" jika `path` diberikan sebagai nama file
+        with open(path, "wb") as f:
+            np.savez(f, table=self.table.reshape(self.shape + (-1,)), fingerprint=self.fingerprint,
+                     features_order=np.array(self.features_order), **{f"axis_{d}": a for d, a in enumerate(self.axes)})
+
+    @classmethod
+    def load(cls, path: str) -> "InterpolationLattice":
+        with np.load(path) as data:
+            axes = [data[f"axis_{d}"] for d in range(len(data["features_order"]))]
+            return cls(data["features_order"].tolist(), axes, data["table"], str(data["fingerprint"]))
+
 class RFRegressorWrapper:
-    def __init__(self, model_path: str, features_order_path: str):
+    def __init__(self, model_path: str, features_order_path: str, verify_source: Optional[str] = None,
+                 cache_size: int = 0, cache_steps: Optional[Dict[str, float]] = None,
+                 threads: int = 1, parallel_min_rows: int = 2048, processes: int = 0):
+        """
+        `model_path` boleh model joblib (RandomForestRegressor) atau artefak forest flat
+        hasil `export_flat_forest` (dideteksi dari magic bytes). Untuk artefak flat,
+        `verify_source` opsional menunjuk ke joblib asli untuk verifikasi checksum.
+
+        `cache_size` > 0 mengaktifkan PredictionCache (LRU) dengan langkah kuantisasi
+        `cache_steps` per fitur (default DEFAULT_CACHE_STEPS).
+
+        `threads` > 1 (0 = jumlah core): batch exact dengan minimal `parallel_min_rows` baris dibagi
+        per potongan baris ke thread pool persisten. Traversal, gather, mean, dan partition adalah
+        operasi NumPy yang melepas GIL, sehingga potongan berjalan paralel di core berbeda. Batch
+        kecil tetap di thread pemanggil (tanpa overhead antrian).
+
+        `processes` > 0: potongan baris dikirim ke InferenceProcessPool (inference_pool.py) yang
+        berbagi satu salinan forest di shared memory (menggantikan thread pool).
+        """
         import warnings
         warnings.filterwarnings('ignore', category=UserWarning)
         
-        self.model = joblib.load(model_path)
-        
         with open(features_order_path, "r") as f:
             self.features_order = [line.strip() for line in f if line.strip()]
         # guard
         if not self.features_order:
             raise ValueError("Fitur kosong pada features_order.")
 
+        self.model_format = "flat" if is_flat_forest_file(model_path) else "joblib"
+        if self.model_format == "flat":
+            # artefak flat: cukup mmap, tanpa unpickling
+            self.model = None
+            self.engine, self.model_header = load_flat_forest(model_path, verify_source=verify_source)
+            if self.model_header["features_order"] != self.features_order:
+                raise ValueError(f"Urutan fitur artefak {self.model_header['features_order']} "
+                                 f"berbeda dengan features_order {self.features_order}")
+        else:
+            self.model = joblib.load(model_path)
+            # forest di-flatten sekali di sini, dipakai untuk semua inferensi
+            self.engine = FlatForest.from_sklearn(self.model)
+            self.model_header = None
+
+        self.cache = PredictionCache(self.features_order, cache_size, cache_steps) if cache_size > 0 else None
+        # mode "fast": lattice interpolasi (lihat enable_lattice); None = selalu exact
+        self.lattice: Optional[InterpolationLattice] = None
+        self.lattice_report: Optional[Dict[str, Any]] = None
+        # hook timing per tahap inferensi: stage_hook(nama_tahap, detik), mis. untuk /metrics
+        self.stage_hook: Optional[Callable[[str, float], None]] = None
+
+        self.threads = int(threads) if threads > 0 else (os.cpu_count() or 1)
+        self.parallel_min_rows = max(1, int(parallel_min_rows))
+        self._pool = None
+        self._process_pool = None
+        if processes > 0:
+            from inference_pool import InferenceProcessPool
+            self._process_pool = InferenceProcessPool(self.engine, processes)
+        elif self.threads > 1:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="rf-infer")
+
+    def close(self) -> None:
+        """Hentikan thread/process pool inferensi (jika ada)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._process_pool is not None:
+            self._process_pool.close()
+            self._process_pool = None
+
+    def parallel_stats(self) -> Dict[str, Any]:
+        mode = "processes" if self._process_pool is not None else "threads" if self._pool is not None else "off"
+        return {"mode": mode, "threads": self.threads, "parallel_min_rows": self.parallel_min_rows,
+                "enabled": mode != "off",
+                "process_pool": self._process_pool.stats() if self._process_pool is not None else None}
+
+    def _record_stage(self, stage: str, start: float) -> None:
+        if self.stage_hook is not None:
+            self.stage_hook(stage, time.perf_counter() - start)
+
+    @property
+    def inference_mode(self) -> str:
+        return "fast" if self.lattice is not None else "exact"
+
+    def enable_lattice(self, envelope: Optional[Dict[str, Tuple[float, float]]] = None,
+                       points_per_axis: int = 9, max_error: float = 0.05, n_check: int = 2000,
+                       path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aktifkan mode "fast": precompute lattice (atau load dari `path` bila cocok dengan forest
+        ini), lalu cek error maksimum terhadap forest exact. Lattice hanya dipakai jika
+        max_abs_error_log1p <= `max_error`; baris di luar envelope tetap dievaluasi exact.
+        """
+        envelope = envelope or DEFAULT_LATTICE_ENVELOPE
+        fingerprint = self.engine.fingerprint()
+        lattice = None
+        if path and os.path.exists(path):
+            lattice = InterpolationLattice.load(path)
+            if lattice.fingerprint != fingerprint or lattice.features_order != self.features_order:
+                lattice = None   # basi: dibuat dari forest lain
+        if lattice is None:
+            lattice = InterpolationLattice.build(self._predict_log_exact, self.features_order,
+                                                 envelope, points_per_axis, fingerprint)
+            if path:
+                lattice.save(path)
+
+        report = lattice.check(self._predict_log_exact, n_samples=n_check)
+        report["max_error"] = float(max_error)
+        report["accepted"] = report["max_abs_error_log1p"] <= max_error
+        self.lattice = lattice if report["accepted"] else None
+        self.lattice_report = report
+        if self.cache is not None:
+            self.cache.clear()   # hasil cache lama berasal dari mode sebelumnya
+        return report
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Statistik PredictionCache (hit/miss/eviction), atau {"enabled": False}."""
+        if self.cache is None:
+            return {"enabled": False}
+        return self.cache.stats()
+
     def _to_feature_array(self, features: Dict[str, Any]) -> np.ndarray:
         vals = []
         for k in self.features_order:
@@ -71,22 +627,169 @@ class RFRegressorWrapper:
             vals.append(v)
         return np.array(vals, dtype=np.float32).reshape(1, -1)
 
-    def predict_with_interval(self, features: Dict[str, Any]) -> InferenceOutput:
-        X = self._to_feature_array(features)
-        # prediksi di skala log1p
-        y_log = self.model.predict(X)[0]
-        # interval via sebaran antar-tree
-        est_preds = np.array([estimator.predict(X)[0] for estimator in self.model.estimators_], dtype=np.float32)
-        low_log = np.quantile(est_preds, 0.10)
-        high_log = np.quantile(est_preds, 0.90)
+    def _to_feature_matrix(self, rows: Union[Sequence[Dict[str, Any]], np.ndarray]) -> np.ndarray:
+        """
+        Susun N baris fitur menjadi array float64 (N, n_fitur) sesuai features_order.
+        `rows` boleh list of dict atau array (N, n_fitur) yang kolomnya sudah berurutan
+        sesuai model_features_order.txt.
+        """
+        n_features = len(self.features_order)
+        if isinstance(rows, np.ndarray):
+            X = np.asarray(rows, dtype=np.float64)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+            if X.ndim != 2 or X.shape[1] != n_features:
+                raise ValueError(f"Array fitur harus berbentuk (N, {n_features}), didapat {X.shape}")
+            return X
+
+        X = np.empty((len(rows), n_features), dtype=np.float64)
+        for i, features in enumerate(rows):
+            for j, k in enumerate(self.features_order):
+                if k not in features:
+                    raise KeyError(f"Missing feature '{k}' (row {i})")
+                X[i, j] = float(features[k])
+        return X
+
+    def _predict_log_batch(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Prediksi + kuantil 10/90 di skala log1p; lewat lattice bila mode "fast" aktif."""
+        if self.lattice is None:
+            return self._predict_log_exact(X)
+        start = time.perf_counter()
+        inside = self.lattice.contains(X)
+        if inside.all():
+            result = self.lattice.interpolate(X)
+            self._record_stage("lattice_interpolate", start)
+            return result
+        y_log, low_log, high_log = (np.empty(X.shape[0]) for _ in range(3))
+        if inside.any():
+            y_log[inside], low_log[inside], high_log[inside] = self.lattice.interpolate(X[inside])
+            self._record_stage("lattice_interpolate", start)
+        y_log[~inside], low_log[~inside], high_log[~inside] = self._predict_log_exact(X[~inside])
+        return y_log, low_log, high_log
+
+    def _predict_log_exact(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Prediksi + kuantil 10/90 di skala log1p untuk semua baris X sekaligus."""
+        y_log, (low_log, high_log) = self._predict_log_quantiles(X, INTERVAL_QUANTILES)
+        return y_log, low_log, high_log
+
+    def _predict_log_quantiles(self, X: np.ndarray, quantiles: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prediksi + kuantil antar-tree sembarang di skala log1p dari SATU traversal forest:
+        return (mean (N,), kuantil (len(quantiles), N)).
+        """
+        X = X.astype(np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN, infinity or a value too large for dtype('float32').")
+        process_pool = self._process_pool
+        if process_pool is not None and X.shape[0] >= self.parallel_min_rows:
+            start = time.perf_counter()
+            try:
+                y_log, q_log = process_pool.outputs(X, quantiles)
+            except BrokenExecutor:
+                # worker mati; pool sudah dibuat ulang, batch ini dihitung di proses ini
+                y_log, q_log = self._forest_outputs(X, quantiles)
+            self._record_stage("forest_parallel", start)
+            return y_log, q_log
+        pool = self._pool
+        if pool is not None and X.shape[0] >= self.parallel_min_rows:
+            # potongan baris independen (kuantil per baris tidak bisa digabung antar potongan tree)
+            start = time.perf_counter()
+            bounds = np.linspace(0, X.shape[0], self.threads + 1).astype(np.intp)
+            parts = list(pool.map(lambda b: self._forest_outputs(X[b[0]:b[1]], quantiles),
+                                  zip(bounds[:-1], bounds[1:])))
+            y_log = np.concatenate([p[0] for p in parts])
+            q_log = np.concatenate([p[1] for p in parts], axis=1)
+            self._record_stage("forest_parallel", start)
+            return y_log, q_log
+        start = time.perf_counter()
+        # index leaf semua tree untuk semua baris, shape (N, n_trees)
+        leaves = self.engine.apply(X)
+        # prediksi di skala log1p = rata-rata antar-tree (sama dengan RandomForestRegressor.predict)
+        y_log = self.engine.value[leaves].mean(axis=1)
+        self._record_stage("forest_predict", start)
+        start = time.perf_counter()
+        # interval via sebaran antar-tree (float32 seperti prediksi per-estimator sebelumnya),
+        # semua kuantil dari satu partition
+        q_log = tree_quantiles(self.engine.value32[leaves], quantiles)
+        self._record_stage("tree_interval", start)
+        return y_log, q_log
+
+    def _forest_outputs(self, X: np.ndarray, quantiles: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean + kuantil satu potongan baris tanpa stage hook (worker thread pool / fallback process pool)"""
+        leaves = self.engine.apply(X)
+        return self.engine.value[leaves].mean(axis=1), tree_quantiles(self.engine.value32[leaves], quantiles)
+
+    def predict_with_interval(self, features: Dict[str, Any],
+                              quantiles: Optional[Sequence[float]] = None) -> InferenceOutput:
+        return self.predict_batch_with_interval([features], quantiles=quantiles)[0]
+
+    def predict_batch_with_interval(self, rows: Union[Sequence[Dict[str, Any]], np.ndarray],
+                                    quantiles: Optional[Sequence[float]] = None) -> List[InferenceOutput]:
+        """
+        Versi batch dari predict_with_interval: N bacaan diprediksi dalam satu pass vektor.
+        `rows` berupa list of dict atau array (N, n_fitur) berurutan sesuai features_order.
+
+        `quantiles` (opsional, nilai 0..1, maks. MAX_QUANTILES): kuantil antar-tree tambahan yang
+        diisi ke `pred_quantiles` (skala asli). Dihitung bersama CI90 dalam pass yang sama, selalu
+        exact (tanpa PredictionCache / lattice, yang hanya menyimpan mean + q10/q90).
+        """
+        if quantiles is not None:
+            quantiles = [float(q) for q in quantiles]
+            if len(quantiles) > MAX_QUANTILES:
+                raise ValueError(f"Maksimal {MAX_QUANTILES} kuantil per request (diminta: {len(quantiles)})")
+            if not all(0.0 <= q <= 1.0 for q in quantiles):
+                raise ValueError("Kuantil harus di antara 0 dan 1")
+        start = time.perf_counter()
+        X = self._to_feature_matrix(rows)
+        self._record_stage("feature_array", start)
+        if X.shape[0] == 0:
+            return []
+        if quantiles:
+            return self._predict_outputs(X, X, quantiles)
+        if self.cache is not None:
+            return self._predict_batch_cached(X)
+        return self._predict_outputs(X, X)
+
+    def _predict_outputs(self, X: np.ndarray, X_input: np.ndarray,
+                         quantiles: Optional[Sequence[float]] = None) -> List[InferenceOutput]:
+        """Prediksi baris X; `used_input` diisi dari X_input (nilai asli dari caller)."""
+        extra = None
+        if quantiles:
+            y_log, q_log = self._predict_log_quantiles(X, list(INTERVAL_QUANTILES) + list(quantiles))
+            low_log, high_log = q_log[0], q_log[1]
+            extra = np.expm1(q_log[len(INTERVAL_QUANTILES):])
+            keys = [quantile_key(q) for q in quantiles]
+        else:
+            y_log, low_log, high_log = self._predict_log_batch(X)
         # balik ke skala asli
-        y = float(np.expm1(y_log))
-        low = float(np.expm1(low_log))
-        high = float(np.expm1(high_log))
-        return InferenceOutput(used_input={k: float(features[k]) for k in self.features_order},
-                               pred_total_coliform_mv=y,
-                               pred_ci90_low=low,
-                               pred_ci90_high=high)
+        y = np.expm1(y_log)
+        low = np.expm1(low_log)
+        high = np.expm1(high_log)
+        return [InferenceOutput(used_input=dict(zip(self.features_order, map(float, X_input[i]))),
+                                pred_total_coliform_mv=float(y[i]),
+                                pred_ci90_low=float(low[i]),
+                                pred_ci90_high=float(high[i]),
+                                pred_quantiles=None if extra is None else dict(zip(keys, map(float, extra[:, i]))))
+                for i in range(X.shape[0])]
+
+    def _predict_batch_cached(self, X: np.ndarray) -> List[InferenceOutput]:
+        keys, X_rep = self.cache.quantize(X)
+        cached = self.cache.get_many(keys)
+        miss_rows = [i for i, hit in enumerate(cached) if hit is None]
+        if miss_rows:
+            # key duplikat dalam satu batch cukup dihitung sekali
+            first_row: Dict[Tuple[float, ...], int] = {}
+            for i in miss_rows:
+                first_row.setdefault(keys[i], i)
+            unique_rows = list(first_row.values())
+            computed = self._predict_outputs(X_rep[unique_rows], X_rep[unique_rows])
+            self.cache.put_many([(keys[i], out) for i, out in zip(unique_rows, computed)])
+            by_key = {keys[i]: out for i, out in zip(unique_rows, computed)}
+            for i in miss_rows:
+                cached[i] = by_key[keys[i]]
+        # hasil cache dipakai apa adanya, kecuali used_input = input asli caller
+        return [replace(out, used_input=dict(zip(self.features_order, map(float, X[i]))))
+                for i, out in enumerate(cached)]
 
 def decide_potability(readings: Dict[str, float],
                       predicted_coliform_mpn_100ml: Optional[float],
@@ -367,3 +1070,233 @@ def status_badges(readings: Dict[str, float], thresholds: Thresholds = Threshold
         badges["totalcoliform_mv"] = ("danger", f"🔴 Bahaya {coliform:.2f} MPN/100mL")
 
     return badges
+
+# ===== Rules versi vektor (kolom NumPy) =====
+# Nilai kosong = NaN (setara None di versi skalar). Hanya coliform sensor yang punya arti -1
+# (sensor rusak → diabaikan) di decide_potability; di status_badges -1 = "faulty" untuk semua parameter.
+
+# Bit reasons / recommendations / alternative_use, urutan bit = urutan teks di decide_potability
+REASON_COLIFORM_UNKNOWN = 1 << 0
+REASON_COLIFORM_DANGER = 1 << 1
+REASON_COLIFORM_WARNING = 1 << 2
+REASON_TEMP_LOW = 1 << 3
+REASON_TEMP_WARNING = 1 << 4
+REASON_TEMP_HOT = 1 << 5
+REASON_TEMP_SLIGHTLY_HIGH = 1 << 6
+REASON_PH = 1 << 7
+REASON_CONDUCTIVITY = 1 << 8
+REASON_DO_DANGER = 1 << 9
+REASON_DO_LOW = 1 << 10
+
+REC_COLIFORM_DANGER = 1 << 0
+REC_COLIFORM_WARNING = 1 << 1
+REC_TEMP_LOW = 1 << 2
+REC_TEMP_WARNING = 1 << 3
+REC_TEMP_HOT = 1 << 4
+REC_PH_LOW = 1 << 5
+REC_PH_HIGH = 1 << 6
+REC_CONDUCTIVITY = 1 << 7
+REC_DO_DANGER = 1 << 8
+REC_DO_LOW = 1 << 9
+
+ALT_IRRIGATION_NON_FOOD = 1 << 0
+ALT_CLEANING = 1 << 1
+ALT_AGRICULTURE = 1 << 2
+ALT_FISHERY = 1 << 3
+ALT_UTILITY = 1 << 4
+
+# Teks per bit (c = coliform untuk keputusan, t/ph/cond/do = bacaan, th = Thresholds)
+_REASON_TEXT = [
+    (REASON_COLIFORM_UNKNOWN, lambda c, t, ph, cond, do, th: "Tidak ada nilai coliform (terukur/prediksi). Keputusan potabilitas tidak pasti."),
+    (REASON_COLIFORM_DANGER, lambda c, t, ph, cond, do, th: f"Total Coliform {c:.2f} MPN/100mL - BAHAYA (≥1.0), tidak boleh dikonsumsi"),
+    (REASON_COLIFORM_WARNING, lambda c, t, ph, cond, do, th: f"Total Coliform {c:.2f} MPN/100mL - WASPADA (0.71-0.99), perlu treatment sebelum konsumsi"),
+    (REASON_TEMP_LOW, lambda c, t, ph, cond, do, th: f"Suhu {t:.1f}°C terlalu rendah (< {th.temp_safe_min_c:.0f}°C)"),
+    (REASON_TEMP_WARNING, lambda c, t, ph, cond, do, th: f"Suhu {t:.1f}°C - WASPADA zona pertumbuhan E. coli ({th.temp_warning_min_c:.0f}-{th.temp_warning_max_c:.0f}°C)"),
+    (REASON_TEMP_HOT, lambda c, t, ph, cond, do, th: f"Suhu {t:.1f}°C - Aman dari bakteri (E. coli mati di ≥{th.temp_hot_safe_c:.0f}°C) tapi terlalu panas untuk konsumsi langsung"),
+    (REASON_TEMP_SLIGHTLY_HIGH, lambda c, t, ph, cond, do, th: f"Suhu {t:.1f}°C sedikit tinggi (optimal {th.temp_safe_min_c:.0f}-{th.temp_safe_max_c:.0f}°C)"),
+    (REASON_PH, lambda c, t, ph, cond, do, th: f"pH {ph:.2f} di luar kisaran aman [{th.ph_min}-{th.ph_max}] (Permenkes 2023)"),
+    (REASON_CONDUCTIVITY, lambda c, t, ph, cond, do, th: f"Konduktivitas {cond:.0f} µS/cm > {th.conductivity_max_uscm:.0f} µS/cm (EPA Amerika)"),
+    (REASON_DO_DANGER, lambda c, t, ph, cond, do, th: f"DO {do:.1f} mg/L - BAHAYA (< {th.do_low_mgl:.0f} mg/L), kurang layak untuk dikonsumsi"),
+    (REASON_DO_LOW, lambda c, t, ph, cond, do, th: f"DO {do:.1f} mg/L - Rendah (< {th.do_optimal_mgl:.0f} mg/L), di bawah optimal"),
+]
+
+_REC_TEXT = [
+    (REC_COLIFORM_DANGER, lambda c, t, ph, cond, do, th: [
+        "TIDAK BOLEH DIKONSUMSI - Total Coliform ≥1.0 MPN/100mL",
+        "Desinfeksi wajib: klorinasi, UV, atau ozonisasi",
+        "Boiling (pendidihan 100°C minimum 1 menit) jika darurat",
+        "Telusuri sumber kontaminasi (sanitasi, pipa bocor, intrusi)"
+    ]),
+    (REC_COLIFORM_WARNING, lambda c, t, ph, cond, do, th: [
+        "PERLU TREATMENT - Total Coliform 0.71-0.99 MPN/100mL",
+        "Boiling (pendidihan 100°C) sebelum konsumsi",
+        "Atau gunakan filter bersertifikat NSF untuk bakteri",
+        "Monitor kualitas air secara berkala"
+    ]),
+    (REC_TEMP_LOW, lambda c, t, ph, cond, do, th: [f"Suhu terlalu rendah ({t:.1f}°C): biarkan mencapai suhu ruang sebelum konsumsi"]),
+    (REC_TEMP_WARNING, lambda c, t, ph, cond, do, th: [f"ZONA BAHAYA ({t:.1f}°C): Dinginkan segera ke <35°C atau panaskan ke >45°C untuk membunuh E. coli"]),
+    (REC_TEMP_HOT, lambda c, t, ph, cond, do, th: [f"Air terlalu panas ({t:.1f}°C): Dinginkan ke 10-35°C sebelum konsumsi (bakteri sudah mati)"]),
+    (REC_PH_LOW, lambda c, t, ph, cond, do, th: ["pH terlalu rendah: penambahan alkalinitas (kapur/NaHCO₃) atau blending dengan air pH lebih tinggi"]),
+    (REC_PH_HIGH, lambda c, t, ph, cond, do, th: ["pH terlalu tinggi: injeksi CO₂/asam lemah terkontrol atau blending dengan air pH lebih rendah"]),
+    (REC_CONDUCTIVITY, lambda c, t, ph, cond, do, th: [f"Konduktivitas tinggi ({cond:.0f} µS/cm): Reverse Osmosis atau blending untuk menurunkan TDS"]),
+    (REC_DO_DANGER, lambda c, t, ph, cond, do, th: [f"DO sangat rendah ({do:.1f} mg/L): Aerasi intensif atau oksigenasi untuk meningkatkan ke >6 mg/L"]),
+    (REC_DO_LOW, lambda c, t, ph, cond, do, th: [f"DO rendah ({do:.1f} mg/L): Aerasi ringan untuk meningkatkan ke ≥6 mg/L"]),
+]
+
+_ALT_TEXT = [
+    (ALT_IRRIGATION_NON_FOOD, "Irigasi tanaman non-pangan (bukan untuk sayuran/buah)"),
+    (ALT_CLEANING, "Pembersihan/pencucian umum (bukan untuk mencuci pangan)"),
+    (ALT_AGRICULTURE, "Irigasi pertanian (cek salinitas untuk tanaman sensitif)"),
+    (ALT_FISHERY, "Perikanan (dengan monitoring DO & pH)"),
+    (ALT_UTILITY, "Penggunaan proses/utility (cuci/koagulasi) dengan pretreatment sesuai parameter dominan"),
+]
+
+def _column(values: Optional[Sequence[Optional[float]]], n: int) -> np.ndarray:
+    """Kolom float64 (None → NaN); None untuk seluruh kolom = semua kosong"""
+    if values is None:
+        return np.full(n, np.nan)
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+@dataclass
+class DecisionBatch:
+    """
+    Hasil decide_potability_batch: kolom kode/bitmask, teks hanya di-render per baris
+    lewat `decision(i)` (untuk baris yang benar-benar dikembalikan ke client).
+    """
+    potable: np.ndarray            # bool
+    severity: np.ndarray           # int8, index SEVERITY_LEVELS
+    reasons: np.ndarray            # uint16, bit REASON_*
+    recommendations: np.ndarray    # uint16, bit REC_*
+    alternative_use: np.ndarray    # uint8, bit ALT_*
+    col_for_decision: np.ndarray   # float64, NaN = tidak ada nilai coliform
+    temp_c: np.ndarray
+    do_mgl: np.ndarray
+    ph: np.ndarray
+    conductivity_uscm: np.ndarray
+    thresholds: Thresholds
+
+    def __len__(self) -> int:
+        return len(self.potable)
+
+    def decision(self, i: int) -> DetectionDecision:
+        """Render DetectionDecision baris ke-i (identik dengan decide_potability)"""
+        args = (float(self.col_for_decision[i]), float(self.temp_c[i]), float(self.ph[i]),
+                float(self.conductivity_uscm[i]), float(self.do_mgl[i]), self.thresholds)
+        reason_bits, rec_bits, alt_bits = int(self.reasons[i]), int(self.recommendations[i]), int(self.alternative_use[i])
+        reasons = [text(*args) for bit, text in _REASON_TEXT if reason_bits & bit]
+        recs = [line for bit, text in _REC_TEXT if rec_bits & bit for line in text(*args)]
+        alt = [text for bit, text in _ALT_TEXT if alt_bits & bit]
+        return DetectionDecision(potable=bool(self.potable[i]), severity=SEVERITY_LEVELS[self.severity[i]],
+                                 reasons=reasons, recommendations=recs, alternative_use=alt)
+
+def decide_potability_batch(temp_c: Sequence[Optional[float]],
+                            do_mgl: Sequence[Optional[float]],
+                            ph: Sequence[Optional[float]],
+                            conductivity_uscm: Sequence[Optional[float]],
+                            sensor_coliform: Optional[Sequence[Optional[float]]] = None,
+                            predicted_coliform_mpn_100ml: Optional[Sequence[Optional[float]]] = None,
+                            thresholds: Thresholds = Thresholds()) -> DecisionBatch:
+    """
+    Versi vektor decide_potability untuk N baris (kolom array, NaN/None = kosong).
+    Menghasilkan flag potable, kode severity, dan bitmask reasons/recommendations/alternative_use
+    dengan mask NumPy; hasil `DecisionBatch.decision(i)` identik dengan decide_potability.
+    """
+    temp = _column(temp_c, 0)
+    n = len(temp)
+    do = _column(do_mgl, n)
+    ph = _column(ph, n)
+    cond = _column(conductivity_uscm, n)
+    sensor = _column(sensor_coliform, n)
+    pred = _column(predicted_coliform_mpn_100ml, n)
+    th = thresholds
+
+    # Nilai coliform untuk keputusan: max(sensor, prediksi), sensor rusak (-1) diabaikan
+    sensor = np.where(sensor == -1, np.nan, sensor)
+    col = np.fmax(sensor, pred)
+    col_known = ~np.isnan(col)
+
+    col_danger = col >= th.total_coliform_danger_mpn_100ml
+    col_warning = ~col_danger & (col > th.total_coliform_safe_mpn_100ml)
+    temp_low = temp < th.temp_safe_min_c
+    temp_warning = ~temp_low & (temp >= th.temp_warning_min_c) & (temp <= th.temp_warning_max_c)
+    temp_hot = ~temp_low & ~temp_warning & (temp >= th.temp_hot_safe_c)
+    temp_slightly_high = ~temp_low & ~temp_warning & ~temp_hot & (temp > th.temp_safe_max_c) & (temp < th.temp_warning_min_c)
+    ph_low = ph < th.ph_min
+    ph_high = ph > th.ph_max
+    cond_high = cond > th.conductivity_max_uscm
+    do_danger = do < th.do_low_mgl
+    do_low = ~do_danger & (do < th.do_optimal_mgl)
+
+    reasons = np.zeros(n, dtype=np.uint16)
+    for bit, mask in ((REASON_COLIFORM_UNKNOWN, ~col_known), (REASON_COLIFORM_DANGER, col_danger),
+                      (REASON_COLIFORM_WARNING, col_warning), (REASON_TEMP_LOW, temp_low),
+                      (REASON_TEMP_WARNING, temp_warning), (REASON_TEMP_HOT, temp_hot),
+                      (REASON_TEMP_SLIGHTLY_HIGH, temp_slightly_high), (REASON_PH, ph_low | ph_high),
+                      (REASON_CONDUCTIVITY, cond_high), (REASON_DO_DANGER, do_danger), (REASON_DO_LOW, do_low)):
+        reasons[mask] |= bit
+    potable = reasons == 0
+
+    recommendations = np.zeros(n, dtype=np.uint16)
+    for bit, mask in ((REC_COLIFORM_DANGER, col_danger), (REC_COLIFORM_WARNING, col_warning),
+                      (REC_TEMP_LOW, temp_low), (REC_TEMP_WARNING, temp_warning), (REC_TEMP_HOT, temp_hot),
+                      (REC_PH_LOW, ph_low), (REC_PH_HIGH, ph_high), (REC_CONDUCTIVITY, cond_high),
+                      (REC_DO_DANGER, do_danger), (REC_DO_LOW, do_low)):
+        recommendations[mask & ~potable] |= bit
+
+    # Severity: safe jika potable; danger jika coliform ≥ batas bahaya atau DO < batas rendah; selain itu warning
+    severity = np.where(potable, 0, np.where(col_danger | do_danger, 2, 1)).astype(np.int8)
+
+    ph_mid = np.isnan(ph) | ((ph >= 6.0) & (ph <= 9.0))
+    cond_mid = np.isnan(cond) | (cond < 2000)
+    ph_fish = np.isnan(ph) | ((ph >= 6.5) & (ph <= 8.5))
+    other = ~potable & ~col_danger
+    alternative_use = np.full(n, ALT_UTILITY, dtype=np.uint8)
+    for bit, mask in ((ALT_IRRIGATION_NON_FOOD, ~potable & col_danger), (ALT_CLEANING, ~potable & col_danger),
+                      (ALT_AGRICULTURE, other & ph_mid & cond_mid), (ALT_FISHERY, other & (do >= 5.0) & ph_fish)):
+        alternative_use[mask] |= bit
+
+    return DecisionBatch(potable=potable, severity=severity, reasons=reasons, recommendations=recommendations,
+                         alternative_use=alternative_use, col_for_decision=col, temp_c=temp, do_mgl=do, ph=ph,
+                         conductivity_uscm=cond, thresholds=th)
+
+def status_badges_batch(temp_c: Sequence[Optional[float]],
+                        do_mgl: Sequence[Optional[float]],
+                        ph: Sequence[Optional[float]],
+                        conductivity_uscm: Sequence[Optional[float]],
+                        totalcoliform_mv: Optional[Sequence[Optional[float]]] = None,
+                        thresholds: Thresholds = Thresholds()) -> Dict[str, np.ndarray]:
+    """
+    Versi vektor status_badges: {parameter: kode level int8 (index BADGE_LEVELS)} untuk N baris.
+    Level identik dengan status_badges; label teks cukup dibuat dengan status_badges untuk
+    baris yang dikembalikan ke client.
+    """
+    th = thresholds
+    temp = _column(temp_c, 0)
+    n = len(temp)
+    columns = {
+        "temp_c": temp,
+        "ph": _column(ph, n),
+        "do_mgl": _column(do_mgl, n),
+        "conductivity_uscm": _column(conductivity_uscm, n),
+        "totalcoliform_mv": _column(totalcoliform_mv, n),
+    }
+    unknown, optimal, warning, danger, faulty = (BADGE_LEVELS.index(level) for level in
+                                                 ("unknown", "optimal", "warning", "danger", "faulty"))
+    rules = {
+        # (kondisi, level) dievaluasi berurutan seperti rantai if/elif di status_badges
+        "temp_c": lambda v: ([(v >= th.temp_safe_min_c) & (v <= th.temp_safe_max_c)], [optimal], warning),
+        "ph": lambda v: ([(v >= th.ph_min) & (v <= th.ph_max)], [optimal], warning),
+        "do_mgl": lambda v: ([v >= th.do_optimal_mgl, v >= th.do_low_mgl], [optimal, warning], danger),
+        "conductivity_uscm": lambda v: ([v <= th.conductivity_max_uscm], [optimal], warning),
+        "totalcoliform_mv": lambda v: ([v <= th.total_coliform_safe_mpn_100ml, v < th.total_coliform_danger_mpn_100ml],
+                                       [optimal, warning], danger),
+    }
+    levels = {}
+    for param in BADGE_PARAMS:
+        v = columns[param]
+        conditions, choices, default = rules[param](v)
+        levels[param] = np.select([v == -1, np.isnan(v)] + conditions, [faulty, unknown] + choices,
+                                  default).astype(np.int8)
+    return levels
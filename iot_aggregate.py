@@ -0,0 +1,78 @@
+"""
+Downsampling history IoT untuk chart (`/iot/history/aggregate`).
+
+- `bucket_aggregate`: bucket waktu lebar tetap, min/max/mean/count per parameter dan severity
+  terburuk per bucket. Sepenuhnya vektor (sort + ufunc.reduceat), tanpa loop per baris.
+- `lttb`: Largest-Triangle-Three-Buckets, memilih titik asli yang mempertahankan bentuk kurva
+  untuk line chart. Loop hanya per bucket output; luas segitiga dihitung vektor per bucket.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+def bucket_aggregate(ts: np.ndarray, columns: Dict[str, np.ndarray], start_ts: float, bucket_seconds: float,
+                     severity: Optional[np.ndarray] = None, n_buckets: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Agregasi per bucket [start_ts + k*bucket_seconds, start_ts + (k+1)*bucket_seconds).
+    NaN = nilai kosong (tidak dihitung). Hanya bucket yang berisi baris yang dikembalikan.
+    `n_buckets`: baris di ujung rentang (k >= n_buckets) masuk ke bucket terakhir.
+
+    Return dict array sepanjang jumlah bucket:
+    - "bucket": indeks bucket k, "count": jumlah baris
+    - "<param>_min" / "_max" / "_mean" (NaN jika tidak ada nilai) / "_count"
+    - "severity_worst": kode severity terbesar (-1 = tidak ada baris ter-enrich), jika `severity` diberikan
+    """
+    idx = np.floor((np.asarray(ts, dtype=np.float64) - start_ts) / bucket_seconds).astype(np.int64)
+    if n_buckets is not None:
+        idx = np.minimum(idx, n_buckets - 1)
+    order = np.argsort(idx, kind="stable")
+    idx = idx[order]
+    if len(idx) == 0:
+        return {"bucket": idx, "count": np.zeros(0, dtype=np.int64)}
+    starts = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+    result: Dict[str, np.ndarray] = {
+        "bucket": idx[starts],
+        "count": np.diff(np.r_[starts, len(idx)]),
+    }
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)[order]
+        valid = ~np.isnan(values)
+        n_valid = np.add.reduceat(valid.astype(np.int64), starts)
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / n_valid
+        result[f"{name}_min"] = np.where(n_valid > 0, np.minimum.reduceat(np.where(valid, values, np.inf), starts), np.nan)
+        result[f"{name}_max"] = np.where(n_valid > 0, np.maximum.reduceat(np.where(valid, values, -np.inf), starts), np.nan)
+        result[f"{name}_mean"] = np.where(n_valid > 0, mean, np.nan)
+        result[f"{name}_count"] = n_valid
+    if severity is not None:
+        result["severity_worst"] = np.maximum.reduceat(np.asarray(severity, dtype=np.int64)[order], starts)
+    return result
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indeks titik terpilih Largest-Triangle-Three-Buckets (x naik, tanpa NaN).
+    Titik pertama & terakhir selalu ikut; sisanya satu titik per bucket.
+    """
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    # n_out-2 bucket di antara titik pertama dan terakhir
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # rata-rata bucket berikutnya (bucket terakhir: titik terakhir)
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
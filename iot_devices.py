@@ -0,0 +1,105 @@
+"""
+Registry storage IoT per device (sharding multi-station).
+
+Setiap device (ESP32/Mappi32 node) punya storage sendiri (ColumnarStore di sub-direktori atau
+RingStore), dengan lock, seq, dan retensi masing-masing: device yang mengirim data sangat sering
+hanya menggeser history-nya sendiri, tidak pernah mengusir history device lain.
+
+Device default (data tanpa `device_id`) memakai storage utama yang sudah ada, sehingga endpoint
+`/iot/*` lama tetap bekerja seperti single-station.
+"""
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from iot_storage import ColumnarStore, RingStore
+
+Store = Union[ColumnarStore, RingStore]
+
+# Dipakai juga sebagai nama sub-direktori storage → hanya karakter aman untuk path
+DEVICE_ID_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$"
+_DEVICE_ID_RE = re.compile(DEVICE_ID_PATTERN)
+
+def valid_device_id(device_id: str) -> bool:
+    return bool(_DEVICE_ID_RE.match(device_id))
+
+class DeviceLimitError(Exception):
+    """Jumlah device sudah mencapai `max_devices`"""
+
+class DeviceRegistry:
+    """
+    Map device_id → storage.
+
+    - `factory(device_id)`: membuat storage untuk device baru
+    - `default_id`, `default_store`: device untuk data tanpa device_id (storage utama)
+    - `max_devices`: batas jumlah device (termasuk default); device baru di atas batas ditolak
+
+    Lookup device yang sudah ada tidak mengambil lock (dict dibaca apa adanya); lock hanya
+    dipakai saat mendaftarkan device baru.
+    """
+
+    def __init__(self, factory: Callable[[str], Store], default_id: str, default_store: Store,
+                 max_devices: int = 1000):
+        self.factory = factory
+        self.default_id = default_id
+        self.max_devices = int(max_devices)
+        self._stores: Dict[str, Store] = {default_id: default_store}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def get(self, device_id: Optional[str]) -> Optional[Store]:
+        """Storage device (None jika belum pernah mengirim data)"""
+        return self._stores.get(device_id or self.default_id)
+
+    def get_or_create(self, device_id: Optional[str]) -> Store:
+        """Storage device; dibuat saat data pertama device masuk. Raise DeviceLimitError jika penuh."""
+        device_id = device_id or self.default_id
+        store = self._stores.get(device_id)
+        if store is not None:
+            return store
+        with self._lock:
+            store = self._stores.get(device_id)
+            if store is None:
+                if len(self._stores) >= self.max_devices:
+                    self.rejected += 1
+                    raise DeviceLimitError(f"Jumlah device sudah mencapai batas ({self.max_devices})")
+                store = self.factory(device_id)
+                self._stores = {**self._stores, device_id: store}
+        return store
+
+    def discover(self, directory: str) -> int:
+        """Buka kembali storage device yang sudah ada di `directory` (satu sub-direktori per device)"""
+        if not os.path.isdir(directory):
+            return 0
+        opened = 0
+        for name in sorted(os.listdir(directory)):
+            if valid_device_id(name) and os.path.isdir(os.path.join(directory, name)) and name not in self._stores:
+                try:
+                    self.get_or_create(name)
+                except DeviceLimitError:
+                    break
+                opened += 1
+        return opened
+
+    def items(self) -> List[Tuple[str, Store]]:
+        """Snapshot (device_id, storage), urut device_id"""
+        return sorted(self._stores.items())
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._stores
+
+    def flush(self) -> None:
+        for _, store in self.items():
+            store.flush()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "devices": len(self._stores),
+            "max_devices": self.max_devices,
+            "default_device": self.default_id,
+            "rejected": self.rejected,
+        }
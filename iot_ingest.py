@@ -0,0 +1,251 @@
+"""
+Pipeline ingest IoT asynchronous: enrichment (prediksi AI + rules) di background worker.
+
+`/iot/data` cukup menyimpan record mentah ke storage lalu memasukkan (seq, readings) ke
+antrian berukuran tetap. Worker mengambil antrian dalam micro-batch (hingga `batch_size`
+record atau menunggu paling lama `max_wait_seconds`), menjalankan satu pass inferensi batch,
+lalu menulis kolom hasil enrichment kembali ke storage dengan `ColumnarStore.update`.
+Setiap item membawa storage tujuannya, jadi satu antrian melayani storage semua device.
+Jika pass batch gagal, enrichment diulang per device sehingga error satu device tidak
+menggagalkan record device lain di micro-batch yang sama.
+
+Jika antrian penuh, record tetap tersimpan (mentah) dan dihitung sebagai `dropped`;
+record tersebut tampil tanpa prediksi (null) di history.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from iot_storage import ColumnarStore, RingStore
+
+logger = logging.getLogger("water_quality_api.ingest")
+
+EnrichFn = Callable[[Dict[str, np.ndarray]], Dict[str, np.ndarray]]
+Store = Union[ColumnarStore, RingStore]
+# (seq, nilai readings, waktu masuk antrian, storage tujuan)
+QueueItem = Tuple[int, Tuple[float, ...], float, Store]
+
+class EnrichmentQueue:
+    """
+    Antrian enrichment berukuran tetap + N worker thread.
+
+    - `enrich_fn(columns) -> kolom enrichment`: kolom input berisi array float64 per field
+      readings (satu elemen per record). Kolom output ditulis ke storage sesuai urutan dict.
+    - `max_queue`: kapasitas antrian (record); record di atas kapasitas di-drop (tidak diblok)
+    - `batch_size`, `max_wait_seconds`: batas ukuran & waktu tunggu satu micro-batch
+    - `on_enriched(seqs, store)`: opsional, dipanggil setelah kolom enrichment tersimpan (mis. push ke stream)
+    - `store`: storage default untuk `submit` / `submit_many` tanpa argumen `store`
+    - `required_fields`: field yang wajib finite agar record di-enrich (default: semua `fields`);
+      record dengan nilai NaN/inf di field ini dihitung `failed` satu per satu tanpa menggagalkan
+      record lain di batch yang sama
+    """
+
+    def __init__(self, store: Store, enrich_fn: EnrichFn, fields: List[str],
+                 max_queue: int = 10000, workers: int = 1, batch_size: int = 256,
+                 max_wait_seconds: float = 0.02,
+                 on_enriched: Optional[Callable[[np.ndarray, Store], None]] = None,
+                 required_fields: Optional[List[str]] = None):
+        if workers <= 0:
+            raise ValueError("workers harus > 0")
+        self.store = store
+        self.enrich_fn = enrich_fn
+        self.fields = list(fields)
+        required = self.fields if required_fields is None else list(required_fields)
+        self._required_idx = [self.fields.index(k) for k in required]
+        self.max_queue = int(max_queue)
+        self.workers = int(workers)
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait_seconds = float(max_wait_seconds)
+        self.on_enriched = on_enriched
+        self._queue: "queue.Queue[Optional[QueueItem]]" = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._threads: List[threading.Thread] = []
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"iot-enrich-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Proses sisa antrian lalu hentikan worker."""
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    # ---------- producer ----------
+
+    def submit(self, seq: int, readings: Dict[str, Optional[float]], store: Optional[Store] = None) -> bool:
+        """Masukkan satu record ke antrian. Return False (dan hitung drop) jika antrian penuh."""
+        values = tuple(np.nan if readings.get(k) is None else float(readings[k]) for k in self.fields)
+        store = self.store if store is None else store
+        with self._lock:
+            try:
+                self._queue.put_nowait((seq, values, time.monotonic(), store))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.enqueued += 1
+            self._in_flight += 1
+        return True
+
+    def submit_many(self, seqs: np.ndarray, columns: Dict[str, np.ndarray], store: Optional[Store] = None) -> np.ndarray:
+        """Masukkan N record (kolom array). Return mask bool record yang masuk antrian."""
+        n = len(seqs)
+        store = self.store if store is None else store
+        values = np.column_stack([np.asarray(columns[k], dtype=np.float64) for k in self.fields]) if n else np.empty((0, len(self.fields)))
+        accepted = np.zeros(n, dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i in range(n):
+                try:
+                    self._queue.put_nowait((int(seqs[i]), tuple(values[i].tolist()), now, store))
+                except queue.Full:
+                    break
+                accepted[i] = True
+            queued = int(accepted.sum())
+            self.enqueued += queued
+            self._in_flight += queued
+            self.dropped += n - queued
+        return accepted
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Tunggu sampai semua record di antrian selesai diproses (berguna untuk benchmark)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    # ---------- worker ----------
+
+    def _next_batch(self) -> Tuple[List[QueueItem], bool]:
+        """Ambil satu micro-batch. Return (items, stop)."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        items = [first]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            items, stop = self._next_batch()
+            if items:
+                self._process(items)
+
+    def _columns(self, values: np.ndarray, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        return {k: values[rows, j] for j, k in enumerate(self.fields)}
+
+    def _process(self, items: List[QueueItem]) -> None:
+        seqs = np.fromiter((item[0] for item in items), dtype=np.int64, count=len(items))
+        values = np.array([item[1] for item in items], dtype=np.float64).reshape(len(items), len(self.fields))
+        # baris dengan input non-finite tidak ikut inferensi (gagal sendiri, bukan satu batch)
+        valid = np.isfinite(values[:, self._required_idx]).all(axis=1)
+        n_failed = len(items) - int(valid.sum())
+        if n_failed:
+            logger.error(f"✗ IoT enrichment dilewati untuk {n_failed} record dengan nilai non-finite "
+                         f"(seq {seqs[~valid].tolist()[:10]})")
+        # kelompokkan per storage device; urutan baris = urutan grup (hasil batch bisa dipotong per grup)
+        groups: Dict[int, Tuple[Store, List[int]]] = {}
+        for i in np.flatnonzero(valid):
+            groups.setdefault(id(items[i][3]), (items[i][3], []))[1].append(int(i))
+        parts = [(store, np.asarray(rows, dtype=np.intp)) for store, rows in groups.values()]
+        enriched = None
+        if parts:
+            try:
+                # satu pass inferensi untuk seluruh baris valid semua device
+                index = np.concatenate([rows for _, rows in parts])
+                enriched = self.enrich_fn(self._columns(values, index))
+            except Exception as e:
+                logger.error(f"✗ IoT enrichment batch gagal ({sum(len(r) for _, r in parts)} record, "
+                             f"{len(parts)} device): {str(e)}")
+                if len(parts) == 1:
+                    n_failed += len(parts[0][1])
+                    parts = []
+        written = []
+        offset = 0
+        for store, rows in parts:
+            try:
+                if enriched is None:
+                    # pass batch gagal: ulang per device agar error satu device tidak menular ke device lain
+                    columns = self.enrich_fn(self._columns(values, rows))
+                else:
+                    columns = {k: v[offset:offset + len(rows)] for k, v in enriched.items()}
+                store.update(seqs[rows], columns)
+                written.append((store, seqs[rows]))
+            except Exception as e:
+                n_failed += len(rows)
+                logger.error(f"✗ IoT enrichment gagal untuk {len(rows)} record satu device: {str(e)}")
+            offset += len(rows)
+        if self.on_enriched is not None:
+            for store, store_seqs in written:
+                try:
+                    self.on_enriched(store_seqs, store)
+                except Exception as e:
+                    logger.error(f"✗ IoT on_enriched callback gagal: {str(e)}")
+        lag = time.monotonic() - min(item[2] for item in items)
+        with self._idle:
+            self.batches += 1
+            self.last_batch_size = len(items)
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+            self.processed += len(items) - n_failed
+            self.failed += n_failed
+            self._in_flight -= len(items)
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    # ---------- monitoring ----------
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            with self._queue.mutex:
+                oldest = self._queue.queue[0] if self._queue.queue else None
+            pending_age = time.monotonic() - oldest[2] if oldest else 0.0
+            return {
+                "mode": "async",
+                "workers": len(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "batch_size": self.batch_size,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_batch_size": self.last_batch_size,
+                "lag_seconds": pending_age,
+                "last_lag_seconds": self.last_lag_seconds,
+                "max_lag_seconds": self.max_lag_seconds,
+            }
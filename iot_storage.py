@@ -0,0 +1,755 @@
+"""
+Penyimpanan data IoT persisten berbasis segment kolumnar.
+
+Setiap segment adalah satu file dengan lebar tetap:
+- header 4096 byte (magic, versi, base_seq, kapasitas, jumlah baris terisi, spesifikasi kolom JSON)
+- satu blok per kolom (float64 little-endian), masing-masing `capacity` baris, ter-align 64 byte
+
+File segment dibuat sekali dengan ukuran penuh lalu dibuka dengan np.memmap: append menulis
+langsung ke page cache, baca cukup slicing array tanpa membuat dict per record. Saat segment
+penuh, segment baru dibuat (rollover) dan retensi (ukuran total / umur data) diterapkan
+dengan menghapus segment tertua.
+
+Setiap baris punya nomor urut (seq) global yang naik terus (juga setelah clear), yaitu
+base_seq segment + posisi baris di segment.
+
+Penghapusan segment (retensi/clear) mengandalkan semantik unlink POSIX: pembaca yang masih
+memegang view ke segment lama tetap aman sampai view dilepas.
+
+Konkurensi: satu penulis (semua penulisan di bawah lock storage), pembaca tanpa lock.
+- append: data ditulis dulu, baru count/next_seq dinaikkan → pembaca tidak melihat baris setengah jadi
+- daftar segment diganti (copy-on-write), tidak diubah di tempat → snapshot pembaca selalu utuh
+- update (menulis ulang baris yang sudah terlihat): dibungkus SeqLock; pembaca yang beririsan
+  dengan update mengulang baca, jadi tidak pernah melihat baris yang baru setengah di-enrich
+
+`RingStore` adalah backend alternatif in-memory (ring buffer structured array, float32) dengan
+antarmuka yang sama, untuk menyimpan data high-rate berhari-hari di RAM tanpa I/O disk.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+# Kolom record IoT. Nilai kosong: NaN untuk kolom float, -1 untuk kolom kode (int8)
+IOT_COLUMNS: List[Tuple[str, str]] = [
+    ("timestamp", "<f8"),              # epoch detik (UTC)
+    ("temp_c", "<f8"),
+    ("do_mgl", "<f8"),
+    ("ph", "<f8"),
+    ("conductivity_uscm", "<f8"),
+    ("totalcoliform_mv_raw", "<f8"),   # mV mentah dari sensor
+    ("totalcoliform_mv", "<f8"),       # MPN/100mL hasil konversi (-1 = sensor rusak)
+    # --- hasil enrichment saat ingest (prediksi AI + rules) ---
+    ("pred_total_coliform_mv", "<f8"),
+    ("pred_ci90_low", "<f8"),
+    ("pred_ci90_high", "<f8"),
+    ("severity", "<i1"),               # index inference_rf.SEVERITY_LEVELS
+    ("potable", "<i1"),                # 1 / 0
+    ("badge_temp_c", "<i1"),           # index inference_rf.BADGE_LEVELS
+    ("badge_ph", "<i1"),
+    ("badge_do_mgl", "<i1"),
+    ("badge_conductivity_uscm", "<i1"),
+    ("badge_totalcoliform_mv", "<i1"),
+]
+
+def column_fill(dtype: str):
+    """Nilai 'kosong' untuk satu kolom: NaN (float) atau -1 (integer)"""
+    return np.nan if np.dtype(dtype).kind == "f" else -1
+
+SEGMENT_MAGIC = b"IOTSEG\0\0"
+SEGMENT_VERSION = 1
+SEGMENT_HEADER_BYTES = 4096
+SEGMENT_ALIGN = 64
+SEGMENT_SUFFIX = ".seg"
+# posisi field numerik di header (uint64 little-endian)
+_HDR_VERSION = 8      # uint32
+_HDR_BASE_SEQ = 16
+_HDR_CAPACITY = 24
+_HDR_COUNT = 32
+_HDR_SPEC_LEN = 40
+_HDR_SPEC = 64
+
+def _align(n: int) -> int:
+    return -(-n // SEGMENT_ALIGN) * SEGMENT_ALIGN
+
+T = TypeVar("T")
+
+class SeqLock:
+    """
+    Generation counter untuk pembaca optimistik (pola seqlock) di atas lock penulis.
+
+    Penulis yang mengubah baris yang sudah terlihat pembaca membungkus perubahan dengan
+    `write()` sambil memegang lock (counter ganjil selama menulis). Pembaca menjalankan
+    `read(fn)` tanpa lock dan mengulang jika ada penulisan yang beririsan; setelah `retries`
+    kali, baca di bawah lock sehingga tetap progres walau penulisan terus-menerus.
+    """
+
+    def __init__(self, lock: threading.Lock, retries: int = 8):
+        self._lock = lock
+        self._gen = 0
+        self.retries = retries
+        self.retried = 0      # statistik (perkiraan, tanpa lock)
+        self.fallbacks = 0
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Dipanggil saat lock penulis sudah dipegang"""
+        self._gen += 1
+        try:
+            yield
+        finally:
+            self._gen += 1
+
+    def read(self, fn: Callable[[], T]) -> T:
+        for _ in range(self.retries):
+            gen = self._gen
+            if not gen & 1:
+                result = fn()
+                if self._gen == gen:
+                    return result
+            self.retried += 1
+            time.sleep(0)
+        self.fallbacks += 1
+        with self._lock:
+            return fn()
+
+class ColumnSegment:
+    """Satu file segment kolumnar yang di-memory-map."""
+
+    def __init__(self, path: str, mm: np.memmap, columns: List[Tuple[str, str]], base_seq: int, capacity: int):
+        self.path = path
+        self.columns = columns
+        self.base_seq = base_seq
+        self.capacity = capacity
+        self._mm = mm
+        self._count = mm[_HDR_COUNT:_HDR_COUNT + 8].view("<u8")
+        self._cols: Dict[str, np.ndarray] = {}
+        offset = SEGMENT_HEADER_BYTES
+        for name, dtype in columns:
+            itemsize = np.dtype(dtype).itemsize
+            self._cols[name] = mm[offset:offset + capacity * itemsize].view(dtype)
+            offset = _align(offset + capacity * itemsize)
+
+    @staticmethod
+    def file_size(columns: List[Tuple[str, str]], capacity: int) -> int:
+        size = SEGMENT_HEADER_BYTES
+        for _, dtype in columns:
+            size = _align(size + capacity * np.dtype(dtype).itemsize)
+        return size
+
+    @classmethod
+    def create(cls, path: str, columns: List[Tuple[str, str]], base_seq: int, capacity: int) -> "ColumnSegment":
+        spec = json.dumps({"columns": columns}).encode("utf-8")
+        if _HDR_SPEC + len(spec) > SEGMENT_HEADER_BYTES:
+            raise ValueError("Spesifikasi kolom terlalu panjang untuk header segment")
+        size = cls.file_size(columns, capacity)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)   # file sparse: blok kolom baru benar-benar dialokasikan saat ditulis
+            f.write(SEGMENT_MAGIC)
+            f.seek(_HDR_VERSION)
+            f.write(np.array([SEGMENT_VERSION], dtype="<u4").tobytes())
+            f.seek(_HDR_BASE_SEQ)
+            f.write(np.array([base_seq, capacity, 0, len(spec)], dtype="<u8").tobytes())
+            f.seek(_HDR_SPEC)
+            f.write(spec)
+        os.replace(tmp_path, path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "ColumnSegment":
+        mm = np.memmap(path, dtype=np.uint8, mode="r+")
+        if bytes(mm[:len(SEGMENT_MAGIC)]) != SEGMENT_MAGIC:
+            raise ValueError(f"Bukan file segment IoT: {path}")
+        version = int(mm[_HDR_VERSION:_HDR_VERSION + 4].view("<u4")[0])
+        if version != SEGMENT_VERSION:
+            raise ValueError(f"Versi segment tidak didukung: {version} ({path})")
+        base_seq, capacity, _, spec_len = (int(v) for v in mm[_HDR_BASE_SEQ:_HDR_SPEC_LEN + 8].view("<u8"))
+        spec = json.loads(bytes(mm[_HDR_SPEC:_HDR_SPEC + spec_len]).decode("utf-8"))
+        columns = [tuple(c) for c in spec["columns"]]
+        return cls(path, mm, columns, base_seq, capacity)
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    @property
+    def end_seq(self) -> int:
+        return self.base_seq + self.count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None,
+               dtype: Optional[str] = None) -> np.ndarray:
+        """
+        View (tanpa copy) ke baris [start, stop) dari satu kolom. Kolom yang tidak ada di
+        segment lama (skema sebelumnya) dikembalikan sebagai array terisi nilai kosong.
+        """
+        stop = self.count if stop is None else stop
+        if name not in self._cols:
+            return np.full(max(0, stop - start), column_fill(dtype or "<f8"), dtype=dtype or "<f8")
+        return self._cols[name][start:stop]
+
+    def write(self, columns: Dict[str, np.ndarray], src_start: int, n: int) -> None:
+        """
+        Tulis n baris dari `columns[...][src_start:]` ke akhir segment, lalu naikkan count.
+        Kolom yang tidak diberikan diisi nilai kosong.
+        """
+        row = self.count
+        for name, dtype in self.columns:
+            values = columns.get(name)
+            if values is None:
+                self._cols[name][row:row + n] = column_fill(dtype)
+            else:
+                self._cols[name][row:row + n] = values[src_start:src_start + n]
+        # count ditulis terakhir: pembaca tidak pernah melihat baris yang belum lengkap
+        self._count[0] = row + n
+
+    def flush(self) -> None:
+        self._mm.flush()
+
+class ColumnarStore:
+    """
+    Storage append-only untuk record IoT di atas deretan ColumnSegment.
+
+    - `segment_rows`: kapasitas baris per segment (rollover saat penuh)
+    - `max_bytes`: retensi berdasarkan total ukuran file segment (None = tanpa batas)
+    - `max_age_seconds`: retensi berdasarkan umur timestamp terakhir di segment (None = tanpa batas)
+
+    Satu proses penulis per direktori (semua penulisan melalui satu lock). Segment dengan
+    skema kolom lama tetap bisa dibaca (kolom baru = nilai kosong); penulisan selalu ke
+    segment dengan skema terbaru.
+    """
+
+    def __init__(self, directory: str, segment_rows: int = 65536, max_bytes: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None, columns: List[Tuple[str, str]] = IOT_COLUMNS):
+        if segment_rows <= 0:
+            raise ValueError("segment_rows harus > 0")
+        self.directory = directory
+        self.segment_rows = int(segment_rows)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.columns = [tuple(c) for c in columns]
+        self.column_names = [name for name, _ in self.columns]
+        self._dtypes = dict(self.columns)
+        self._lock = threading.Lock()
+        self._seqlock = SeqLock(self._lock)
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments: List[ColumnSegment] = []
+        for fname in sorted(os.listdir(directory)):
+            if fname.endswith(SEGMENT_SUFFIX):
+                segment = ColumnSegment.open(os.path.join(directory, fname))
+                for name, dtype in segment.columns:
+                    if self._dtypes.get(name, dtype) != dtype:
+                        raise ValueError(f"Tipe kolom '{name}' di segment {fname} berbeda dengan skema storage")
+                self._segments.append(segment)
+        self._segments.sort(key=lambda seg: seg.base_seq)
+        # seq berikutnya disimpan di nama file segment aktif, jadi tetap naik setelah restart
+        self._next_seq = self._segments[-1].end_seq if self._segments else 0
+        # naik setiap ada perubahan isi (append, update, clear, retensi); dipakai untuk ETag
+        self._version = 0
+        with self._lock:
+            self._enforce_retention()
+
+    # ---------- penulisan ----------
+
+    def _segment_path(self, base_seq: int) -> str:
+        return os.path.join(self.directory, f"seg_{base_seq:016d}{SEGMENT_SUFFIX}")
+
+    def _writable_segment(self) -> ColumnSegment:
+        last = self._segments[-1] if self._segments else None
+        if last is None or last.count >= last.capacity or last.columns != self.columns:
+            self._segments = self._segments + [ColumnSegment.create(self._segment_path(self._next_seq), self.columns,
+                                                                    self._next_seq, self.segment_rows)]
+            self._enforce_retention()
+        return self._segments[-1]
+
+    def append(self, record: Dict[str, Optional[float]]) -> int:
+        """Tambah satu record (None / kolom tidak ada → nilai kosong). Return seq record tersebut."""
+        columns = {name: np.array([record[name]], dtype=dtype)
+                   for name, dtype in self.columns if record.get(name) is not None}
+        columns.setdefault("timestamp", np.array([np.nan]))
+        return self.append_many(columns)[0]
+
+    def append_many(self, columns: Dict[str, np.ndarray]) -> Tuple[int, int]:
+        """
+        Tambah N baris sekaligus dari array per kolom (kolom "timestamp" wajib; kolom lain
+        yang tidak diberikan diisi nilai kosong). Return (seq pertama, N).
+        """
+        n = len(columns["timestamp"])
+        with self._lock:
+            first_seq = self._next_seq
+            written = 0
+            while written < n:
+                segment = self._writable_segment()
+                chunk = min(n - written, segment.capacity - segment.count)
+                segment.write(columns, written, chunk)
+                written += chunk
+                self._next_seq += chunk
+            self._version += 1
+        return first_seq, n
+
+    def update(self, seqs: np.ndarray, columns: Dict[str, np.ndarray]) -> int:
+        """
+        Tulis ulang kolom tertentu untuk baris yang sudah ada (mis. hasil enrichment async).
+        Kolom ditulis sesuai urutan dict, jadi kolom "penanda selesai" diletakkan terakhir.
+        Baris yang sudah terhapus (retensi/clear) dilewati. Return jumlah baris yang ditulis.
+        """
+        seqs = np.asarray(seqs, dtype=np.int64)
+        updated = 0
+        with self._lock, self._seqlock.write():
+            for segment in self._segments:
+                mask = (seqs >= segment.base_seq) & (seqs < segment.end_seq)
+                if not mask.any():
+                    continue
+                rows = seqs[mask] - segment.base_seq
+                for name, values in columns.items():
+                    if name in segment._cols:
+                        segment._cols[name][rows] = np.asarray(values)[mask]
+                updated += int(mask.sum())
+            if updated:
+                self._version += 1
+        return updated
+
+    def clear(self) -> int:
+        """Hapus semua segment. Seq tetap berlanjut (tidak di-reset). Return jumlah baris terhapus."""
+        with self._lock:
+            deleted = sum(seg.count for seg in self._segments)
+            for segment in self._segments:
+                os.remove(segment.path)
+            # segment kosong baru menyimpan seq berikutnya agar tetap naik setelah restart
+            self._segments = [ColumnSegment.create(self._segment_path(self._next_seq), self.columns,
+                                                   self._next_seq, self.segment_rows)]
+            self._version += 1
+            return deleted
+
+    def _enforce_retention(self) -> None:
+        """Hapus segment tertua (selain segment aktif) yang melanggar batas ukuran / umur."""
+        now = time.time()
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            too_big = self.max_bytes is not None and sum(seg.nbytes for seg in self._segments) > self.max_bytes
+            last_ts = oldest.column("timestamp")[-1] if oldest.count else -np.inf
+            too_old = self.max_age_seconds is not None and last_ts < now - self.max_age_seconds
+            if not (too_big or too_old):
+                break
+            os.remove(oldest.path)
+            self._segments = self._segments[1:]
+            self._version += 1
+
+    def enforce_retention(self) -> None:
+        with self._lock:
+            self._enforce_retention()
+
+    def flush(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.flush()
+
+    # ---------- pembacaan ----------
+
+    def _snapshot(self) -> List[Tuple[ColumnSegment, int]]:
+        """(segment, jumlah baris) tanpa lock: list segment tidak pernah diubah di tempat"""
+        return [(seg, seg.count) for seg in self._segments]
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self._snapshot())
+
+    @property
+    def first_seq(self) -> int:
+        snap = self._snapshot()
+        return snap[0][0].base_seq if snap else self._next_seq
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    @property
+    def version(self) -> int:
+        """Counter perubahan isi storage (per proses, mulai dari 0 saat dibuka)"""
+        return self._version
+
+    def read(self, start_seq: int, stop_seq: int) -> Dict[str, np.ndarray]:
+        """
+        Copy kolom untuk baris dengan seq di [start_seq, stop_seq), plus kolom "seq".
+        Hanya segment yang beririsan dengan rentang tersebut yang disentuh.
+        """
+        return self._seqlock.read(lambda: self._read(start_seq, stop_seq))
+
+    def _read(self, start_seq: int, stop_seq: int) -> Dict[str, np.ndarray]:
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in self.column_names + ["seq"]}
+        for segment, count in self._snapshot():
+            lo = max(start_seq, segment.base_seq)
+            hi = min(stop_seq, segment.base_seq + count)
+            if lo >= hi:
+                continue
+            a, b = lo - segment.base_seq, hi - segment.base_seq
+            for name, dtype in self.columns:
+                parts[name].append(np.array(segment.column(name, a, b, dtype)))
+            parts["seq"].append(np.arange(lo, hi, dtype=np.int64))
+        dtypes = dict(self._dtypes, seq="<i8")
+        return {name: (np.concatenate(chunks) if chunks else np.empty(0, dtype=dtypes[name]))
+                for name, chunks in parts.items()}
+
+    def read_time_range(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                        names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Copy kolom `names` (default semua) untuk baris dengan timestamp di [start_ts, end_ts],
+        plus kolom "seq". Filter dievaluasi vektor per segment (urutan = urutan seq).
+        """
+        names = self.column_names if names is None else list(names)
+        return self._seqlock.read(lambda: self._read_time_range(start_ts, end_ts, names))
+
+    def _read_time_range(self, start_ts: Optional[float], end_ts: Optional[float],
+                         names: List[str]) -> Dict[str, np.ndarray]:
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names + ["seq"]}
+        for segment, count in self._snapshot():
+            if not count:
+                continue
+            ts = segment.column("timestamp", 0, count)
+            mask = np.ones(count, dtype=bool)
+            if start_ts is not None:
+                mask &= ts >= start_ts
+            if end_ts is not None:
+                mask &= ts <= end_ts
+            if not mask.any():
+                continue
+            for name in names:
+                parts[name].append(segment.column(name, 0, count, self._dtypes[name])[mask])
+            parts["seq"].append(segment.base_seq + np.flatnonzero(mask))
+        dtypes = dict(self._dtypes, seq="<i8")
+        return {name: (np.concatenate(chunks) if chunks else np.empty(0, dtype=dtypes[name]))
+                for name, chunks in parts.items()}
+
+    def tail(self, limit: int) -> Dict[str, np.ndarray]:
+        """`limit` baris terakhir (urut lama → baru)."""
+        return self.page(limit)
+
+    def page(self, limit: int, after_seq: Optional[int] = None, before_seq: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Satu halaman cursor (urut lama → baru), hanya baris halaman yang dibaca:
+        - `after_seq`: maksimal `limit` baris TERLAMA dengan seq > after_seq (polling data baru)
+        - `before_seq`: maksimal `limit` baris TERBARU dengan seq < before_seq (mundur ke data lama)
+        - tanpa cursor: `limit` baris terakhir
+        """
+        snap = self._snapshot()
+        if not snap or limit <= 0:
+            return self.read(0, 0)
+        first, end = snap[0][0].base_seq, snap[-1][0].base_seq + snap[-1][1]
+        if after_seq is not None:
+            start = max(first, after_seq + 1)
+            return self.read(start, min(end, start + limit))
+        stop = end if before_seq is None else min(end, before_seq)
+        return self.read(max(first, stop - limit), stop)
+
+    def blank_row(self) -> Dict[str, object]:
+        """Dict satu baris dengan semua kolom berisi nilai kosong"""
+        return {name: column_fill(dtype) for name, dtype in self.columns}
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Record terakhir sebagai dict {kolom: nilai, "seq": int}, atau None jika kosong."""
+        return self._seqlock.read(self._latest)
+
+    def _latest(self) -> Optional[Dict[str, float]]:
+        for segment, count in reversed(self._snapshot()):
+            if count:
+                row = {name: segment.column(name, count - 1, count, dtype)[0].item() for name, dtype in self.columns}
+                row["seq"] = segment.base_seq + count - 1
+                return row
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        snap = self._snapshot()
+        return {
+            "backend": "disk",
+            "directory": self.directory,
+            "segments": len(snap),
+            "rows": sum(count for _, count in snap),
+            "bytes": sum(seg.nbytes for seg, _ in snap),
+            "first_seq": snap[0][0].base_seq if snap else self._next_seq,
+            "next_seq": self._next_seq,
+            "segment_rows": self.segment_rows,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "read_retries": self._seqlock.retried,
+            "read_fallbacks": self._seqlock.fallbacks,
+        }
+
+# ---------------------------------------------------------------------------
+# Backend in-memory: ring buffer structured array
+# ---------------------------------------------------------------------------
+
+# Parameter sensor yang dicatat di fault mask (bit i = FAULT_FIELDS[i] kosong / -1 = sensor rusak)
+FAULT_FIELDS = ("temp_c", "do_mgl", "ph", "conductivity_uscm", "totalcoliform_mv")
+
+def ring_columns(columns: List[Tuple[str, str]] = IOT_COLUMNS) -> List[Tuple[str, str]]:
+    """Skema RingStore: timestamp tetap float64, nilai ukur/prediksi float32, plus kolom `fault` (bitmask)"""
+    narrowed = [(name, "<f4" if dtype == "<f8" and name != "timestamp" else dtype) for name, dtype in columns]
+    return narrowed + [("fault", "<i1")]
+
+def fault_mask(columns: Dict[str, np.ndarray], n: int) -> np.ndarray:
+    """Bitmask sensor rusak per baris dari kolom FAULT_FIELDS (NaN atau -1)"""
+    mask = np.zeros(n, dtype=np.int8)
+    for bit, name in enumerate(FAULT_FIELDS):
+        values = columns.get(name)
+        if values is None:
+            mask |= np.int8(1 << bit)
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        mask |= ((np.isnan(values) | (values == -1)) * (1 << bit)).astype(np.int8)
+    return mask
+
+def _widen(values: np.ndarray) -> np.ndarray:
+    """float32 → float64 dibulatkan ke 7 digit signifikan (7.1 tetap 7.1 di JSON, bukan 7.099999904632568)"""
+    x = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        scale = 10.0 ** (6 - np.floor(np.log10(np.abs(x))))
+        rounded = np.round(x * scale) / scale
+    return np.where(np.isfinite(rounded), rounded, x)
+
+class RingStore:
+    """
+    Storage IoT in-memory: satu structured array yang dialokasikan sekali (ring buffer).
+
+    Satu record = satu baris fixed-width (timestamp float64, nilai float32, kode int8, fault
+    bitmask), ±52 byte, jadi jutaan record muat di RAM tanpa objek Python per record. Saat
+    penuh, record tertua ditimpa. Antarmuka sama dengan ColumnarStore (seq global, read/page/
+    read_time_range/update/...); nilai float32 dikembalikan sebagai float64 saat dibaca, dan
+    dict/JSON hanya dibuat di endpoint. Data tidak persisten (hilang saat restart).
+
+    Satu penulis, pembaca tanpa lock: append menulis slot dulu lalu menaikkan `next_seq`, dan
+    mengumumkan `_write_end` sebelum menimpa slot lama; pembaca membuang baris yang slotnya
+    sempat ditimpa selama copy (baris itu memang sudah tergusur). Update enrichment memakai SeqLock.
+
+    - `capacity`: jumlah record maksimum
+    - `max_bytes`: alternatif batas berdasarkan ukuran buffer (kapasitas = yang lebih kecil)
+    - `max_age_seconds`: record tertua yang lebih tua dari batas ini dibuang saat append
+    """
+
+    def __init__(self, capacity: Optional[int] = None, max_bytes: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None, columns: List[Tuple[str, str]] = IOT_COLUMNS):
+        self.columns = ring_columns(columns)
+        self.column_names = [name for name, _ in self.columns]
+        self._dtypes = dict(self.columns)
+        self.row_dtype = np.dtype(self.columns)
+        limits = [int(capacity)] if capacity else []
+        if max_bytes:
+            limits.append(int(max_bytes) // self.row_dtype.itemsize)
+        if not limits or min(limits) <= 0:
+            raise ValueError("RingStore butuh capacity atau max_bytes > 0")
+        self.capacity = min(limits)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._buf = np.empty(self.capacity, dtype=self.row_dtype)
+        self._lock = threading.Lock()
+        self._seqlock = SeqLock(self._lock)
+        self._first_seq = 0
+        self._next_seq = 0
+        self._write_end = 0   # seq akhir (eksklusif) yang sedang/sudah ditulis; >= next_seq
+        self._version = 0
+        self._faulty = 0      # jumlah baris hidup dengan fault != 0 (dijaga inkremental oleh writer)
+
+    # ---------- penulisan ----------
+
+    def append(self, record: Dict[str, Optional[float]]) -> int:
+        """Tambah satu record (None / kolom tidak ada → nilai kosong). Return seq record tersebut."""
+        columns = {name: np.array([record[name]], dtype=np.float64)
+                   for name in self.column_names if record.get(name) is not None}
+        columns.setdefault("timestamp", np.array([np.nan]))
+        return self.append_many(columns)[0]
+
+    def append_many(self, columns: Dict[str, np.ndarray]) -> Tuple[int, int]:
+        """
+        Tambah N baris sekaligus (kolom "timestamp" wajib; kolom lain yang tidak diberikan diisi
+        nilai kosong). Jika N > kapasitas, hanya `capacity` baris terakhir yang tersimpan.
+        Return (seq pertama, N).
+        """
+        n = len(columns["timestamp"])
+        keep = min(n, self.capacity)
+        rows = np.empty(keep, dtype=self.row_dtype)
+        for name, dtype in self.columns:
+            if name in columns:
+                rows[name] = np.asarray(columns[name])[n - keep:]
+            else:
+                rows[name] = column_fill(dtype)
+        rows["fault"] = fault_mask({k: np.asarray(v)[n - keep:] for k, v in columns.items()}, keep)
+        with self._lock:
+            first_seq = self._next_seq
+            # baris lama yang slotnya akan ditimpa keluar dari hitungan fault sebelum ditimpa
+            overwritten = self._faulty_between(self._first_seq, min(first_seq, first_seq + n - self.capacity))
+            # umumkan dulu slot yang akan ditimpa, baru tulis, baru publikasikan next_seq
+            self._write_end = first_seq + n
+            self._buf[np.arange(first_seq + n - keep, first_seq + n) % self.capacity] = rows
+            self._next_seq = first_seq + n
+            self._first_seq = max(self._first_seq, self._next_seq - self.capacity)
+            self._faulty += int(np.count_nonzero(rows["fault"])) - overwritten
+            self._enforce_retention()
+            self._version += 1
+        return first_seq, n
+
+    def update(self, seqs: np.ndarray, columns: Dict[str, np.ndarray]) -> int:
+        """Tulis ulang kolom tertentu untuk baris yang masih ada di ring. Return jumlah baris yang ditulis."""
+        seqs = np.asarray(seqs, dtype=np.int64)
+        with self._lock, self._seqlock.write():
+            mask = (seqs >= self._first_seq) & (seqs < self._next_seq)
+            if not mask.any():
+                return 0
+            rows = seqs[mask] % self.capacity
+            for name, values in columns.items():
+                if name in self._dtypes:
+                    self._buf[name][rows] = np.asarray(values)[mask]
+            self._version += 1
+            return int(mask.sum())
+
+    def clear(self) -> int:
+        """Kosongkan ring. Seq tetap berlanjut. Return jumlah baris terhapus."""
+        with self._lock:
+            deleted = self._next_seq - self._first_seq
+            self._first_seq = self._next_seq
+            self._faulty = 0
+            self._version += 1
+            return deleted
+
+    def _faulty_between(self, start_seq: int, stop_seq: int) -> int:
+        """Jumlah baris dengan fault != 0 untuk seq di [start_seq, stop_seq)"""
+        if stop_seq <= start_seq:
+            return 0
+        return int(np.count_nonzero(self._buf["fault"][np.arange(start_seq, stop_seq) % self.capacity]))
+
+    def _enforce_retention(self) -> None:
+        """
+        Buang record tertua (berurutan dari depan) yang lebih tua dari `max_age_seconds`.
+        Dicek per jendela dari `first_seq` dan berhenti di record segar pertama, jadi biayanya
+        sebanding dengan jumlah record yang dibuang, bukan jumlah record di ring.
+        """
+        if self.max_age_seconds is None:
+            return
+        cutoff = time.time() - self.max_age_seconds
+        first, window = self._first_seq, 64
+        while first < self._next_seq:
+            stop = min(first + window, self._next_seq)
+            fresh = np.flatnonzero(self._buf["timestamp"][np.arange(first, stop) % self.capacity] >= cutoff)
+            expired = int(fresh[0]) if fresh.size else stop - first
+            self._faulty -= self._faulty_between(first, first + expired)
+            first += expired
+            if fresh.size:
+                break
+            window = min(window * 2, 65536)
+        if first != self._first_seq:
+            self._first_seq = first
+            self._version += 1
+
+    def enforce_retention(self) -> None:
+        with self._lock:
+            self._enforce_retention()
+
+    def flush(self) -> None:
+        """Tidak ada yang perlu di-flush (in-memory)"""
+
+    # ---------- pembacaan ----------
+
+    def __len__(self) -> int:
+        return self._next_seq - self._first_seq
+
+    @property
+    def first_seq(self) -> int:
+        return self._first_seq
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    @property
+    def version(self) -> int:
+        """Counter perubahan isi storage (per proses, mulai dari 0)"""
+        return self._version
+
+    def _copy_rows(self, seqs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy baris untuk `seqs` (urut naik), tanpa baris yang slotnya ditimpa selama copy"""
+        rows = self._buf[seqs % self.capacity]
+        intact = np.searchsorted(seqs, self._write_end - self.capacity)
+        return rows[intact:], seqs[intact:]
+
+    def _columns(self, rows: np.ndarray, seqs: np.ndarray, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Pecah baris structured (copy) ke dict kolom; float32 diperlebar ke float64"""
+        names = self.column_names if names is None else names
+        result = {name: (_widen(rows[name]) if self._dtypes[name] == "<f4" else rows[name].copy()) for name in names}
+        result["seq"] = seqs
+        return result
+
+    def read(self, start_seq: int, stop_seq: int) -> Dict[str, np.ndarray]:
+        """Copy kolom untuk baris dengan seq di [start_seq, stop_seq), plus kolom "seq"."""
+        def copy():
+            first = self._first_seq
+            seqs = np.arange(max(start_seq, first), max(min(stop_seq, self._next_seq), first), dtype=np.int64)
+            return self._copy_rows(seqs)
+        return self._columns(*self._seqlock.read(copy))
+
+    def read_time_range(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                        names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Copy kolom `names` (default semua) untuk baris dengan timestamp di [start_ts, end_ts], plus "seq"."""
+        def copy():
+            rows, seqs = self._copy_rows(np.arange(self._first_seq, self._next_seq, dtype=np.int64))
+            mask = np.ones(len(seqs), dtype=bool)
+            if start_ts is not None:
+                mask &= rows["timestamp"] >= start_ts
+            if end_ts is not None:
+                mask &= rows["timestamp"] <= end_ts
+            return rows[mask], seqs[mask]
+        return self._columns(*self._seqlock.read(copy), names)
+
+    def tail(self, limit: int) -> Dict[str, np.ndarray]:
+        """`limit` baris terakhir (urut lama → baru)."""
+        return self.page(limit)
+
+    def page(self, limit: int, after_seq: Optional[int] = None, before_seq: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Satu halaman cursor (urut lama → baru), semantik sama dengan ColumnarStore.page"""
+        first, end = self._first_seq, self._next_seq
+        if limit <= 0 or first == end:
+            return self.read(0, 0)
+        if after_seq is not None:
+            start = max(first, after_seq + 1)
+            return self.read(start, min(end, start + limit))
+        stop = end if before_seq is None else min(end, before_seq)
+        return self.read(max(first, stop - limit), stop)
+
+    def blank_row(self) -> Dict[str, object]:
+        """Dict satu baris dengan semua kolom berisi nilai kosong"""
+        return {name: column_fill(dtype) for name, dtype in self.columns}
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Record terakhir sebagai dict {kolom: nilai, "seq": int}, atau None jika kosong."""
+        def copy():
+            first, end = self._first_seq, self._next_seq
+            return self._copy_rows(np.arange(max(first, end - 1), end, dtype=np.int64))
+        rows, seqs = self._seqlock.read(copy)
+        if not len(seqs):
+            return None
+        columns = self._columns(rows, seqs)
+        row = {name: columns[name][0].item() for name in self.column_names}
+        row["seq"] = int(seqs[0])
+        return row
+
+    def stats(self) -> Dict[str, object]:
+        first, end, faulty = self._first_seq, self._next_seq, self._faulty
+        return {
+            "backend": "memory",
+            "rows": end - first,
+            "bytes": self._buf.nbytes,
+            "row_bytes": self.row_dtype.itemsize,
+            "capacity": self.capacity,
+            "faulty_rows": faulty,
+            "first_seq": first,
+            "next_seq": end,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "read_retries": self._seqlock.retried,
+            "read_fallbacks": self._seqlock.fallbacks,
+        }
@@ -0,0 +1,170 @@
+"""
+Fan-out Server-Sent Events untuk `/iot/stream`.
+
+Setiap record IoT yang selesai di-enrich di-serialisasi SATU kali (payload SSE siap kirim), lalu
+dibagikan ke semua subscriber. Tiap subscriber punya buffer berukuran tetap; subscriber yang
+lambat kehilangan event tertua (dihitung sebagai `dropped` dan diberitahukan lewat event
+`dropped`), bukan menahan publisher atau subscriber lain. Beban server mengikuti laju ingest,
+bukan jumlah viewer x frekuensi polling.
+
+`publish` aman dipanggil dari thread mana pun (worker enrichment, threadpool request);
+distribusi ke buffer subscriber berjalan di event loop.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import AbstractSet, Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Satu event SSE (`data` di-encode JSON satu baris)"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class StreamSubscriber:
+    """Buffer event milik satu koneksi SSE (hanya disentuh dari event loop)"""
+
+    def __init__(self, buffer_size: int):
+        self.buffer: Deque[Tuple[int, str]] = deque()
+        self.buffer_size = buffer_size
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, item: Tuple[int, str]) -> bool:
+        dropped = len(self.buffer) >= self.buffer_size
+        if dropped:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(item)
+        self.wakeup.set()
+        return dropped
+
+class StreamHub:
+    """
+    Registry subscriber SSE + fan-out event.
+
+    - `buffer_size`: event maksimum yang menunggu per subscriber (lebih dari itu, event tertua di-drop)
+    - `max_subscribers`: batas koneksi stream bersamaan
+    - `heartbeat_seconds`: interval komentar keep-alive saat tidak ada data (proxy tidak menutup koneksi)
+    """
+
+    def __init__(self, buffer_size: int = 100, max_subscribers: int = 100, heartbeat_seconds: float = 15.0):
+        self.buffer_size = max(1, int(buffer_size))
+        self.max_subscribers = int(max_subscribers)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self._subscribers: Set[StreamSubscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def has_subscribers(self) -> bool:
+        """Cek murah (tanpa lock) agar publisher bisa melewati serialisasi saat tidak ada viewer"""
+        return bool(self._subscribers)
+
+    # ---------- subscriber (dipanggil dari event loop) ----------
+
+    def subscribe(self) -> Optional[StreamSubscriber]:
+        """Daftarkan subscriber baru; None jika batas `max_subscribers` tercapai"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            subscriber = StreamSubscriber(self.buffer_size)
+            self._subscribers = self._subscribers | {subscriber}
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber) -> None:
+        with self._lock:
+            self._subscribers = self._subscribers - {subscriber}
+
+    async def listen(self, subscriber: StreamSubscriber, skip_seqs: AbstractSet[int] = frozenset(),
+                     max_seconds: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield payload SSE untuk subscriber: event baru (kecuali seq di `skip_seqs`, yang sudah
+        dikirim sebagai replay), event `dropped` jika buffer sempat meluap, dan komentar heartbeat
+        saat idle. Berhenti saat hub ditutup atau setelah `max_seconds` (client EventSource
+        otomatis reconnect dengan Last-Event-ID).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_seconds if max_seconds else None
+        reported_drops = 0
+        while not subscriber.closed:
+            if not subscriber.buffer:
+                timeout = self.heartbeat_seconds
+                if deadline is not None:
+                    timeout = min(timeout, deadline - loop.time())
+                    if timeout <= 0:
+                        return
+                subscriber.wakeup.clear()
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    if deadline is None or loop.time() < deadline:
+                        yield ": keep-alive\n\n"
+                    continue
+            if subscriber.dropped > reported_drops:
+                yield format_sse("dropped", {"dropped": subscriber.dropped - reported_drops})
+                reported_drops = subscriber.dropped
+            while subscriber.buffer:
+                seq, payload = subscriber.buffer.popleft()
+                if seq not in skip_seqs:
+                    yield payload
+
+    # ---------- publisher (thread mana pun) ----------
+
+    def publish(self, events: List[Tuple[int, str]]) -> None:
+        """Kirim event (seq, payload SSE) ke semua subscriber"""
+        loop = self._loop
+        if not events or not self._subscribers or loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._fanout, events)
+        except RuntimeError:
+            # event loop sudah berhenti (shutdown)
+            pass
+
+    def _fanout(self, events: List[Tuple[int, str]]) -> None:
+        subscribers = self._subscribers
+        dropped = 0
+        for subscriber in subscribers:
+            for item in events:
+                dropped += subscriber.push(item)
+        with self._lock:
+            self.published += len(events)
+            self.delivered += len(events) * len(subscribers)
+            self.dropped += dropped
+
+    def close(self) -> None:
+        """Akhiri semua stream (saat shutdown)"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        def _close_all():
+            for subscriber in self._subscribers:
+                subscriber.closed = True
+                subscriber.wakeup.set()
+        try:
+            loop.call_soon_threadsafe(_close_all)
+        except RuntimeError:
+            pass
+
+    # ---------- monitoring ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "buffer_size": self.buffer_size,
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+            }
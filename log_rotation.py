@@ -0,0 +1,250 @@
+"""
+Rotasi log berbasis segment untuk logs/water_quality_api.log.
+
+- Rotasi saat file aktif melewati `max_bytes` atau saat berganti hari (WIB)
+- Segment tertutup di-rename ke `<nama>.<YYYYMMDD-HHMMSSmmm>.log` (waktu mulai segment, WIB) lalu dikompres gzip di thread background
+- Retensi: total ukuran segment tertutup (`retention_bytes`) dan jumlah segment (`backup_count`)
+- Index JSON (`<nama>.index.json`) mencatat rentang waktu tiap segment, sehingga pencarian log
+  insiden lama cukup membuka segment yang beririsan
+
+Contoh cari log:
+    python log_rotation.py logs/water_quality_api.log --since 2025-11-13T20:00 --until 2025-11-13T22:00 --grep "Status: 500"
+"""
+import argparse
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+WIB = timezone(timedelta(hours=7))
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return None if ts is None else datetime.fromtimestamp(ts, tz=WIB).isoformat(timespec="seconds")
+
+def _next_wib_midnight(ts: float) -> float:
+    day = datetime.fromtimestamp(ts, tz=WIB).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (day + timedelta(days=1)).timestamp()
+
+def index_path_for(log_path: str) -> str:
+    return os.path.splitext(log_path)[0] + ".index.json"
+
+def read_index(log_path: str) -> Dict[str, Any]:
+    try:
+        with open(index_path_for(log_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"active": None, "segments": []}
+
+class SegmentedLogHandler(logging.handlers.BaseRotatingHandler):
+    """
+    FileHandler dengan rotasi ukuran + harian (WIB), kompresi gzip background, retensi, dan index.
+
+    Dipakai di thread QueueListener (satu penulis); update index dilindungi lock karena
+    thread kompresor juga memperbaruinya.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024, daily: bool = True,
+                 backup_count: int = 30, retention_bytes: Optional[int] = 100 * 1024 * 1024,
+                 compress: bool = True, encoding: str = "utf-8"):
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.backup_count = backup_count
+        self.retention_bytes = retention_bytes
+        self.compress = compress
+        self._index_lock = threading.Lock()
+        self._index = read_index(filename)
+        self._compress_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._compressor = threading.Thread(target=self._compress_loop, name="log-compress", daemon=True)
+        self._compressor.start()
+        super().__init__(filename, "a", encoding=encoding, delay=False)
+
+        # File aktif dari proses sebelumnya: lanjutkan dengan waktu mulai dari index (atau mtime)
+        active = self._index.get("active") or {}
+        size = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        if size and active.get("start_ts") is not None:
+            self._start_ts, self._end_ts = active["start_ts"], active.get("end_ts")
+        elif size:
+            self._start_ts = self._end_ts = os.path.getmtime(self.baseFilename)
+        else:
+            self._start_ts = self._end_ts = None
+        self._next_rollover = _next_wib_midnight(self._start_ts or time.time())
+        # segment lama yang belum sempat dikompres (mis. proses berhenti saat kompresi)
+        for segment in self._index["segments"]:
+            if self.compress and not segment.get("compressed"):
+                self._compress_queue.put(segment)
+        self._write_index()
+
+    # ---------- rotasi ----------
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self._start_ts is None:
+            return False
+        if self.daily and record.created >= self._next_rollover:
+            return True
+        return self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if self._start_ts is None:
+            self._start_ts = record.created
+            self._next_rollover = _next_wib_midnight(record.created)
+            self._write_index()
+        self._end_ts = record.created
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        stamp = datetime.fromtimestamp(self._start_ts, tz=WIB).strftime("%Y%m%d-%H%M%S%f")[:-3]
+        root, ext = os.path.splitext(self.baseFilename)
+        closed = f"{root}.{stamp}{ext}"
+        suffix = 1
+        while os.path.exists(closed) or os.path.exists(closed + ".gz"):
+            closed = f"{root}.{stamp}-{suffix}{ext}"
+            suffix += 1
+        if os.path.exists(self.baseFilename):
+            os.replace(self.baseFilename, closed)
+            segment = {
+                "file": os.path.basename(closed),
+                "start": _iso(self._start_ts),
+                "end": _iso(self._end_ts),
+                "start_ts": self._start_ts,
+                "end_ts": self._end_ts,
+                "bytes": os.path.getsize(closed),
+                "compressed": False,
+            }
+            with self._index_lock:
+                self._index["segments"].append(segment)
+            if self.compress:
+                self._compress_queue.put(segment)
+        self._start_ts = self._end_ts = None
+        self.stream = self._open()
+        self._enforce_retention()
+        self._write_index()
+
+    # ---------- kompresi & retensi (thread background) ----------
+
+    def _compress_loop(self) -> None:
+        while True:
+            segment = self._compress_queue.get()
+            if segment is None:
+                return
+            src = os.path.join(os.path.dirname(self.baseFilename), segment["file"])
+            if not os.path.exists(src):
+                continue
+            try:
+                with open(src, "rb") as f_in, gzip.open(src + ".gz.tmp", "wb", compresslevel=6) as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                os.replace(src + ".gz.tmp", src + ".gz")
+            except OSError:
+                continue
+            with self._index_lock:
+                if not any(s is segment for s in self._index["segments"]):
+                    # sudah dihapus retensi selama dikompres
+                    os.remove(src + ".gz")
+                    continue
+                segment["file"] += ".gz"
+                segment["compressed"] = True
+                segment["bytes"] = os.path.getsize(src + ".gz")
+                if os.path.exists(src):
+                    os.remove(src)
+            self._enforce_retention()
+            self._write_index()
+
+    def _enforce_retention(self) -> None:
+        """
+        Hapus segment tertutup tertua yang melanggar batas jumlah / total ukuran. Segment yang
+        masih menunggu kompresi tidak dihitung ukurannya dan tidak dihapus.
+        """
+        directory = os.path.dirname(self.baseFilename)
+        with self._index_lock:
+            segments = self._index["segments"]
+            while segments and (segments[0].get("compressed") or not self.compress) and (
+                    (self.backup_count and len(segments) > self.backup_count) or
+                    (self.retention_bytes is not None and
+                     sum(s["bytes"] for s in segments if s.get("compressed") or not self.compress) > self.retention_bytes)):
+                oldest = segments.pop(0)
+                try:
+                    os.remove(os.path.join(directory, oldest["file"]))
+                except OSError:
+                    pass
+
+    def _write_index(self) -> None:
+        with self._index_lock:
+            self._index["active"] = {
+                "file": os.path.basename(self.baseFilename),
+                "start_ts": self._start_ts,
+                "start": _iso(self._start_ts),
+                "end_ts": self._end_ts,
+            }
+            path = index_path_for(self.baseFilename)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False, indent=1)
+            os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            self._compress_queue.put(None)
+            self._compressor.join(timeout=30)
+            self._write_index()
+            super().close()
+        finally:
+            self.release()
+
+# ---------- pencarian ----------
+
+def segments_between(log_path: str, since: Optional[float] = None, until: Optional[float] = None) -> List[str]:
+    """Path segment (tertutup + aktif) yang rentang waktunya beririsan dengan [since, until]"""
+    index = read_index(log_path)
+    directory = os.path.dirname(os.path.abspath(log_path))
+    paths = []
+    for segment in index["segments"]:
+        if since is not None and segment["end_ts"] is not None and segment["end_ts"] < since:
+            continue
+        if until is not None and segment["start_ts"] is not None and segment["start_ts"] > until:
+            continue
+        paths.append(os.path.join(directory, segment["file"]))
+    active = index.get("active") or {}
+    if os.path.exists(log_path) and (until is None or active.get("start_ts") is None or active["start_ts"] <= until):
+        paths.append(log_path)
+    return paths
+
+def iter_lines(path: str) -> Iterator[str]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        yield from f
+
+def _parse_wib(text: str) -> float:
+    dt = datetime.fromisoformat(text)
+    return (dt if dt.tzinfo else dt.replace(tzinfo=WIB)).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description="Cari log berdasarkan rentang waktu (memakai index segment)")
+    parser.add_argument("log_path", help="Path log aktif, mis. logs/water_quality_api.log")
+    parser.add_argument("--since", help="Waktu mulai ISO 8601 (tanpa offset = WIB)")
+    parser.add_argument("--until", help="Waktu akhir ISO 8601 (tanpa offset = WIB)")
+    parser.add_argument("--grep", help="Hanya tampilkan baris yang mengandung teks ini")
+    parser.add_argument("--list", action="store_true", help="Hanya tampilkan daftar segment yang beririsan")
+    args = parser.parse_args()
+
+    paths = segments_between(args.log_path,
+                             _parse_wib(args.since) if args.since else None,
+                             _parse_wib(args.until) if args.until else None)
+    for path in paths:
+        if args.list:
+            print(path)
+            continue
+        for line in iter_lines(path):
+            if args.grep is None or args.grep in line:
+                print(line, end="")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Registry metrik in-process (counter, histogram, gauge) dengan output format teks Prometheus.
+
+Pencatatan lock-light: setiap thread menulis ke shard miliknya sendiri (dict di thread-local),
+jadi `inc` / `observe` di request path tidak mengambil lock. Lock hanya dipakai saat thread
+pertama kali membuat shard dan saat `/metrics` menjumlahkan semua shard.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket latensi default (detik)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, LabelValues], object]] = []
+        # name -> (type, help, labelnames, buckets)
+        self._meta: Dict[str, Tuple[str, str, Tuple[str, ...], Optional[Tuple[float, ...]]]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[LabelValues, float]]] = {}
+
+    # ---------- registrasi ----------
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self._meta[name] = ("counter", help_text, tuple(labelnames), None)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._meta[name] = ("histogram", help_text, tuple(labelnames), tuple(sorted(buckets)))
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], Dict[LabelValues, float]],
+              labelnames: Sequence[str] = (), kind: str = "gauge") -> None:
+        """
+        Metrik yang dihitung saat scrape: `callback()` -> {label values: nilai}.
+        `kind="counter"` untuk counter kumulatif yang sudah dihitung komponen lain (mis. antrian ingest).
+        """
+        self._meta[name] = (kind, help_text, tuple(labelnames), None)
+        self._gauges[name] = callback
+
+    # ---------- pencatatan (tanpa lock) ----------
+
+    def _shard(self) -> Dict[Tuple[str, LabelValues], object]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def inc(self, name: str, labels: LabelValues = (), value: float = 1.0) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: LabelValues, value: float) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        buckets = self._meta[name][3]
+        series = shard.get(key)
+        if series is None:
+            # [count per bucket..., count +Inf, sum]
+            series = shard[key] = [0] * (len(buckets) + 1) + [0.0]
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def timer(self, name: str, labels: LabelValues = ()) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - start)
+
+    # ---------- agregasi & export ----------
+
+    def _merged(self) -> Dict[Tuple[str, LabelValues], object]:
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, LabelValues], object] = {}
+        for shard in shards:
+            for key, value in list(shard.items()):
+                if isinstance(value, list):
+                    acc = merged.get(key)
+                    merged[key] = list(value) if acc is None else [a + b for a, b in zip(acc, value)]
+                else:
+                    merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    def snapshot(self) -> Dict[str, Dict[LabelValues, object]]:
+        """{metric: {labels: nilai}}; histogram = {"count", "sum", "buckets": [(le, kumulatif)]}"""
+        result: Dict[str, Dict[LabelValues, object]] = {name: {} for name in self._meta}
+        for (name, labels), value in self._merged().items():
+            kind, _, _, buckets = self._meta[name]
+            if kind == "histogram":
+                cumulative, running = [], 0
+                for le, count in zip(list(buckets) + [math.inf], value[:-1]):
+                    running += count
+                    cumulative.append((le, running))
+                result[name][labels] = {"count": running, "sum": value[-1], "buckets": cumulative}
+            else:
+                result[name][labels] = value
+        for name, callback in self._gauges.items():
+            try:
+                result[name] = dict(callback())
+            except Exception:
+                result[name] = {}
+        return result
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        snapshot = self.snapshot()
+        for name, (kind, help_text, labelnames, _) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(snapshot.get(name, {}).items()):
+                if kind == "histogram":
+                    for le, count in value["buckets"]:
+                        le_label = 'le="' + _fmt(le) + '"'
+                        lines.append(f"{name}_bucket{_labels_text(labelnames, labels, le_label)} {count}")
+                    lines.append(f"{name}_sum{_labels_text(labelnames, labels)} {_fmt(value['sum'])}")
+                    lines.append(f"{name}_count{_labels_text(labelnames, labels)} {value['count']}")
+                else:
+                    lines.append(f"{name}{_labels_text(labelnames, labels)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+def histogram_quantile(q: float, buckets: Sequence[Tuple[float, int]]) -> Optional[float]:
+    """Estimasi kuantil dari bucket kumulatif (interpolasi linear, seperti PromQL histogram_quantile)"""
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    prev_le, prev_count = 0.0, 0
+    for le, count in buckets:
+        if count >= rank:
+            if math.isinf(le):
+                return prev_le
+            if count == prev_count:
+                return le
+            return prev_le + (le - prev_le) * (rank - prev_count) / (count - prev_count)
+        prev_le, prev_count = le, count
+    return prev_le
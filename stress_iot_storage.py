@@ -0,0 +1,303 @@
+"""
+Stress test konkurensi storage IoT: ingest, update enrichment, baca history, dan clear bersamaan.
+
+Mode `storage` memakai ColumnarStore / RingStore langsung (kapasitas kecil agar rollover segment,
+retensi, dan wrap-around ring sering terjadi). Setiap baris ditulis dengan invariant internal:
+- do_mgl = temp_c + 1, ph = temp_c + 2 (baris utuh, tidak pernah setengah tertulis)
+- jika severity >= 0: pred = temp_c * 2, ci90_low = temp_c, ci90_high = temp_c * 3
+  (enrichment utuh; severity ditulis terakhir)
+Pembaca (page/tail/read_time_range/latest) memeriksa invariant tersebut serta seq yang naik
+dan bersambung.
+
+Mode `api` menjalankan `/iot/data`, `/iot/data/bulk`, `/iot/history` (dengan cursor),
+`/iot/latest`, `/api/latest`, dan `DELETE /iot/clear` bersamaan lewat client ASGI in-process
+(storage di direktori sementara) dan memeriksa tidak ada 5xx serta history yang konsisten.
+
+Contoh:
+    python stress_iot_storage.py                          # storage disk + memory, 10 detik
+    python stress_iot_storage.py --mode api --seconds 20 --readers 8
+    python stress_iot_storage.py --backend memory --writers 4 --readers 16
+
+Exit 1 jika ada pelanggaran invariant / error.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+from iot_storage import IOT_COLUMNS, ColumnarStore, ColumnSegment, RingStore
+
+class Report:
+    """Counter operasi + pelanggaran (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops: Dict[str, int] = {}
+        self.latency: Dict[str, List[float]] = {}
+        self.violations: List[str] = []
+        self.violation_count = 0
+
+    def record(self, op: str, seconds: float) -> None:
+        with self._lock:
+            self.ops[op] = self.ops.get(op, 0) + 1
+            self.latency.setdefault(op, []).append(seconds)
+
+    def violation(self, message: str) -> None:
+        with self._lock:
+            self.violation_count += 1
+            if len(self.violations) < 20:
+                self.violations.append(message)
+
+    def print_summary(self, elapsed: float) -> None:
+        print(f"{'operasi':28} {'jumlah':>10} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for op in sorted(self.ops):
+            lat = np.array(self.latency[op]) * 1000
+            print(f"{op:28} {self.ops[op]:>10,} {self.ops[op] / elapsed:>10,.0f} "
+                  f"{np.percentile(lat, 50):>10.3f} {np.percentile(lat, 99):>10.3f}")
+        if self.violation_count:
+            print(f"\n✗ {self.violation_count} pelanggaran, contoh:")
+            for message in self.violations:
+                print(f"  - {message}")
+
+def run_threads(workers: List[Callable[[threading.Event], None]], seconds: float) -> float:
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def wrap(fn):
+        def target():
+            try:
+                fn(stop)
+            except BaseException as e:   # error tak terduga juga dihitung gagal
+                errors.append(e)
+                stop.set()
+        return target
+
+    threads = [threading.Thread(target=wrap(fn), daemon=True) for fn in workers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - start
+
+# ---------- mode storage ----------
+
+def check_rows(columns: Dict[str, np.ndarray], report: Report, where: str, contiguous: bool) -> None:
+    seqs = columns["seq"]
+    lengths = {len(v) for v in columns.values()}
+    if len(lengths) > 1:
+        report.violation(f"{where}: panjang kolom berbeda {lengths}")
+        return
+    if len(seqs) > 1:
+        steps = np.diff(seqs)
+        if (steps <= 0).any() or (contiguous and (steps != 1).any()):
+            report.violation(f"{where}: seq tidak urut/bersambung {seqs[:10].tolist()}...")
+    temp = columns["temp_c"]
+    torn = (columns["do_mgl"] != temp + 1) | (columns["ph"] != temp + 2)
+    if torn.any():
+        i = int(np.flatnonzero(torn)[0])
+        report.violation(f"{where}: baris seq={int(seqs[i])} tidak utuh (temp={temp[i]}, do={columns['do_mgl'][i]}, ph={columns['ph'][i]})")
+    enriched = columns["severity"] >= 0
+    bad = enriched & ((columns["pred_total_coliform_mv"] != temp * 2) | (columns["pred_ci90_low"] != temp)
+                      | (columns["pred_ci90_high"] != temp * 3))
+    if bad.any():
+        i = int(np.flatnonzero(bad)[0])
+        report.violation(f"{where}: enrichment seq={int(seqs[i])} setengah tertulis "
+                         f"(temp={temp[i]}, pred={columns['pred_total_coliform_mv'][i]})")
+
+def stress_storage(store, seconds: float, writers: int, readers: int, clear_every: float, seed: int) -> Report:
+    report = Report()
+    counter = iter(range(1, 1 << 62))
+    counter_lock = threading.Lock()
+
+    def writer(stop):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            n = rng.choice((1, 1, 1, 8, 64))
+            with counter_lock:
+                start = next(counter)
+                for _ in range(n - 1):
+                    next(counter)
+            # nilai bulat < 2^23 → tepat di float32 (RingStore)
+            temp = (np.arange(start, start + n) % 4096).astype(np.float64)
+            t0 = time.perf_counter()
+            store.append_many({"timestamp": time.time() + np.zeros(n), "temp_c": temp,
+                               "do_mgl": temp + 1, "ph": temp + 2})
+            report.record("append_many", time.perf_counter() - t0)
+
+    def enricher(stop):
+        # seperti worker enrichment: update baris baru, severity ditulis terakhir
+        while not stop.is_set():
+            page = store.tail(256)
+            todo = page["severity"] < 0
+            if not todo.any():
+                time.sleep(0.0005)
+                continue
+            temp = page["temp_c"][todo]
+            t0 = time.perf_counter()
+            store.update(page["seq"][todo], {
+                "pred_total_coliform_mv": temp * 2,
+                "pred_ci90_low": temp,
+                "pred_ci90_high": temp * 3,
+                "severity": np.ones(len(temp), dtype=np.int8),
+            })
+            report.record("update", time.perf_counter() - t0)
+
+    def clearer(stop):
+        while not stop.wait(clear_every):
+            t0 = time.perf_counter()
+            store.clear()
+            report.record("clear", time.perf_counter() - t0)
+
+    def reader(stop, idx):
+        rng = random.Random(seed + 1000 + idx)
+        while not stop.is_set():
+            op = rng.choice(("tail", "after_seq", "before_seq", "time_range", "latest"))
+            t0 = time.perf_counter()
+            if op == "tail":
+                columns = store.tail(rng.choice((1, 50, 1000)))
+            elif op == "after_seq":
+                columns = store.page(200, after_seq=max(-1, store.next_seq - rng.randint(1, 2000)))
+            elif op == "before_seq":
+                columns = store.page(200, before_seq=store.next_seq - rng.randint(0, 2000))
+            elif op == "time_range":
+                columns = store.read_time_range(time.time() - rng.uniform(0, 0.5), None)
+            else:
+                row = store.latest()
+                columns = {k: np.array([v]) for k, v in row.items()} if row is not None else None
+            report.record(op, time.perf_counter() - t0)
+            if columns is not None:
+                check_rows(columns, report, op, contiguous=op not in ("time_range",))
+
+    workers = [writer] * writers + [enricher]
+    workers += [lambda stop, i=i: reader(stop, i) for i in range(readers)]
+    if clear_every > 0:
+        workers.append(clearer)
+    elapsed = run_threads(workers, seconds)
+    report.print_summary(elapsed)
+    stats = store.stats()
+    print(f"storage: rows={stats['rows']}, next_seq={stats['next_seq']}, "
+          f"read_retries={stats['read_retries']}, read_fallbacks={stats['read_fallbacks']}")
+    return report
+
+# ---------- mode api ----------
+
+def stress_api(seconds: float, writers: int, readers: int, clear_every: float, seed: int) -> Report:
+    storage_dir = tempfile.mkdtemp(prefix="stress_iot_")
+    os.environ["IOT_STORAGE_DIR"] = storage_dir
+    os.environ.setdefault("LOG_SAMPLE_RATES", "INFO=0,WARNING=0")
+    import backend_fastapi
+    from fastapi.testclient import TestClient
+
+    report = Report()
+    reading = {"temp_c": 27.5, "do_mgl": 6.1, "ph": 7.2, "conductivity_uscm": 600, "totalcoliform_mv_raw": 40.0}
+
+    def call(client, op, method, url, **kwargs):
+        t0 = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        report.record(op, time.perf_counter() - t0)
+        if response.status_code >= 500:
+            report.violation(f"{op}: HTTP {response.status_code} {response.text[:200]}")
+            return None
+        return response.json()
+
+    try:
+        with TestClient(backend_fastapi.app) as client:
+            def writer(stop):
+                rng = random.Random(seed)
+                while not stop.is_set():
+                    if rng.random() < 0.1:
+                        call(client, "POST /iot/data/bulk", "POST", "/iot/data/bulk", json=[reading] * 20)
+                    else:
+                        call(client, "POST /iot/data", "POST", "/iot/data", json=reading)
+
+            def clearer(stop):
+                while not stop.wait(clear_every):
+                    call(client, "DELETE /iot/clear", "DELETE", "/iot/clear")
+
+            def reader(stop, idx):
+                rng = random.Random(seed + 1000 + idx)
+                cursor = -1
+                while not stop.is_set():
+                    op = rng.choice(("history", "history_cursor", "iot_latest", "api_latest"))
+                    if op in ("history", "history_cursor"):
+                        params = {"limit": rng.choice((10, 50, 500))}
+                        if op == "history_cursor":
+                            params["after_seq"] = cursor
+                        body = call(client, "GET /iot/history", "GET", "/iot/history", params=params)
+                        if body is None:
+                            continue
+                        seqs = [row["seq"] for row in body["data"]]
+                        if any(b <= a for a, b in zip(seqs, seqs[1:])):
+                            report.violation(f"history: seq tidak urut {seqs[:10]}")
+                        for row in body["data"]:
+                            if row["ai_detection"] is not None and row["prediction"]["total_coliform_mv"] is None:
+                                report.violation(f"history: seq={row['seq']} ter-enrich tanpa prediksi")
+                        cursor = body.get("next_cursor", cursor)
+                    elif op == "iot_latest":
+                        call(client, "GET /iot/latest", "GET", "/iot/latest")
+                    else:
+                        call(client, "GET /api/latest", "GET", "/api/latest")
+
+            workers = [writer] * writers + [lambda stop, i=i: reader(stop, i) for i in range(readers)]
+            if clear_every > 0:
+                workers.append(clearer)
+            elapsed = run_threads(workers, seconds)
+        report.print_summary(elapsed)
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test konkurensi storage IoT (ingest + history + clear)")
+    parser.add_argument("--mode", choices=("storage", "api"), default="storage")
+    parser.add_argument("--backend", choices=("disk", "memory", "both"), default="both", help="Mode storage: backend yang diuji")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Durasi per backend / mode")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--clear-every", type=float, default=1.0, help="Interval clear (detik); 0 = tanpa clear")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failed = False
+    if args.mode == "api":
+        report = stress_api(args.seconds, args.writers, args.readers, args.clear_every, args.seed)
+        failed = report.violation_count > 0
+    else:
+        backends = ("disk", "memory") if args.backend == "both" else (args.backend,)
+        for backend in backends:
+            print(f"\n=== storage {backend} ===")
+            tmp = tempfile.mkdtemp(prefix="stress_iot_")
+            try:
+                if backend == "disk":
+                    # segment kecil + retensi ukuran → rollover & penghapusan segment terus-menerus
+                    store = ColumnarStore(tmp, segment_rows=1024,
+                                          max_bytes=8 * ColumnSegment.file_size(IOT_COLUMNS, 1024))
+                else:
+                    store = RingStore(capacity=5000)   # wrap-around sering
+                report = stress_storage(store, args.seconds, args.writers, args.readers, args.clear_every, args.seed)
+                failed |= report.violation_count > 0
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    if failed:
+        print("\n✗ Stress test GAGAL")
+        sys.exit(1)
+    print("\n✓ Tidak ada pelanggaran")
+
+if __name__ == "__main__":
+    main()
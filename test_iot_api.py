@@ -0,0 +1,71 @@
+"""
+Regression test API IoT (validasi input yang sebelumnya bisa merusak storage / membalas 500).
+
+Jalankan: python -m pytest -q test_iot_api.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+# storage sementara, in-memory, tanpa worker enrichment (hasil langsung terlihat)
+os.environ.setdefault("IOT_STORAGE_BACKEND", "memory")
+os.environ.setdefault("IOT_STORAGE_DIR", tempfile.mkdtemp(prefix="iot_test_"))
+os.environ.setdefault("IOT_INGEST_WORKERS", "0")
+
+from fastapi.testclient import TestClient
+
+import backend_fastapi
+
+READING = '"temp_c":27.8,"do_mgl":6.2,"ph":7.2,"conductivity_uscm":620'
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend_fastapi.app) as c:
+        yield c
+
+@pytest.fixture(autouse=True)
+def empty_storage(client):
+    client.delete("/iot/clear")
+
+def _post_bulk(client, body: str):
+    return client.post("/iot/data/bulk", content=body.encode(), headers={"content-type": "application/json"})
+
+def _assert_history_readable(client):
+    for url in ("/iot/history", "/iot/history/aggregate", "/iot/history/aggregate?mode=lttb", "/api/latest"):
+        assert client.get(url).status_code == 200, url
+
+@pytest.mark.parametrize("timestamp", ["1e20", "NaN", "Infinity", "-Infinity", "-1e12",
+                                       '"9999-12-31T23:00:00+00:00"', '"0001-01-01T00:00:00"'])
+def test_bulk_rejects_invalid_timestamp(client, timestamp):
+    body = f'[{{{READING},"timestamp":{timestamp}}},{{{READING},"timestamp":1762673400}}]'
+    r = _post_bulk(client, body)
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert items[0]["status"] == "rejected"
+    assert any(err.startswith("timestamp") for err in items[0]["errors"])
+    assert items[1]["status"] == "stored"
+    assert r.json()["stored"] == 1
+    _assert_history_readable(client)
+
+@pytest.mark.parametrize("bucket_seconds", ["1e-308", "1e-320", "5e-324", "0.0001"])
+def test_aggregate_rejects_too_many_buckets(client, bucket_seconds):
+    body = ",".join(f'{{{READING},"timestamp":{1762673400 + 60 * i}}}' for i in range(5))
+    assert _post_bulk(client, f"[{body}]").json()["stored"] == 5
+    r = client.get(f"/iot/history/aggregate?bucket_seconds={bucket_seconds}")
+    assert r.status_code == 400
+    assert client.get("/iot/history/aggregate?bucket_seconds=60").status_code == 200
+
+@pytest.mark.parametrize("url", ["/api/latest", "/iot/latest"])
+def test_latest_etag_not_reused_after_restart(client, monkeypatch, url):
+    assert client.post("/iot/data", content=f"{{{READING}}}".encode(),
+                       headers={"content-type": "application/json"}).status_code == 200
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # restart: seq storage baru dimulai dari 0 lagi, id proses berbeda
+    monkeypatch.setattr(backend_fastapi, "BOOT_ID", "restarted")
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200